@@ -1,13 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from fastapi.responses import RedirectResponse
 from urllib.parse import urlencode
 from app.core.config import settings
-from app.core.security import create_access_token
+from app.core.security import (
+    create_access_token, create_refresh_token, forget_user, get_auth_stats, get_current_user, require_admin,
+    verify_refresh_token
+)
 from app.models.user import User
-from app.schemas.user import UserResponse
+from app.schemas.user import TokenRefresh, TokenResponse, UserResponse
 from app.services.spotify_service import spotify_service
+from app.services.token_manager import token_manager
 from app.utils.helpers import get_db
 import uuid
 import os
@@ -37,14 +42,14 @@ async def login():
         )
 
 @router.get("/callback")
-async def callback(code: str, db: Session = Depends(get_db)):
+async def callback(code: str, db: AsyncSession = Depends(get_db)):
     """Callback OAuth2 Spotify - Redirige vers le frontend après auth"""
     print(f"🎯 CALLBACK DÉCLENCHÉ - Code reçu: {code}")
     
     try:
         # Échanger le code contre un access token
         print("🔄 Échange du code contre token...")
-        token_info = spotify_service.get_access_token(code)
+        token_info = await spotify_service.get_access_token(code)
         
         if not token_info:
             print("❌ Échec de l'échange du token")
@@ -58,7 +63,7 @@ async def callback(code: str, db: Session = Depends(get_db)):
         
         # Obtenir le profil utilisateur
         print("🔄 Récupération du profil utilisateur...")
-        user_profile = spotify_service.get_user_profile(access_token)
+        user_profile = await spotify_service.get_user_profile(access_token)
         if not user_profile:
             print("❌ Échec de la récupération du profil")
             return RedirectResponse(url=f"{settings.FRONTEND_URL}?auth_error=profile_failed")
@@ -66,7 +71,7 @@ async def callback(code: str, db: Session = Depends(get_db)):
         print(f"✅ Profil utilisateur: {user_profile.get('display_name', 'Unknown')}")
         
         # Vérifier si l'utilisateur existe
-        user = db.query(User).filter(User.spotify_id == user_profile['id']).first()
+        user = await db.scalar(select(User).where(User.spotify_id == user_profile['id']))
         
         if user:
             # Mettre à jour les tokens
@@ -90,8 +95,9 @@ async def callback(code: str, db: Session = Depends(get_db)):
             db.add(user)
             print("✅ Nouvel utilisateur créé")
         
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        forget_user(user.id)
+        token_manager.store(user.id, user.spotify_access_token, user.token_expires_at)
         
         # Créer un JWT token pour l'app
         jwt_token = create_access_token(
@@ -102,6 +108,7 @@ async def callback(code: str, db: Session = Depends(get_db)):
         frontend_url = settings.FRONTEND_URL
         params = {
             "access_token": jwt_token,
+            "refresh_token": create_refresh_token(user.id),
             "token_type": "bearer", 
             "user_id": user.id,
             "auth_success": "true"
@@ -112,7 +119,7 @@ async def callback(code: str, db: Session = Depends(get_db)):
         return RedirectResponse(url=redirect_url)
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"💥 Erreur dans le callback: {str(e)}")
         import traceback
         print(f"Stack trace: {traceback.format_exc()}")
@@ -120,9 +127,9 @@ async def callback(code: str, db: Session = Depends(get_db)):
         return RedirectResponse(url=f"{settings.FRONTEND_URL}?auth_error={error_message}")
 
 @router.post("/refresh")
-async def refresh_token(user_id: str, db: Session = Depends(get_db)):
+async def refresh_token(current_user: UserResponse = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Rafraîchir le token Spotify d'un utilisateur"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, current_user.id)
     
     if not user:
         raise HTTPException(
@@ -136,47 +143,50 @@ async def refresh_token(user_id: str, db: Session = Depends(get_db)):
             detail="No refresh token available"
         )
     
-    try:
-        # Utiliser le service Spotify pour rafraîchir le token
-        sp_oauth = spotify_service._create_oauth_manager()
-        token_info = sp_oauth.refresh_access_token(user.spotify_refresh_token)
-        
-        if not token_info:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to refresh token"
-            )
-        
-        user.spotify_access_token = token_info['access_token']
-        user.token_expires_at = datetime.utcnow() + timedelta(seconds=token_info['expires_in'])
-        
-        if 'refresh_token' in token_info:
-            user.spotify_refresh_token = token_info['refresh_token']
-        
-        db.commit()
-        db.refresh(user)
-        
-        return {
-            "message": "Token refreshed successfully",
-            "expires_in": token_info['expires_in']
-        }
-    
-    except Exception as e:
-        db.rollback()
+    # Rafraîchissement partagé avec le planificateur (un seul appel en vol)
+    access_token = await token_manager.refresh(user.id)
+    if not access_token:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Token refresh failed: {str(e)}"
+            detail="Failed to refresh token"
         )
-
-@router.get("/me")
-async def get_current_user(user_id: str, db: Session = Depends(get_db)):
-    """Obtenir les informations de l'utilisateur actuel"""
-    user = db.query(User).filter(User.id == user_id).first()
     
-    if not user:
+    await db.refresh(user)
+    expires_in = int((user.token_expires_at - datetime.utcnow()).total_seconds())
+    
+    return {
+        "message": "Token refreshed successfully",
+        "expires_in": expires_in
+    }
+
+@router.post("/token/refresh", response_model=TokenResponse)
+async def refresh_app_token(data: TokenRefresh, db: AsyncSession = Depends(get_db)):
+    """Nouveau token d'accès (et de renouvellement) à partir du token de renouvellement"""
+    user_id = verify_refresh_token(data.refresh_token)
+    user = await db.get(User, user_id) if user_id else None
+    if user is None:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"}
         )
-    
-    return UserResponse.model_validate(user)
\ No newline at end of file
+
+    return TokenResponse(
+        access_token=create_access_token(data={"sub": user.id, "spotify_id": user.spotify_id}),
+        refresh_token=create_refresh_token(user.id)
+    )
+
+@router.get("/tokens/stats", dependencies=[Depends(require_admin)])
+async def get_token_stats():
+    """Statistiques du cache et du rafraîchissement des tokens Spotify (admin)"""
+    return token_manager.get_stats()
+
+@router.get("/jwt/stats", dependencies=[Depends(require_admin)])
+async def get_jwt_stats():
+    """Statistiques des caches de l'authentification Bearer"""
+    return get_auth_stats()
+
+@router.get("/me")
+async def me(current_user: UserResponse = Depends(get_current_user)):
+    """Obtenir les informations de l'utilisateur actuel"""
+    return current_user
\ No newline at end of file
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+import os
+from app.core.security import require_admin
+from app.utils.diagnostics import loop_monitor, profiler, slow_query_log
+
+router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
+
+@router.get("/stats", dependencies=[Depends(require_admin)])
+async def get_diagnostics_stats():
+    """Statistiques du profileur, des requêtes lentes et du retard de la boucle"""
+    return {
+        "profiler": profiler.get_stats(),
+        "slow_queries": slow_query_log.get_stats(),
+        "event_loop": loop_monitor.get_stats()
+    }
+
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Derniers profils de requêtes, du plus récent au plus ancien"""
+    return {"profiles": [profile.to_dict() for profile in reversed(profiler.recent)]}
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Profil au format collapsed stacks (flamegraph.pl, speedscope)"""
+    profile = profiler.get(profile_id)
+    if profile is None or not profile.file or not os.path.exists(profile.file):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+
+    return FileResponse(profile.file, media_type="text/plain", filename=os.path.basename(profile.file))
+
+@router.get("/slow-queries", dependencies=[Depends(require_admin)])
+async def get_slow_queries():
+    """Dernières requêtes SQL au-delà de SLOW_QUERY_THRESHOLD_MS"""
+    return {"threshold_ms": slow_query_log.threshold * 1000, "queries": list(reversed(slow_query_log.recent))}
+
+@router.get("/event-loop", dependencies=[Depends(require_admin)])
+async def get_event_loop_stalls():
+    """Blocages de la boucle d'événements, avec la pile relevée pendant le blocage"""
+    return {"stats": loop_monitor.get_stats(), "stalls": list(reversed(loop_monitor.stalls))}
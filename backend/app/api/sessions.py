@@ -1,43 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.security import get_current_user, require_admin
 from app.schemas.session import SessionCreate, SessionResponse, SessionJoin
-from app.services.session_service import SessionService
+from app.schemas.user import UserResponse
+from app.services.code_allocator import code_allocator
+from app.services.playback_poller import playback_poller
+from app.services.queue_engine import queue_engine
+from app.services.session_reaper import session_reaper
+from app.services.session_store import session_store
+from app.services.spotify_service import SpotifyService
 from app.utils.helpers import get_db
-import shortuuid
+from app.websocket.manager import websocket_manager
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 
 @router.post("/create", response_model=SessionResponse)
 async def create_session(
     session_data: SessionCreate,
-    user_id: str,
-    db: Session = Depends(get_db)
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Créer une nouvelle session"""
-    session_service = SessionService(db)
-    
-    # Générer un code unique
-    code = shortuuid.ShortUUID().random(length=6).upper()
-    
-    session = session_service.create_session(
-        host_id=user_id,
-        code=code,
+    session = await session_store.create(
+        db,
+        host_id=current_user.id,
         name=session_data.name,
         playlist_ids=session_data.playlist_ids
     )
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create session"
+        )
     
     return SessionResponse.model_validate(session)
 
 @router.post("/join", response_model=SessionResponse)
 async def join_session(
     join_data: SessionJoin,
-    user_id: str,
-    db: Session = Depends(get_db)
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Rejoindre une session existante"""
-    session_service = SessionService(db)
-    
-    session = session_service.join_session(join_data.code, user_id)
+    session = await session_store.join(db, join_data.code, current_user.id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -46,12 +52,35 @@ async def join_session(
     
     return SessionResponse.model_validate(session)
 
+@router.get("/store/stats", dependencies=[Depends(require_admin)])
+async def get_store_stats():
+    """Statistiques du store des sessions actives"""
+    return session_store.get_stats()
+
+@router.get("/codes/stats", dependencies=[Depends(require_admin)])
+async def get_code_stats():
+    """Statistiques de l'allocateur de codes (codes utilisés, réserve, quarantaine)"""
+    return code_allocator.get_stats()
+
+@router.get("/queue/stats", dependencies=[Depends(require_admin)])
+async def get_queue_stats():
+    """Statistiques des files classées (sessions suivies, tracks, mises à jour)"""
+    return queue_engine.get_stats()
+
+@router.get("/playback/stats", dependencies=[Depends(require_admin)])
+async def get_playback_stats():
+    """Statistiques du suivi de lecture (polls Spotify, diffusions now_playing)"""
+    return playback_poller.get_stats()
+
+@router.get("/reaper/stats", dependencies=[Depends(require_admin)])
+async def get_reaper_stats():
+    """Statistiques du nettoyage des sessions inactives (sessions expirées, votes supprimés)"""
+    return session_reaper.get_stats()
+
 @router.get("/{session_id}", response_model=SessionResponse)
-async def get_session(session_id: str, db: Session = Depends(get_db)):
+async def get_session(session_id: str, db: AsyncSession = Depends(get_db)):
     """Obtenir les détails d'une session"""
-    session_service = SessionService(db)
-    
-    session = session_service.get_session(session_id)
+    session = await session_store.get(db, session_id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -60,12 +89,107 @@ async def get_session(session_id: str, db: Session = Depends(get_db)):
     
     return SessionResponse.model_validate(session)
 
+@router.get("/{session_id}/tracks")
+async def get_session_tracks(
+    session_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Obtenir les tracks de toutes les playlists de la session (dédupliquées)"""
+    session = await session_store.get(db, session_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    
+    # Lecture faite avec le quota Spotify de l'hôte : participants seulement
+    if not await session_store.is_participant(db, session.id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User not in session"
+        )
+    
+    spotify_service = SpotifyService(db)
+    tracks = await spotify_service.get_session_tracks(session.id, session.host_id, session.playlist_ids or [])
+    if tracks is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to get session tracks"
+        )
+    
+    # Liste déjà sérialisable : éviter jsonable_encoder sur des milliers de tracks
+    return JSONResponse({"tracks": tracks})
+
+@router.get("/{session_id}/queue")
+async def get_session_queue(
+    session_id: str,
+    top: int = Query(20, ge=1, le=500),
+    db: AsyncSession = Depends(get_db)
+):
+    """Obtenir les k meilleures tracks de la session, classées par les votes"""
+    session = await session_store.get(db, session_id)
+    if not session or not session.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found or inactive"
+        )
+    
+    queue = await queue_engine.get(db, session.id, session.current_track)
+    return {
+        "session_id": session.id,
+        "current_track": session.current_track,
+        "size": len(queue),
+        "tracks": [track.to_dict() for track in queue.top(top)]
+    }
+
+@router.post("/{session_id}/queue/advance")
+async def advance_session_queue(
+    session_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Passer à la track la mieux classée (hôte seulement)
+
+    Avancée manuelle : la fin d'une track ne déclenche rien côté serveur.
+    L'application de l'hôte appelle cette route puis lance la track renvoyée.
+    """
+    session = await session_store.get(db, session_id)
+    if not session or not session.is_active or session.host_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only host can advance the queue or session not found"
+        )
+    
+    best = await queue_engine.advance(db, session.id, session.current_track)
+    if best is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Queue is empty"
+        )
+    
+    # Métadonnées depuis le cache Spotify ; l'id suffit si Spotify ne répond pas
+    track = await SpotifyService(db).get_track(session.host_id, best.track_id) or {"id": best.track_id}
+    await session_store.set_current_track(db, session.id, current_user.id, track)
+    await websocket_manager.broadcast_to_session(
+        session.id,
+        {
+            "type": "track_change",
+            "track": track,
+            "changed_by": current_user.id
+        }
+    )
+    
+    return {"track": track, "ranking": best.to_dict()}
+
 @router.post("/{session_id}/leave")
-async def leave_session(session_id: str, user_id: str, db: Session = Depends(get_db)):
+async def leave_session(
+    session_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """Quitter une session"""
-    session_service = SessionService(db)
-    
-    success = session_service.leave_session(session_id, user_id)
+    success = await session_store.leave(db, session_id, current_user.id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -75,11 +199,13 @@ async def leave_session(session_id: str, user_id: str, db: Session = Depends(get
     return {"message": "Successfully left session"}
 
 @router.post("/{session_id}/close")
-async def close_session(session_id: str, user_id: str, db: Session = Depends(get_db)):
+async def close_session(
+    session_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """Fermer une session (hôte seulement)"""
-    session_service = SessionService(db)
-    
-    success = session_service.close_session(session_id, user_id)
+    success = await session_store.close(db, session_id, current_user.id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.security import get_current_user, require_admin
+from app.schemas.user import UserResponse
 from app.services.spotify_service import SpotifyService
 from app.utils.helpers import get_db
 
 router = APIRouter(prefix="/api/spotify", tags=["spotify"])
 
 @router.get("/playlists")
-async def get_user_playlists(user_id: str, db: Session = Depends(get_db)):
+async def get_user_playlists(current_user: UserResponse = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Obtenir les playlists d'un utilisateur"""
     spotify_service = SpotifyService(db)
     
-    playlists = spotify_service.get_user_playlists(user_id)
+    playlists = await spotify_service.get_user_playlists(current_user.id)
     if playlists is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -20,11 +23,11 @@ async def get_user_playlists(user_id: str, db: Session = Depends(get_db)):
     return {"playlists": playlists}
 
 @router.get("/playlists/{playlist_id}/tracks")
-async def get_playlist_tracks(playlist_id: str, user_id: str, db: Session = Depends(get_db)):
+async def get_playlist_tracks(playlist_id: str, current_user: UserResponse = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Obtenir les tracks d'une playlist"""
     spotify_service = SpotifyService(db)
     
-    tracks = spotify_service.get_playlist_tracks(user_id, playlist_id)
+    tracks = await spotify_service.get_playlist_tracks(current_user.id, playlist_id)
     if tracks is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -33,12 +36,33 @@ async def get_playlist_tracks(playlist_id: str, user_id: str, db: Session = Depe
     
     return {"tracks": tracks}
 
+@router.get("/tracks")
+async def get_tracks(ids: str, current_user: UserResponse = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Obtenir plusieurs tracks (ids séparés par des virgules)"""
+    spotify_service = SpotifyService(db)
+    
+    track_ids = [track_id.strip() for track_id in ids.split(",") if track_id.strip()]
+    if len(track_ids) > settings.SPOTIFY_TRACKS_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Too many track ids (max {settings.SPOTIFY_TRACKS_MAX_IDS})"
+        )
+    
+    tracks = await spotify_service.get_tracks(current_user.id, track_ids)
+    if tracks is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to get tracks"
+        )
+    
+    return {"tracks": tracks}
+
 @router.get("/tracks/{track_id}")
-async def get_track(track_id: str, user_id: str, db: Session = Depends(get_db)):
+async def get_track(track_id: str, current_user: UserResponse = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Obtenir les détails d'une track"""
     spotify_service = SpotifyService(db)
     
-    track = spotify_service.get_track(user_id, track_id)
+    track = await spotify_service.get_track(current_user.id, track_id)
     if track is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -48,15 +72,22 @@ async def get_track(track_id: str, user_id: str, db: Session = Depends(get_db)):
     return track
 
 @router.get("/search")
-async def search_tracks(query: str, user_id: str, db: Session = Depends(get_db)):
+async def search_tracks(query: str, current_user: UserResponse = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Rechercher des tracks"""
     spotify_service = SpotifyService(db)
     
-    tracks = spotify_service.search_tracks(user_id, query)
+    tracks = await spotify_service.search_tracks(current_user.id, query)
     if tracks is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Search failed"
         )
     
-    return {"tracks": tracks}
\ No newline at end of file
+    return {"tracks": tracks}
+
+@router.get("/cache/stats", dependencies=[Depends(require_admin)])
+async def get_cache_stats():
+    """Statistiques du cache de métadonnées Spotify (hits, misses, évictions)"""
+    spotify_service = SpotifyService()
+    
+    return spotify_service.get_cache_stats()
@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.schemas.vote import VoteCreate, VoteResponse, VoteResults
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.security import get_current_user, require_admin
+from app.schemas.user import UserResponse
+from app.schemas.vote import VoteCreate, VoteResponse, VoteResults, VoteResultsChanges
+from app.services.session_service import SessionService
+from app.services.vote_buffer import vote_buffer
 from app.services.voting_service import VotingService
 from app.utils.helpers import get_db
+from app.websocket.manager import websocket_manager
 
 router = APIRouter(prefix="/api/votes", tags=["votes"])
 
@@ -10,24 +15,23 @@ router = APIRouter(prefix="/api/votes", tags=["votes"])
 async def submit_vote(
     session_id: str,
     vote_data: VoteCreate,
-    user_id: str,
-    db: Session = Depends(get_db)
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Soumettre un vote pour une track"""
+    user_id = current_user.id
     voting_service = VotingService(db)
     
     # Vérifier que l'utilisateur est dans la session
-    from app.services.session_service import SessionService
-    session_service = SessionService(db)
-    session = session_service.get_session(session_id)
+    from app.services.session_store import session_store
     
-    if not session or user_id not in session.participants:
+    if not await session_store.is_participant(db, session_id, user_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User not in session"
         )
     
-    vote = voting_service.submit_vote(
+    vote = await voting_service.submit_vote(
         session_id=session_id,
         user_id=user_id,
         track_id=vote_data.track_id,
@@ -40,22 +44,70 @@ async def submit_vote(
             detail="Failed to submit vote"
         )
     
+    # Pousser le nouveau compteur de la track aux clients et aux files de votes de chaque worker
+    # (mode tampon : diffusé après l'écriture du lot, avec sa nouvelle version)
+    if not vote_buffer.enabled:
+        results = await voting_service.get_track_results(session_id, vote_data.track_id)
+        await websocket_manager.broadcast_vote_results(
+            session_id,
+            results,
+            user_id=user_id,
+            vote_type=vote_data.vote_type
+        )
+    
     return VoteResponse.model_validate(vote)
 
+@router.get("/buffer/stats", dependencies=[Depends(require_admin)])
+async def get_buffer_stats():
+    """Statistiques du tampon d'écriture des votes"""
+    return vote_buffer.get_stats()
+
 @router.get("/{session_id}/track/{track_id}/results", response_model=VoteResults)
-async def get_track_results(session_id: str, track_id: str, db: Session = Depends(get_db)):
+async def get_track_results(session_id: str, track_id: str, db: AsyncSession = Depends(get_db)):
     """Obtenir les résultats de vote pour une track spécifique"""
     voting_service = VotingService(db)
     
-    results = voting_service.get_track_results(session_id, track_id)
+    results = await voting_service.get_track_results(session_id, track_id)
     
     return VoteResults(**results)
 
 @router.get("/{session_id}/results")
-async def get_all_results(session_id: str, db: Session = Depends(get_db)):
+async def get_all_results(session_id: str, db: AsyncSession = Depends(get_db)):
     """Obtenir tous les résultats de vote d'une session"""
     voting_service = VotingService(db)
     
-    results = voting_service.get_all_results(session_id)
+    results = await voting_service.get_all_results(session_id)
+    
+    return results
+
+@router.get("/{session_id}/results/changes", response_model=VoteResultsChanges)
+async def get_results_changes(session_id: str, since_version: int = 0, db: AsyncSession = Depends(get_db)):
+    """Obtenir les résultats modifiés depuis une version (resynchronisation)"""
+    voting_service = VotingService(db)
+    
+    return await voting_service.get_results_since(session_id, since_version)
+
+@router.post("/{session_id}/results/rebuild")
+async def rebuild_results(
+    session_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Reconstruire les compteurs de votes d'une session à partir des votes (hôte seulement)"""
+    session = await SessionService(db).get_session(session_id)
+    if not session or session.host_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only host can rebuild vote results or session not found"
+        )
+    
+    voting_service = VotingService(db)
+    
+    rebuilt = await voting_service.rebuild_tallies(session_id)
+    if rebuilt < 0:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to rebuild vote results"
+        )
     
-    return results
\ No newline at end of file
+    return {"message": "Vote results rebuilt", "tracks": rebuilt}
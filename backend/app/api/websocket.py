@@ -0,0 +1,35 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from app.core.security import authenticate_token, socket_token
+from app.websocket.manager import websocket_manager
+from app.websocket.socketio import socketio_endpoint
+
+router = APIRouter(tags=["websocket"])
+
+# Transport Socket.IO utilisé par l'application Flutter
+router.add_api_websocket_route("/socket.io/", socketio_endpoint)
+
+@router.websocket("/ws/{session_id}")
+async def websocket_endpoint(websocket: WebSocket, session_id: str):
+    """WebSocket brut : messages JSON {"type": ...} dans les deux sens (token JWT requis)"""
+    user = await authenticate_token(socket_token(websocket))
+    if user is None:
+        await websocket.close(code=4401)
+        return
+
+    user_id = user.id
+    if not await websocket_manager.is_participant(session_id, user_id):
+        await websocket.close(code=4403)
+        return
+    
+    connection = await websocket_manager.connect(websocket, session_id, user_id)
+    
+    try:
+        while True:
+            data = await websocket.receive_json()
+            await websocket_manager.handle_websocket_message(connection, session_id, user_id, data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connection.stop()
+        await websocket_manager.leave(connection)
+        await connection.wait_closed()
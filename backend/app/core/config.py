@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Spotify API Configuration
@@ -7,6 +7,33 @@ class Settings(BaseSettings):
     SPOTIFY_CLIENT_SECRET: str
     SPOTIFY_REDIRECT_URI: str = "https://spotify-party.onrender.com/api/auth/callback"
     
+    # Client HTTP Spotify
+    SPOTIFY_API_BASE_URL: str = "https://api.spotify.com/v1"
+    SPOTIFY_ACCOUNTS_BASE_URL: str = "https://accounts.spotify.com"
+    SPOTIFY_HTTP_TIMEOUT_SECONDS: float = 10.0
+    SPOTIFY_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    SPOTIFY_MAX_CONNECTIONS: int = 100
+    SPOTIFY_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    SPOTIFY_MAX_RETRIES: int = 3
+    SPOTIFY_RETRY_BACKOFF_SECONDS: float = 0.5
+    SPOTIFY_MAX_RETRY_AFTER_SECONDS: float = 30.0
+    
+    # Cache des métadonnées Spotify
+    SPOTIFY_CACHE_MAX_ENTRIES: int = 5000
+    SPOTIFY_CACHE_TTL_SECONDS: float = 3600
+    SPOTIFY_SNAPSHOT_TTL_SECONDS: float = 30
+    SPOTIFY_PLAYLISTS_TTL_SECONDS: float = 60
+    SPOTIFY_SEARCH_TTL_SECONDS: float = 300
+    SPOTIFY_TRACK_BATCH_SIZE: int = 50
+    SPOTIFY_TRACK_BATCH_WINDOW_MS: float = 10
+    # Nombre maximum d'ids par appel à GET /api/spotify/tracks
+    SPOTIFY_TRACKS_MAX_IDS: int = 500
+    
+    # Rafraîchissement anticipé des tokens Spotify
+    TOKEN_REFRESH_INTERVAL_SECONDS: float = 60
+    TOKEN_REFRESH_MARGIN_SECONDS: int = 300
+    TOKEN_EXPIRY_SKEW_SECONDS: int = 60
+    
     # Frontend URL
     FRONTEND_URL: str = "https://spotify-party.onrender.com"
     
@@ -14,9 +41,110 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str = "your-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Token de renouvellement : échangé contre un nouveau token d'accès sans repasser par Spotify
+    JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    # Caches de l'authentification Bearer (tokens vérifiés, projection utilisateur)
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 5000
+    AUTH_USER_CACHE_TTL_SECONDS: float = 300
+    
+    # Fichiers statiques Flutter : variantes compressées générées au démarrage
+    # (répertoire temporaire si STATIC_CACHE_DIR est vide)
+    STATIC_COMPRESS_ON_STARTUP: bool = True
+    STATIC_CACHE_DIR: str = ""
+    STATIC_GZIP_LEVEL: int = 9
+    STATIC_BROTLI_QUALITY: int = 9
     
     # Database
     DATABASE_URL: str = "sqlite:///./spotify_party.db"
+    # URL du driver asynchrone (déduite de DATABASE_URL si vide)
+    ASYNC_DATABASE_URL: Optional[str] = None
+    
+    # Sessions actives en cache mémoire (modifications écrites tout de suite en
+    # base) : durée de vie d'une copie, borne sur le changement fait par un autre worker
+    SESSION_STORE_TTL_SECONDS: float = 2
+    SESSION_STORE_MAX_ENTRIES: int = 10000
+    # Codes de session : longueur, réserve de codes libres et quarantaine
+    # d'un code libéré avant sa réutilisation
+    SESSION_CODE_LENGTH: int = 6
+    SESSION_CODE_POOL_SIZE: int = 256
+    SESSION_CODE_RECYCLE_AFTER_SECONDS: float = 3600
+    
+    # Nettoyage en arrière-plan : expiration des sessions inactives, puis
+    # votes résumés dans vote_tallies et supprimés par lots
+    REAPER_ENABLED: bool = True
+    REAPER_INTERVAL_SECONDS: float = 300
+    SESSION_IDLE_TIMEOUT_SECONDS: float = 21600
+    SESSION_ARCHIVE_AFTER_SECONDS: float = 3600
+    REAPER_MAX_SESSIONS_PER_RUN: int = 100
+    REAPER_DELETE_BATCH_SIZE: int = 500
+    REAPER_BATCH_PAUSE_MS: float = 20
+    
+    # Lecture en cours de l'hôte (/me/player) interrogée une fois par session :
+    # rythme normal, accéléré en fin de track, espacé jusqu'au maximum sans lecture
+    PLAYBACK_POLL_ENABLED: bool = True
+    PLAYBACK_POLL_INTERVAL_SECONDS: float = 5
+    PLAYBACK_POLL_MIN_INTERVAL_SECONDS: float = 1
+    PLAYBACK_POLL_NEAR_END_SECONDS: float = 10
+    PLAYBACK_POLL_PAUSED_MAX_SECONDS: float = 30
+    PLAYBACK_POSITION_TOLERANCE_MS: int = 3000
+    # Bail du worker qui interroge une session (plus long que l'intervalle maximum)
+    PLAYBACK_POLL_LEASE_SECONDS: float = 45
+    
+    # Métriques Prometheus (/api/metrics) : durée des routes, SQL et appels Spotify
+    METRICS_ENABLED: bool = True
+    
+    # Mode diagnostic : profileur par requête (en-tête X-Profile avec le jeton
+    # admin, ou fraction du trafic), requêtes SQL lentes, blocages de la boucle
+    DIAGNOSTICS_ADMIN_TOKEN: str = ""
+    PROFILER_SAMPLE_RATE: float = 0.0
+    PROFILER_INTERVAL_MS: float = 1
+    PROFILER_OUTPUT_DIR: str = ""
+    PROFILER_MAX_FILES: int = 200
+    SLOW_QUERY_THRESHOLD_MS: float = 100
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_MS: float = 50
+    LOOP_LAG_WARN_MS: float = 100
+    
+    # Pool de connexions (pre-ping : connexion vérifiée à chaque emprunt)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # SQLite : un pool d'écriture (un seul écrivain) et un pool de lecture
+    DB_SPLIT_READ_WRITE: bool = True
+    DB_WRITE_POOL_SIZE: int = 1
+    # Écrivains de fond (rafraîchissement des tokens, flushes, reaper) : leur
+    # propre connexion, pour ne pas attendre celle qu'une requête garde ouverte
+    DB_BACKGROUND_WRITE_POOL_SIZE: int = 1
+    DB_READ_POOL_SIZE: int = 8
+    
+    # Profil SQLite (PRAGMA appliqués à chaque connexion)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 30000
+    SQLITE_MMAP_SIZE_BYTES: int = 268435456
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    
+    # Tampon d'écriture des votes (opt-in) : votes acquittés en mémoire puis
+    # écrits par lots, une transaction par lot
+    VOTE_BUFFER_ENABLED: bool = False
+    VOTE_BUFFER_FLUSH_INTERVAL_MS: float = 50
+    VOTE_BUFFER_MAX_BATCH: int = 500
+    # Borne de perte en cas de crash : votes acquittés non écrits au maximum
+    VOTE_BUFFER_MAX_PENDING: int = 5000
+    
+    # WebSocket / Socket.IO
+    SOCKETIO_PING_INTERVAL_MS: int = 25000
+    SOCKETIO_PING_TIMEOUT_MS: int = 20000
+    SOCKETIO_MAX_PAYLOAD: int = 1000000
+    WS_SEND_QUEUE_SIZE: int = 64
+    WS_SEND_TIMEOUT_SECONDS: float = 5.0
+    
+    # Broker pub/sub entre workers (ex: redis://localhost:6379/0), vide = un seul process
+    BROKER_URL: Optional[str] = None
+    BROKER_CHANNEL_PREFIX: str = "spotify-party"
     
     # CORS
     ALLOWED_ORIGINS: List[str] = [
@@ -1,8 +1,16 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
+import secrets
+import time
+from fastapi import Depends, Header, HTTPException, WebSocket, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.models.user import User
+from app.schemas.user import UserResponse
+from app.utils.cache import TTLCache
+from app.utils.helpers import AsyncSessionLocal
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -17,9 +25,114 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(user_id: str) -> str:
+    """Token de renouvellement (type "refresh") : refusé comme token d'accès"""
+    expire = datetime.utcnow() + timedelta(days=settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS)
+    return jwt.encode({"sub": user_id, "type": "refresh", "exp": expire}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+def verify_refresh_token(token: str) -> Optional[str]:
+    """Utilisateur d'un token de renouvellement valide"""
+    payload = verify_token(token)
+    if payload is None or payload.get("type") != "refresh" or not payload.get("sub"):
+        return None
+    return payload["sub"]
+
 def verify_token(token: str):
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
         return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+# ===== Authentification Bearer =====
+
+# Tokens déjà vérifiés -> payload, jusqu'à leur expiration. La clé est le
+# token complet (en-tête, payload et signature) : une signature valide
+# recollée sur un autre payload ne tombe jamais dans le cache.
+token_cache = TTLCache(settings.AUTH_TOKEN_CACHE_MAX_ENTRIES, settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# Projection de l'utilisateur (sans ses tokens Spotify) par id
+user_cache = TTLCache(settings.AUTH_USER_CACHE_MAX_ENTRIES, settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+auth_stats = {"verifications": 0, "rejected": 0}
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def verify_token_cached(token: str) -> Optional[Dict[str, Any]]:
+    """Payload d'un token valide, vérifié (HMAC) une seule fois tant qu'il n'expire pas"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    auth_stats["verifications"] += 1
+    payload = verify_token(token)
+    if payload is None or not payload.get("sub") or payload.get("type") == "refresh":
+        auth_stats["rejected"] += 1
+        return None
+
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0:
+        token_cache.set(token, payload, remaining)
+    return payload
+
+async def _load_user(user_id: str) -> Optional[UserResponse]:
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+        return UserResponse.model_validate(user) if user else None
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+async def authenticate_token(token: Optional[str]) -> Optional[UserResponse]:
+    """Utilisateur d'un token (HTTP Bearer ou sockets), None si absent, invalide ou expiré"""
+    if not token:
+        return None
+    payload = verify_token_cached(token)
+    if payload is None:
+        return None
+
+    user_id = payload["sub"]
+    return await user_cache.get_or_load(user_id, lambda: _load_user(user_id))
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> UserResponse:
+    """Dépendance FastAPI : utilisateur du token Bearer (sans HMAC ni requête sur le chemin chaud)"""
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+
+    user = await authenticate_token(credentials.credentials)
+    if user is None:
+        raise _unauthorized("Invalid or expired token")
+    return user
+
+def socket_token(websocket: WebSocket) -> Optional[str]:
+    """Token d'une connexion socket : ?token= (navigateurs) ou en-tête Authorization"""
+    token = websocket.query_params.get("token")
+    if token:
+        return token
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    return credentials if scheme.lower() == "bearer" and credentials else None
+
+def require_admin(x_diagnostics_token: Optional[str] = Header(default=None)):
+    """Jeton admin (DIAGNOSTICS_ADMIN_TOKEN) : statistiques internes, profils, SQL"""
+    if not settings.DIAGNOSTICS_ADMIN_TOKEN or not x_diagnostics_token or not secrets.compare_digest(
+        x_diagnostics_token, settings.DIAGNOSTICS_ADMIN_TOKEN
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Diagnostics token required"
+        )
+
+def forget_user(user_id: str):
+    """Invalider la projection d'un utilisateur modifié"""
+    user_cache.delete(user_id)
+
+def get_auth_stats() -> Dict[str, Any]:
+    return {
+        **auth_stats,
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats()
+    }
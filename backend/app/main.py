@@ -1,17 +1,64 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
+import asyncio
 import os
 
 # Import des routers
 from app.api.auth import router as auth_router
+from app.api.diagnostics import router as diagnostics_router
 from app.api.sessions import router as sessions_router
 from app.api.votes import router as votes_router
 from app.api.spotify import router as spotify_router
+from app.api.websocket import router as websocket_router
+from app.core.security import get_auth_stats, require_admin
+from app.services.spotify_client import spotify_client
+from app.services.spotify_service import spotify_service
+from app.services.code_allocator import code_allocator
+from app.services.playback_poller import playback_poller
+from app.services.queue_engine import queue_engine
+from app.services.session_reaper import session_reaper
+from app.services.session_store import session_store
+from app.services.token_manager import token_manager
+from app.services.vote_buffer import vote_buffer
+from app.utils.diagnostics import ProfilerMiddleware, loop_monitor, profiler, slow_query_log
+from app.utils.helpers import dispose_engines
+from app.utils.metrics import MetricsMiddleware, metrics
+from app.utils.static_files import StaticBundle
+from app.websocket.manager import delivery_stats, websocket_manager
 
-app = FastAPI(title="Spotify Party API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Démarrage des tâches de fond
+    await loop_monitor.start()
+    await websocket_manager.start()
+    await token_manager.start()
+    await code_allocator.load_from_db()
+    await vote_buffer.start(websocket_manager.broadcast_vote_results)
+    await session_reaper.start()
+    await playback_poller.start(websocket_manager.broadcast_to_session, websocket_manager.broker)
+    if static_bundle is not None and settings.STATIC_COMPRESS_ON_STARTUP:
+        # Compression hors de la boucle d'événements (variantes réutilisées d'un démarrage à l'autre)
+        await asyncio.to_thread(
+            static_bundle.compress,
+            settings.STATIC_CACHE_DIR,
+            settings.STATIC_GZIP_LEVEL,
+            settings.STATIC_BROTLI_QUALITY
+        )
+    yield
+    # Arrêt propre (votes en attente écrits avant de fermer)
+    await playback_poller.stop()
+    await session_reaper.stop()
+    await vote_buffer.stop()
+    await token_manager.stop()
+    await websocket_manager.stop()
+    await spotify_client.aclose()
+    await loop_monitor.stop()
+    await dispose_engines()
+
+app = FastAPI(title="Spotify Party API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -22,6 +69,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if profiler.enabled:
+    app.add_middleware(ProfilerMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # ===== ROUTES API (DOIVENT ÊTRE AVANT LE CATCH-ALL) =====
 @app.get("/api")
 async def api_root():
@@ -31,11 +83,51 @@ async def api_root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/static/stats", dependencies=[Depends(require_admin)])
+async def static_stats():
+    """Statistiques du service des fichiers statiques (réponses compressées, 304)"""
+    if static_bundle is None:
+        return {"files": 0}
+    return static_bundle.get_stats()
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Métriques au format texte Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Sockets ouvertes et statistiques des services, lues au scrape
+metrics.gauge(
+    "websocket_connections", "Open sockets on this worker by protocol",
+    lambda: {(protocol,): count for protocol, count in websocket_manager.get_stats()["connections"].items()},
+    ("protocol",)
+)
+metrics.gauge("websocket_rooms", "Sessions with at least one open socket on this worker",
+              lambda: len(websocket_manager.active_connections))
+metrics.gauge("websocket_queued_messages", "Messages waiting in socket send queues",
+              lambda: websocket_manager.get_stats()["queued_messages"])
+metrics.register_stats("websocket_delivery", lambda: delivery_stats)
+metrics.register_stats("spotify_client", lambda: spotify_client.stats)
+metrics.register_stats("spotify_cache", spotify_service.get_cache_stats)
+metrics.register_stats("auth", get_auth_stats)
+metrics.register_stats("tokens", token_manager.get_stats)
+metrics.register_stats("session_store", session_store.get_stats)
+metrics.register_stats("session_codes", code_allocator.get_stats)
+metrics.register_stats("queue", queue_engine.get_stats)
+metrics.register_stats("playback", playback_poller.get_stats)
+metrics.register_stats("vote_buffer", vote_buffer.get_stats)
+metrics.register_stats("reaper", session_reaper.get_stats)
+metrics.register_stats("slow_queries", slow_query_log.get_stats)
+metrics.register_stats("profiler", profiler.get_stats)
+metrics.register_stats("event_loop", loop_monitor.get_stats)
+metrics.register_stats("static", lambda: static_bundle.get_stats() if static_bundle is not None else {})
+
 # Include routers avec préfixe /api
 app.include_router(auth_router)
 app.include_router(sessions_router)
 app.include_router(votes_router)
 app.include_router(spotify_router)
+app.include_router(websocket_router)
+app.include_router(diagnostics_router)
 
 # ===== SERVIR LES FICHIERS STATIQUES FLUTTER =====
 # CHEMIN CORRIGÉ : utiliser frontend/ au lieu de mobile_app/build/web
@@ -45,42 +137,37 @@ static_path = os.path.join(os.path.dirname(__file__), "..", "..", "frontend")
 if os.path.exists(static_path):
     print(f"✅ Serving Flutter app from: {static_path}")
     
-    # Monter les dossiers statiques
-    assets_path = os.path.join(static_path, "assets")
-    if os.path.exists(assets_path):
-        app.mount("/assets", StaticFiles(directory=assets_path), name="assets")
-    
-    # Monter canvaskit si existe
-    canvaskit_path = os.path.join(static_path, "canvaskit")
-    if os.path.exists(canvaskit_path):
-        app.mount("/canvaskit", StaticFiles(directory=canvaskit_path), name="canvaskit")
+    # Build indexé une fois (ETag, variantes .br/.gz) : plus d'accès disque par requête
+    static_bundle = StaticBundle(static_path)
     
     # Route principale pour servir l'app Flutter
     @app.get("/")
-    async def serve_app():
-        index_path = os.path.join(static_path, "index.html")
-        if os.path.exists(index_path):
-            return FileResponse(index_path)
+    async def serve_app(request: Request):
+        index = static_bundle.get("index.html")
+        if index is not None:
+            return static_bundle.response(index, request)
         return {"error": "index.html not found"}
     
     # Catch-all pour le routing Flutter (SPA) - DOIT ÊTRE EN DERNIER
     @app.get("/{full_path:path}")
-    async def catch_all(full_path: str):
+    async def catch_all(full_path: str, request: Request):
         # NE PAS intercepter les routes API - CORRECTION ICI
         if full_path.startswith("api/") or full_path.startswith("auth/"):
             return {"error": "API route not found"}
         
-        # Si c'est un fichier qui existe, le servir
-        file_path = os.path.join(static_path, full_path)
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            return FileResponse(file_path)
+        # Si c'est un fichier du build, le servir
+        entry = static_bundle.get(full_path)
+        if entry is not None:
+            return static_bundle.response(entry, request)
         
         # Sinon, servir index.html pour le routing côté client
-        index_path = os.path.join(static_path, "index.html")
-        if os.path.exists(index_path):
-            return FileResponse(index_path)
+        index = static_bundle.get("index.html")
+        if index is not None:
+            return static_bundle.response(index, request)
         return {"error": "Not found"}
 else:
+    static_bundle = None
+    
     print(f"⚠️ Flutter build not found at: {static_path}")
     print("Build Flutter locally and copy to frontend/ folder")
     
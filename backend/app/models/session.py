@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Boolean, DateTime, JSON, Text
+from sqlalchemy import Column, String, Boolean, DateTime, JSON, Text, ForeignKey, Index, text
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 
@@ -9,13 +10,48 @@ class Session(Base):
     __tablename__ = "sessions"
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    code = Column(String(6), unique=True, nullable=False, index=True)
+    code = Column(String(6), nullable=False, index=True)
     host_id = Column(String(36), nullable=False, index=True)
     name = Column(String(100), default="Session Spotify")
     playlist_ids = Column(JSON, default=list)
-    participants = Column(JSON, default=list)
     current_track = Column(JSON, nullable=True)
     track_queue = Column(JSON, default=list)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Votes résumés dans vote_tallies puis supprimés (nettoyage en arrière-plan)
+    archived_at = Column(DateTime, nullable=True)
+    
+    members = relationship(
+        "SessionParticipant",
+        order_by="SessionParticipant.joined_at",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+    
+    __table_args__ = (
+        Index("ix_sessions_active_updated_at", "is_active", "updated_at"),
+        # Code unique parmi les sessions actives seulement : les codes des
+        # sessions fermées sont réattribués (voir code_allocator)
+        Index(
+            "uq_sessions_active_code", "code",
+            unique=True,
+            sqlite_where=text("is_active = 1"),
+            postgresql_where=text("is_active")
+        ),
+    )
+    
+    @property
+    def participants(self):
+        return [member.user_id for member in self.members]
+
+class SessionParticipant(Base):
+    __tablename__ = "session_participants"
+    
+    session_id = Column(String(36), ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String(36), primary_key=True)
+    joined_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_session_participants_user_id", "user_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer, Enum
+from sqlalchemy import Column, String, DateTime, Integer, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 import uuid
@@ -13,4 +13,34 @@ class Vote(Base):
     user_id = Column(String(36), nullable=False, index=True)
     track_id = Column(String(100), nullable=False)
     vote_type = Column(String(10), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    # Type du vote remplacé par le dernier upsert (NULL pour un nouveau vote)
+    previous_vote_type = Column(String(10), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("uq_votes_session_user_track", "session_id", "user_id", "track_id", unique=True),
+    )
+
+class VoteTally(Base):
+    """Compteurs de votes agrégés par (session, track), maintenus à chaque vote"""
+    __tablename__ = "vote_tallies"
+    
+    session_id = Column(String(36), primary_key=True)
+    track_id = Column(String(100), primary_key=True)
+    likes = Column(Integer, nullable=False, default=0)
+    dislikes = Column(Integer, nullable=False, default=0)
+    total_votes = Column(Integer, nullable=False, default=0)
+    # Version de session au dernier changement (croissante par session)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_vote_tallies_session_version", "session_id", "version"),
+    )
+
+class VoteVersion(Base):
+    """Version courante des résultats d'une session, incrémentée à chaque changement de compteur"""
+    __tablename__ = "vote_versions"
+    
+    session_id = Column(String(36), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
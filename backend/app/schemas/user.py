@@ -16,4 +16,12 @@ class UserResponse(UserBase):
     
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Dict
 from datetime import datetime
 
 class VoteBase(BaseModel):
@@ -22,4 +23,9 @@ class VoteResults(BaseModel):
     track_id: str
     likes: int = 0
     dislikes: int = 0
-    total_votes: int = 0
\ No newline at end of file
+    total_votes: int = 0
+    version: int = 0
+
+class VoteResultsChanges(BaseModel):
+    version: int
+    results: Dict[str, VoteResults]
\ No newline at end of file
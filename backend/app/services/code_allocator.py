@@ -0,0 +1,200 @@
+"""Allocation des codes de session sans collision
+
+Un code tiré au hasard pouvait déjà appartenir à une session : l'insertion
+échouait sur la contrainte d'unicité et la création renvoyait None.
+L'allocateur connaît les codes réservés (sessions actives et codes en
+quarantaine) et garde une réserve de codes libres tirés à l'avance : créer
+une session prend un code de la réserve, sans requête ni nouvel essai.
+
+Un code libéré (session fermée, quittée par l'hôte ou expirée) reste en
+quarantaine SESSION_CODE_RECYCLE_AFTER_SECONDS, pour qu'un ancien code
+partagé ne mène pas à une autre session, puis repasse en tête de la
+réserve. En base, seul le code des sessions actives est unique.
+
+L'allocateur est propre à chaque worker. Un autre worker ne voit les codes
+utilisés ailleurs qu'au rechargement depuis la base : une insertion refusée
+(code pris entre-temps) écarte le code et relance ce chargement. Une
+libération n'est connue que du worker qui l'a faite : ailleurs le code
+reste réservé jusqu'au redémarrage, et la quarantaine ne vaut que pour les
+codes de ce worker.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, Optional, Set, Tuple
+import secrets
+import time
+
+from sqlalchemy import or_, select
+
+from app.core.config import settings
+from app.models.session import Session as SessionModel
+from app.utils.helpers import AsyncSessionLocal
+
+# Sans 0/O ni 1/I/L : codes lus à voix haute ou recopiés
+CODE_ALPHABET = "23456789ABCDEFGHJKMNPQRSTUVWXYZ"
+
+class CodeSpaceExhausted(Exception):
+    pass
+
+class CodeAllocator:
+    def __init__(self, length: int = None, alphabet: str = CODE_ALPHABET,
+                 pool_size: int = None, recycle_after_seconds: float = None):
+        self.length = length or settings.SESSION_CODE_LENGTH
+        self.alphabet = alphabet
+        self.capacity = len(alphabet) ** self.length
+        self.pool_size = pool_size or settings.SESSION_CODE_POOL_SIZE
+        self.recycle_after = (recycle_after_seconds if recycle_after_seconds is not None
+                              else settings.SESSION_CODE_RECYCLE_AFTER_SECONDS)
+
+        # Codes réservés : sessions actives, codes en quarantaine et réserve
+        self._reserved: Set[str] = set()
+        # Codes attribués à une session (libérés une seule fois)
+        self._in_use: Set[str] = set()
+        self._pool: Deque[str] = deque()
+        # (date de fin de quarantaine, code), dans l'ordre des libérations
+        self._cooling: Deque[Tuple[float, str]] = deque()
+        self.loaded = False
+
+        self.stats = {
+            "allocated": 0,
+            "released": 0,
+            "recycled": 0,
+            "draws": 0,
+            "rejected_draws": 0,
+            "discarded": 0
+        }
+
+    # ===== Réserve =====
+
+    def _draw(self) -> str:
+        return "".join(secrets.choice(self.alphabet) for _ in range(self.length))
+
+    def _recycle(self):
+        now = time.monotonic()
+        while self._cooling and self._cooling[0][0] <= now:
+            _, code = self._cooling.popleft()
+            # Réutilisés avant les codes neufs : la réserve reste dense
+            self._pool.appendleft(code)
+            self.stats["recycled"] += 1
+
+    def _encode(self, number: int) -> str:
+        base = len(self.alphabet)
+        chars = []
+        for _ in range(self.length):
+            number, digit = divmod(number, base)
+            chars.append(self.alphabet[digit])
+        return "".join(chars)
+
+    def _take(self, code: str):
+        self._reserved.add(code)
+        self._pool.append(code)
+
+    def _refill(self):
+        """Compléter la réserve ; le coût des tirages rejetés reste hors de reserve()"""
+        self._recycle()
+        missing = min(self.pool_size - len(self._pool), self.capacity - len(self._reserved))
+        attempts = 0
+        while missing > 0 and attempts < 16 * self.pool_size:
+            code = self._draw()
+            self.stats["draws"] += 1
+            attempts += 1
+            if code in self._reserved:
+                self.stats["rejected_draws"] += 1
+                continue
+            self._take(code)
+            missing -= 1
+
+        # Espace presque plein : parcours depuis un point aléatoire plutôt que
+        # des tirages de plus en plus souvent rejetés
+        if missing > 0:
+            start = secrets.randbelow(self.capacity)
+            for offset in range(self.capacity):
+                code = self._encode((start + offset) % self.capacity)
+                if code not in self._reserved:
+                    self._take(code)
+                    missing -= 1
+                    if missing == 0:
+                        break
+
+    def load(self, codes: Iterable[str], cooling: Iterable[Tuple[str, float]] = ()):
+        """Réserver les codes existants (actifs, et en quarantaine avec leur âge en secondes)"""
+        codes = set(codes)
+        self._reserved.update(codes)
+        self._in_use.update(codes)
+        # Codes de la réserve pris entre-temps par un autre worker
+        self._pool = deque(code for code in self._pool if code not in codes)
+        now = time.monotonic()
+        for code, age in sorted(cooling, key=lambda item: -item[1]):
+            if code not in self._reserved:
+                self._reserved.add(code)
+                self._cooling.append((now + max(0.0, self.recycle_after - age), code))
+        self._refill()
+        self.loaded = True
+
+    async def load_from_db(self):
+        """Charger les codes des sessions actives et des sessions récemment fermées"""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(SessionModel.code, SessionModel.is_active, SessionModel.updated_at).where(
+                    or_(SessionModel.is_active == True, SessionModel.archived_at.is_(None))
+                )
+            )).all()
+
+        now = datetime.utcnow()
+        active, cooling = [], []
+        for code, is_active, updated_at in rows:
+            if is_active:
+                active.append(code)
+            elif updated_at is not None and (now - updated_at).total_seconds() < self.recycle_after:
+                cooling.append((code, (now - updated_at).total_seconds()))
+        self.load(active, cooling)
+
+    # ===== Réservation =====
+
+    def reserve(self) -> str:
+        """Code libre pour une nouvelle session (réservé jusqu'à release ou cancel)"""
+        if len(self._pool) < self.pool_size // 4:
+            self._refill()
+        if not self._pool:
+            raise CodeSpaceExhausted(f"no free session code ({len(self._reserved)}/{self.capacity} reserved)")
+
+        code = self._pool.popleft()
+        self._in_use.add(code)
+        self.stats["allocated"] += 1
+        return code
+
+    def discard(self, code: str):
+        """Écarter le code d'une création échouée (peut-être pris par un autre worker)
+
+        Le code n'est pas remis dans la réserve : load_from_db() le réserve à
+        nouveau s'il appartient à une session active.
+        """
+        if code in self._in_use:
+            self._in_use.discard(code)
+            self._reserved.discard(code)
+            self.stats["discarded"] += 1
+
+    def release(self, code: Optional[str]):
+        """Libérer le code d'une session désactivée (après quarantaine)"""
+        if code not in self._in_use:
+            return
+        self._in_use.discard(code)
+        self.stats["released"] += 1
+        if self.recycle_after <= 0:
+            self._pool.appendleft(code)
+            self.stats["recycled"] += 1
+        else:
+            self._cooling.append((time.monotonic() + self.recycle_after, code))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "capacity": self.capacity,
+            "in_use": len(self._in_use),
+            "cooling": len(self._cooling),
+            "pool": len(self._pool),
+            "fill_ratio": round(len(self._reserved) / self.capacity, 6)
+        }
+
+# Instance globale
+code_allocator = CodeAllocator()
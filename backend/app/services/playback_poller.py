@@ -0,0 +1,314 @@
+"""Lecture en cours de l'hôte, interrogée une fois par session
+
+Seul l'appareil de l'hôte connaît la lecture : les invités dépendaient d'un
+track_change envoyé par l'hôte, ou devaient interroger Spotify eux-mêmes.
+Pour chaque session dont une room est ouverte, une tâche interroge
+/me/player avec le token de l'hôte et diffuse un message now_playing à la
+room, seulement si quelque chose a vraiment changé : autre track,
+lecture/pause, reprise après une période sans lecture, ou saut de position
+(seek) au-delà de PLAYBACK_POSITION_TOLERANCE_MS par rapport à la position
+attendue.
+
+Le rythme s'adapte à la lecture : PLAYBACK_POLL_INTERVAL_SECONDS pendant la
+lecture, PLAYBACK_POLL_MIN_INTERVAL_SECONDS dans les dernières
+PLAYBACK_POLL_NEAR_END_SECONDS d'une track, et un intervalle doublé à chaque
+poll sans lecture (pause, aucun appareil, erreur) jusqu'à
+PLAYBACK_POLL_PAUSED_MAX_SECONDS. Le nombre d'appels à Spotify par session
+ne dépend pas du nombre d'invités.
+
+Un seul worker interroge chaque session : celui qui tient le bail de la
+session sur le broker (PLAYBACK_POLL_LEASE_SECONDS, prolongé à chaque poll).
+Il diffuse à travers le broker ; les autres workers de la room retentent le
+bail à chaque intervalle et prennent le relais quand il est libéré ou expiré.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.session_store import session_store
+from app.services.spotify_client import SpotifyAPIError, spotify_client
+from app.services.spotify_service import format_track
+from app.services.token_manager import token_manager
+from app.utils.helpers import AsyncSessionLocal
+
+class PlaybackState:
+    __slots__ = ("track_id", "is_playing", "progress_ms", "duration_ms", "observed_at")
+
+    def __init__(self, track_id: Optional[str], is_playing: bool, progress_ms: int, duration_ms: int):
+        self.track_id = track_id
+        self.is_playing = is_playing
+        self.progress_ms = progress_ms
+        self.duration_ms = duration_ms
+        self.observed_at = time.monotonic()
+
+    def expected_progress(self, at: float) -> float:
+        """Position attendue à l'instant at si rien n'a changé"""
+        if not self.is_playing:
+            return self.progress_ms
+        return self.progress_ms + (at - self.observed_at) * 1000
+
+    @property
+    def remaining_seconds(self) -> float:
+        return max(0.0, (self.duration_ms - self.progress_ms) / 1000)
+
+class SessionPoller:
+    __slots__ = ("session_id", "task", "wakeup", "state", "idle_delay", "stopping", "leading")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup = asyncio.Event()
+        self.state: Optional[PlaybackState] = None
+        # Intervalle courant hors lecture (doublé à chaque poll)
+        self.idle_delay = 0.0
+        self.stopping = False
+        # Bail de la session détenu par ce worker
+        self.leading = False
+
+class PlaybackPoller:
+    def __init__(self, enabled: bool = None):
+        self.enabled = settings.PLAYBACK_POLL_ENABLED if enabled is None else enabled
+        self.interval = settings.PLAYBACK_POLL_INTERVAL_SECONDS
+        self.min_interval = settings.PLAYBACK_POLL_MIN_INTERVAL_SECONDS
+        self.near_end = settings.PLAYBACK_POLL_NEAR_END_SECONDS
+        self.paused_max = settings.PLAYBACK_POLL_PAUSED_MAX_SECONDS
+        self.tolerance_ms = settings.PLAYBACK_POSITION_TOLERANCE_MS
+        self.lease_seconds = settings.PLAYBACK_POLL_LEASE_SECONDS
+
+        self._pollers: Dict[str, SessionPoller] = {}
+        # Diffusion à la room sur tous les workers (ConnectionManager.broadcast_to_session)
+        self.publish: Optional[Callable[[str, dict], Awaitable[Any]]] = None
+        # Broker : bail exclusif par session
+        self.broker = None
+        self.running = False
+
+        self.latencies = deque(maxlen=256)
+        self.stats = {
+            "polls": 0,
+            "broadcasts": 0,
+            "track_changes": 0,
+            "seeks": 0,
+            "state_changes": 0,
+            "no_playback": 0,
+            "skipped_not_leader": 0,
+            "failures": 0,
+            "last_error": None
+        }
+
+    # ===== Sessions suivies =====
+
+    def watch(self, session_id: str):
+        """Suivre la lecture d'une session (première socket de la room sur ce worker)"""
+        if not self.running or session_id in self._pollers:
+            return
+        poller = SessionPoller(session_id)
+        self._pollers[session_id] = poller
+        poller.task = asyncio.create_task(self._run(poller))
+
+    def unwatch(self, session_id: str):
+        """Arrêter le suivi (room vide) : le poll en cours se termine, sans annulation"""
+        poller = self._pollers.pop(session_id, None)
+        if poller is not None:
+            poller.stopping = True
+            poller.wakeup.set()
+
+    def poke(self, session_id: str):
+        """Relire la lecture tout de suite (l'hôte vient de changer de track)"""
+        poller = self._pollers.get(session_id)
+        if poller is not None:
+            poller.wakeup.set()
+
+    # ===== Poll =====
+
+    async def _fetch(self, host_id: str) -> Optional[Dict[str, Any]]:
+        token = await token_manager.get_access_token(host_id)
+        if not token:
+            return None
+        # 204 sans corps : aucun appareil actif
+        return await spotify_client.get("/me/player", token, params={"additional_types": "track"})
+
+    def _changes(self, previous: Optional[PlaybackState], current: PlaybackState, current_track_id: Optional[str]) -> Optional[str]:
+        """Raison de diffuser (track, state, seek), None si rien n'a vraiment changé"""
+        if current.track_id != (previous.track_id if previous is not None else current_track_id):
+            return "track"
+        # Premier poll ou reprise après une période sans lecture (aucun appareil, erreur)
+        if previous is None or current.is_playing != previous.is_playing:
+            return "state"
+        expected = previous.expected_progress(current.observed_at)
+        if abs(current.progress_ms - expected) > self.tolerance_ms:
+            return "seek"
+        return None
+
+    def _next_delay(self, poller: SessionPoller) -> float:
+        state = poller.state
+        if state is None or not state.is_playing or state.track_id is None:
+            # Pas de lecture : on s'espace jusqu'au maximum
+            poller.idle_delay = min(self.paused_max, max(self.interval, poller.idle_delay * 2))
+            return poller.idle_delay
+
+        poller.idle_delay = 0.0
+        remaining = state.remaining_seconds
+        if remaining <= self.near_end:
+            return self.min_interval
+        # Réveil au début de la fenêtre de fin de track
+        return max(self.min_interval, min(self.interval, remaining - self.near_end))
+
+    async def poll_once(self, poller: SessionPoller) -> bool:
+        """Un poll d'une session, False si elle n'est plus active"""
+        async with AsyncSessionLocal() as db:
+            active = await session_store.get(db, poller.session_id)
+        if active is None or not active.is_active:
+            return False
+
+        started = time.perf_counter()
+        self.stats["polls"] += 1
+        try:
+            player = await self._fetch(active.host_id)
+        except SpotifyAPIError as e:
+            self.stats["failures"] += 1
+            self.stats["last_error"] = str(e)
+            poller.state = None
+            return True
+        finally:
+            self.latencies.append((time.perf_counter() - started) * 1000)
+
+        item = (player or {}).get("item")
+        if not item or not item.get("id"):
+            self.stats["no_playback"] += 1
+            poller.state = None
+            return True
+
+        current = PlaybackState(
+            item["id"],
+            bool(player.get("is_playing")),
+            player.get("progress_ms") or 0,
+            item.get("duration_ms") or 0
+        )
+        current_track_id = (active.current_track or {}).get("id")
+        reason = self._changes(poller.state, current, current_track_id)
+        poller.state = current
+        if reason is None:
+            return True
+
+        track = format_track(item)
+        if reason == "track":
+            self.stats["track_changes"] += 1
+            if current.track_id != current_track_id:
+                async with AsyncSessionLocal() as db:
+                    await session_store.set_current_track(db, active.id, active.host_id, track)
+        elif reason == "seek":
+            self.stats["seeks"] += 1
+        else:
+            self.stats["state_changes"] += 1
+
+        # Diffusé à tous les workers : queue_engine.observe retire la nouvelle track de leurs files
+        if self.publish is not None and not poller.stopping:
+            await self.publish(active.id, {
+                "type": "now_playing",
+                "reason": reason,
+                "track": track,
+                "is_playing": current.is_playing,
+                "progress_ms": current.progress_ms,
+                "timestamp": player.get("timestamp")
+            })
+            self.stats["broadcasts"] += 1
+        return True
+
+    def _lease_name(self, session_id: str) -> str:
+        return f"playback:{session_id}"
+
+    async def _lead(self, poller: SessionPoller) -> bool:
+        """Obtenir ou prolonger le bail de la session ; sans broker joignable, ce worker interroge"""
+        try:
+            leading = await self.broker.acquire_lease(self._lease_name(poller.session_id), self.lease_seconds)
+        except Exception as e:
+            print(f"Error acquiring playback lease of session {poller.session_id}: {e}")
+            leading = True
+        if not leading:
+            # Un autre worker interroge : état repris de zéro au relais
+            poller.state = None
+        poller.leading = leading
+        return leading
+
+    async def _release(self, poller: SessionPoller):
+        if not poller.leading:
+            return
+        poller.leading = False
+        try:
+            await self.broker.release_lease(self._lease_name(poller.session_id))
+        except Exception as e:
+            print(f"Error releasing playback lease of session {poller.session_id}: {e}")
+
+    async def _run(self, poller: SessionPoller):
+        while self.running and not poller.stopping:
+            delay = self.interval
+            if await self._lead(poller):
+                try:
+                    if not await self.poll_once(poller):
+                        break
+                except Exception as e:
+                    self.stats["failures"] += 1
+                    self.stats["last_error"] = str(e)
+                    print(f"Error polling playback of session {poller.session_id}: {e}")
+                    poller.state = None
+                delay = self._next_delay(poller)
+            else:
+                self.stats["skipped_not_leader"] += 1
+
+            try:
+                await asyncio.wait_for(poller.wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            poller.wakeup.clear()
+
+        # Room vide ou arrêt : un autre worker reprend la session sans attendre l'expiration
+        await self._release(poller)
+        if self._pollers.get(poller.session_id) is poller:
+            del self._pollers[poller.session_id]
+
+    # ===== Tâche de fond =====
+
+    async def start(self, publish: Callable[[str, dict], Awaitable[Any]], broker):
+        if not self.enabled:
+            return
+        self.publish = publish
+        self.broker = broker
+        self.running = True
+
+    async def stop(self):
+        """Arrêt propre : chaque poller termine son appel en cours"""
+        self.running = False
+        pollers = list(self._pollers.values())
+        for poller in pollers:
+            poller.stopping = True
+            poller.wakeup.set()
+        for poller in pollers:
+            if poller.task is not None:
+                await poller.task
+        self._pollers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "running": self.running,
+            "sessions": len(self._pollers),
+            "leading": sum(1 for poller in self._pollers.values() if poller.leading),
+            "poll_latency_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1], 2) if latencies else 0.0
+            }
+        }
+
+# Instance globale
+playback_poller = PlaybackPoller()
@@ -0,0 +1,300 @@
+"""File d'attente classée par les votes, tenue par le serveur
+
+Chaque client triait lui-même toutes les tracks votées après avoir tiré
+get_all_results. Le serveur garde pour chaque session active un tas indexé
+sur (score net décroissant, date du premier vote, track_id) : un vote met à
+jour sa track en O(log n), le top k se lit en O(k log k) sans trier le reste.
+
+Les files sont construites à la première lecture à partir des compteurs
+(tampon de votes compris), puis suivies vote par vote. La track choisie par
+l'hôte (POST /queue/advance, avancée manuelle) sort de la file et n'y
+revient pas.
+
+Chaque worker tient ses propres files : un worker qui construit la file d'une
+session s'abonne à sa room sur le broker, et les vote_update / track_change
+diffusés par n'importe quel worker lui parviennent (observe). Une file
+construite plus tard exclut la track en cours, comme après un redémarrage.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import heapq
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.voting_service import VotingService
+from app.websocket.broker import InMemoryBroker
+
+class RankedTrack:
+    __slots__ = ("track_id", "likes", "dislikes", "total_votes", "first_vote_at", "position")
+
+    def __init__(self, track_id: str, first_vote_at: float):
+        self.track_id = track_id
+        self.likes = 0
+        self.dislikes = 0
+        self.total_votes = 0
+        self.first_vote_at = first_vote_at
+        # Index dans le tas
+        self.position = -1
+
+    @property
+    def score(self) -> int:
+        return self.likes - self.dislikes
+
+    def key(self) -> Tuple[int, float, str]:
+        return (-self.score, self.first_vote_at, self.track_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "track_id": self.track_id,
+            "score": self.score,
+            "likes": self.likes,
+            "dislikes": self.dislikes,
+            "total_votes": self.total_votes,
+            "first_vote_at": datetime.utcfromtimestamp(self.first_vote_at).isoformat()
+        }
+
+class RankedQueue:
+    """Tas binaire indexé : chaque track connaît sa position, mise à jour en O(log n)"""
+
+    def __init__(self):
+        self._heap: List[RankedTrack] = []
+        self._tracks: Dict[str, RankedTrack] = {}
+        self.played: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        heap[i].position = i
+        heap[j].position = j
+
+    def _sift_up(self, i: int):
+        heap = self._heap
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[i].key() >= heap[parent].key():
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and heap[child].key() < heap[smallest].key():
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+    def update(self, track_id: str, likes: int, dislikes: int, total_votes: int, first_vote_at: float):
+        """Nouveaux compteurs d'une track (ajoutée si absente, retirée sans vote)"""
+        if track_id in self.played:
+            return
+
+        track = self._tracks.get(track_id)
+        if total_votes <= 0:
+            if track is not None:
+                self.remove(track_id)
+            return
+
+        if track is None:
+            track = RankedTrack(track_id, first_vote_at)
+            track.position = len(self._heap)
+            self._heap.append(track)
+            self._tracks[track_id] = track
+
+        track.likes, track.dislikes, track.total_votes = likes, dislikes, total_votes
+        self._sift_up(track.position)
+        self._sift_down(track.position)
+
+    def remove(self, track_id: str) -> Optional[RankedTrack]:
+        track = self._tracks.pop(track_id, None)
+        if track is None:
+            return None
+
+        last = len(self._heap) - 1
+        position = track.position
+        if position != last:
+            self._swap(position, last)
+        self._heap.pop()
+        if position < len(self._heap):
+            self._sift_up(position)
+            self._sift_down(position)
+        track.position = -1
+        return track
+
+    def peek(self) -> Optional[RankedTrack]:
+        return self._heap[0] if self._heap else None
+
+    def pop_played(self) -> Optional[RankedTrack]:
+        """Retirer la meilleure track et la marquer jouée"""
+        best = self.peek()
+        if best is None:
+            return None
+        self.remove(best.track_id)
+        self.played.add(best.track_id)
+        return best
+
+    def top(self, k: int) -> List[RankedTrack]:
+        """Les k meilleures tracks dans l'ordre (parcours du tas par ordre de clé)"""
+        heap = self._heap
+        if not heap or k <= 0:
+            return []
+
+        result = []
+        frontier = [(heap[0].key(), 0)]
+        while frontier and len(result) < k:
+            _, i = heapq.heappop(frontier)
+            result.append(heap[i])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child].key(), child))
+        return result
+
+class QueueEngine:
+    def __init__(self):
+        self._queues: Dict[str, RankedQueue] = {}
+        # Sessions en cours de construction -> tracks votées pendant la lecture
+        self._building: Dict[str, Set[str]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Broker des sessions (branché par le ConnectionManager) et désabonnements en cours
+        self.broker: Optional[InMemoryBroker] = None
+        self._unsubscribes: Set[asyncio.Task] = set()
+        self.stats = {"builds": 0, "updates": 0, "advances": 0}
+
+    async def _build(self, db: AsyncSession, session_id: str, exclude: Optional[str]) -> RankedQueue:
+        voting_service = VotingService(db)
+        self._building[session_id] = set()
+        try:
+            results = await voting_service.get_all_results(session_id)
+            first_votes = await voting_service.get_first_vote_times(session_id)
+
+            queue = RankedQueue()
+            if exclude:
+                queue.played.add(exclude)
+            now = datetime.utcnow()
+            for track_id, tally in results.items():
+                queue.update(
+                    track_id, tally["likes"], tally["dislikes"], tally["total_votes"],
+                    _timestamp(first_votes.get(track_id, now))
+                )
+
+            # Votes arrivés pendant la lecture : compteurs relus
+            while self._building[session_id]:
+                changed, self._building[session_id] = self._building[session_id], set()
+                for track_id in changed:
+                    tally = await voting_service.get_track_results(session_id, track_id)
+                    queue.update(
+                        track_id, tally["likes"], tally["dislikes"], tally["total_votes"],
+                        _timestamp(first_votes.get(track_id, now))
+                    )
+        finally:
+            del self._building[session_id]
+
+        self.stats["builds"] += 1
+        return queue
+
+    async def get(self, db: AsyncSession, session_id: str, current_track: Optional[dict] = None) -> RankedQueue:
+        """File d'une session, construite à la première lecture"""
+        queue = self._queues.get(session_id)
+        if queue is not None:
+            return queue
+
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            queue = self._queues.get(session_id)
+            if queue is None:
+                current_id = (current_track or {}).get("id")
+                # Abonné avant la lecture : un vote d'un autre worker arrive
+                # au plus tard pendant la construction
+                if self.broker is not None:
+                    await self.broker.subscribe(session_id)
+                try:
+                    queue = await self._build(db, session_id, current_id)
+                except Exception:
+                    self._unfollow(session_id)
+                    raise
+                self._queues[session_id] = queue
+        self._locks.pop(session_id, None)
+        return queue
+
+    def update(self, session_id: str, tally: Dict[str, int]):
+        """Compteurs d'une track après un vote (sans effet si la file n'est pas construite)"""
+        building = self._building.get(session_id)
+        if building is not None:
+            building.add(tally["track_id"])
+            return
+
+        queue = self._queues.get(session_id)
+        if queue is None:
+            return
+        queue.update(
+            tally["track_id"], tally["likes"], tally["dislikes"], tally["total_votes"],
+            _timestamp(datetime.utcnow())
+        )
+        self.stats["updates"] += 1
+
+    async def advance(self, db: AsyncSession, session_id: str, current_track: Optional[dict] = None) -> Optional[RankedTrack]:
+        """Retirer la meilleure track pour la jouer (None si la file est vide)"""
+        queue = await self.get(db, session_id, current_track)
+        best = queue.pop_played()
+        if best is not None:
+            self.stats["advances"] += 1
+        return best
+
+    def mark_played(self, session_id: str, track_id: Optional[str]):
+        """Track lancée par l'hôte : elle quitte la file"""
+        queue = self._queues.get(session_id)
+        if queue is None or not track_id:
+            return
+        queue.remove(track_id)
+        queue.played.add(track_id)
+
+    def observe(self, session_id: str, message: dict):
+        """Message diffusé dans une session, par ce worker ou un autre"""
+        message_type = message.get("type")
+        if message_type == "vote_update":
+            self.update(session_id, message)
+        elif message_type == "track_change" or (message_type == "now_playing" and message.get("reason") == "track"):
+            self.mark_played(session_id, (message.get("track") or {}).get("id"))
+
+    def drop(self, session_id: str):
+        """Oublier la file d'une session désactivée"""
+        if self._queues.pop(session_id, None) is not None:
+            self._unfollow(session_id)
+
+    def session_ids(self) -> List[str]:
+        return list(self._queues)
+
+    def _unfollow(self, session_id: str):
+        if self.broker is None:
+            return
+        task = asyncio.ensure_future(self.broker.unsubscribe(session_id))
+        self._unsubscribes.add(task)
+        task.add_done_callback(self._unsubscribes.discard)
+
+    async def stop(self):
+        """Attendre les désabonnements en cours (avant l'arrêt du broker)"""
+        if self._unsubscribes:
+            await asyncio.gather(*self._unsubscribes, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "sessions": len(self._queues),
+            "tracks": sum(len(queue) for queue in self._queues.values())
+        }
+
+def _timestamp(value: datetime) -> float:
+    # Dates naïves en UTC (datetime.utcnow)
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+# Instance globale
+queue_engine = QueueEngine()
@@ -0,0 +1,213 @@
+"""Nettoyage en arrière-plan des sessions inactives et de leurs votes
+
+Fermer ou quitter une session ne faisait que passer is_active à False : les
+lignes sessions et votes s'accumulaient dans la base. Toutes les
+REAPER_INTERVAL_SECONDS, le reaper :
+
+1. expire les sessions actives sans modification ni vote depuis
+   SESSION_IDLE_TIMEOUT_SECONDS, et oublie les files de votes des sessions
+   fermées sur un autre worker ;
+2. archive les sessions fermées depuis SESSION_ARCHIVE_AFTER_SECONDS : les
+   compteurs vote_tallies sont reconstruits une dernière fois à partir des
+   votes et deviennent le résumé par track de la session ;
+3. supprime les votes des sessions archivées par lots de
+   REAPER_DELETE_BATCH_SIZE, une transaction courte par lot, avec une pause
+   entre deux lots pour laisser passer les autres écritures.
+
+Chaque étape est rejouable : un arrêt entre deux lots reprend au passage
+suivant.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.queue_engine import queue_engine
+from app.services.session_service import SessionService
+from app.services.session_store import session_store
+from app.services.vote_buffer import vote_buffer
+from app.services.voting_service import VotingService
+from app.utils.helpers import BackgroundSessionLocal
+
+class SessionReaper:
+    def __init__(self, enabled: bool = None, interval_seconds: float = None, idle_timeout_seconds: float = None,
+                 archive_after_seconds: float = None, batch_size: int = None):
+        self.enabled = settings.REAPER_ENABLED if enabled is None else enabled
+        self.interval = interval_seconds or settings.REAPER_INTERVAL_SECONDS
+        self.idle_timeout = timedelta(seconds=idle_timeout_seconds or settings.SESSION_IDLE_TIMEOUT_SECONDS)
+        self.archive_after = timedelta(seconds=archive_after_seconds if archive_after_seconds is not None else settings.SESSION_ARCHIVE_AFTER_SECONDS)
+        self.batch_size = batch_size or settings.REAPER_DELETE_BATCH_SIZE
+        self.max_sessions = settings.REAPER_MAX_SESSIONS_PER_RUN
+        self.batch_pause = settings.REAPER_BATCH_PAUSE_MS / 1000
+
+        self._run_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.running = False
+        self._stopping = False
+
+        self.durations = deque(maxlen=64)
+        self.stats = {
+            "runs": 0,
+            "expired_sessions": 0,
+            "archived_sessions": 0,
+            "summarized_tracks": 0,
+            "deleted_votes": 0,
+            "delete_batches": 0,
+            "failures": 0,
+            "last_run_at": None,
+            "last_run": None,
+            "last_error": None
+        }
+
+    # ===== Étapes =====
+
+    async def expire_idle(self, now: datetime) -> int:
+        """Désactiver les sessions sans modification ni vote depuis le délai d'inactivité"""
+        cutoff = now - self.idle_timeout
+
+        async with BackgroundSessionLocal() as db:
+            candidates = await SessionService(db).get_idle_session_ids(cutoff, self.max_sessions)
+            # Une session où l'on vote encore n'est pas inactive
+            candidates = [session_id for session_id in candidates if not vote_buffer.has_pending(session_id)]
+            last_votes = await VotingService(db).get_last_vote_times(candidates)
+            idle = [session_id for session_id in candidates if last_votes.get(session_id, cutoff) <= cutoff]
+            expired = await SessionService(db).expire_sessions(idle, cutoff)
+
+            # Files de votes de sessions fermées sur un autre worker
+            held = queue_engine.session_ids()
+            closed = set(held) - await SessionService(db).get_active_ids(held)
+
+        for session_id, code in expired:
+            session_store.deactivated(session_id, code)
+        for session_id in closed:
+            queue_engine.drop(session_id)
+        return len(expired)
+
+    async def archive(self, session_id: str) -> int:
+        """Résumer les votes d'une session fermée dans vote_tallies, puis la marquer archivée"""
+        if vote_buffer.has_pending(session_id):
+            await vote_buffer.flush()
+
+        async with BackgroundSessionLocal() as db:
+            # Reconstruction idempotente : rejouée sans risque si l'arrêt survient avant le marquage
+            tracks = await VotingService(db).rebuild_tallies(session_id)
+            if tracks < 0:
+                raise RuntimeError(f"could not summarize votes of session {session_id}")
+            await SessionService(db).mark_archived(session_id)
+        return tracks
+
+    async def purge(self, session_id: str) -> int:
+        """Supprimer les votes d'une session archivée, lot par lot"""
+        deleted = 0
+        async with BackgroundSessionLocal() as db:
+            voting_service = VotingService(db)
+            while True:
+                count = await voting_service.purge_votes(session_id, self.batch_size)
+                deleted += count
+                self.stats["delete_batches"] += 1
+                self.stats["deleted_votes"] += count
+                if count < self.batch_size or self._stopping:
+                    return deleted
+                # Verrou d'écriture relâché entre deux lots
+                await asyncio.sleep(self.batch_pause)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Un passage complet : expiration, archivage, suppression des votes"""
+        async with self._run_lock:
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            report = {"expired_sessions": 0, "archived_sessions": 0, "summarized_tracks": 0, "deleted_votes": 0}
+
+            try:
+                report["expired_sessions"] = await self.expire_idle(now)
+                self.stats["expired_sessions"] += report["expired_sessions"]
+
+                async with BackgroundSessionLocal() as db:
+                    to_archive = await SessionService(db).get_archivable_session_ids(now - self.archive_after, self.max_sessions)
+                    to_purge: List[str] = await VotingService(db).get_archived_sessions_with_votes(self.max_sessions)
+
+                for session_id in to_archive:
+                    tracks = await self.archive(session_id)
+                    report["archived_sessions"] += 1
+                    report["summarized_tracks"] += tracks
+                    self.stats["archived_sessions"] += 1
+                    self.stats["summarized_tracks"] += tracks
+                    if session_id not in to_purge:
+                        to_purge.append(session_id)
+
+                for session_id in to_purge:
+                    if self._stopping:
+                        break
+                    report["deleted_votes"] += await self.purge(session_id)
+
+            except Exception as e:
+                self.stats["failures"] += 1
+                self.stats["last_error"] = str(e)
+                print(f"Error in session reaper: {e}")
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            report["duration_ms"] = round(duration_ms, 2)
+            self.durations.append(duration_ms)
+            self.stats["runs"] += 1
+            self.stats["last_run_at"] = now.isoformat()
+            self.stats["last_run"] = report
+            return report
+
+    # ===== Tâche de fond =====
+
+    async def _run(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self.running:
+                break
+
+            await self.run_once()
+
+    async def start(self):
+        if not self.enabled:
+            return
+        # Primitives liées à la boucle du serveur
+        self._run_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Arrêt propre : le passage en cours s'arrête après son lot courant"""
+        self.running = False
+        self._stopping = True
+        if self._task is not None:
+            # Pas d'annulation : un lot interrompu laisserait sa transaction ouverte
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        durations = sorted(self.durations)
+
+        def percentile(p: float) -> float:
+            if not durations:
+                return 0.0
+            return round(durations[min(len(durations) - 1, int(len(durations) * p))], 2)
+
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "running": self.running,
+            "run_duration_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(durations[-1], 2) if durations else 0.0
+            }
+        }
+
+# Instance globale
+session_reaper = SessionReaper()
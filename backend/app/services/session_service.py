@@ -1,12 +1,15 @@
-from sqlalchemy.orm import Session
-from app.models.session import Session as SessionModel
-from typing import List, Optional
+from sqlalchemy import delete, exists, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.models.session import Session as SessionModel, SessionParticipant
+from typing import List, Optional, Set, Tuple
+from datetime import datetime
 
 class SessionService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
-    
-    def create_session(self, host_id: str, code: str, name: str, playlist_ids: List[str]) -> Optional[SessionModel]:
+
+    async def create_session(self, host_id: str, code: str, name: str, playlist_ids: List[str]) -> Optional[SessionModel]:
         """Créer une nouvelle session"""
         try:
             session = SessionModel(
@@ -14,66 +17,182 @@ class SessionService:
                 code=code,
                 name=name,
                 playlist_ids=playlist_ids,
-                participants=[host_id]
+                members=[SessionParticipant(user_id=host_id)]
             )
-            
+
             self.db.add(session)
-            self.db.commit()
-            self.db.refresh(session)
-            
+            await self.db.commit()
+
             return session
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             print(f"Error creating session: {e}")
             return None
-    
-    def get_session(self, session_id: str) -> Optional[SessionModel]:
+
+    async def get_session(self, session_id: str) -> Optional[SessionModel]:
         """Obtenir une session par son ID"""
-        return self.db.query(SessionModel).filter(SessionModel.id == session_id).first()
-    
-    def get_session_by_code(self, code: str) -> Optional[SessionModel]:
+        return await self.db.get(SessionModel, session_id)
+
+    async def get_session_with_participants(self, session_id: str) -> Optional[SessionModel]:
+        """Obtenir une session et ses participants (une requête groupée pour les membres)"""
+        result = await self.db.execute(
+            select(SessionModel)
+            .options(selectinload(SessionModel.members))
+            .where(SessionModel.id == session_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_active_ids(self, session_ids: List[str]) -> Set[str]:
+        """Parmi session_ids, celles encore actives"""
+        if not session_ids:
+            return set()
+        result = await self.db.execute(
+            select(SessionModel.id).where(SessionModel.id.in_(session_ids), SessionModel.is_active == True)
+        )
+        return set(result.scalars())
+
+    async def is_participant(self, session_id: str, user_id: str) -> bool:
+        """Vérifier qu'un utilisateur fait partie d'une session active (requête sur la clé primaire)"""
+        return await self.db.scalar(
+            select(
+                exists().where(
+                    SessionParticipant.session_id == session_id,
+                    SessionParticipant.user_id == user_id,
+                    SessionModel.id == SessionParticipant.session_id,
+                    SessionModel.is_active == True
+                )
+            )
+        )
+
+    async def get_session_by_code(self, code: str) -> Optional[SessionModel]:
         """Obtenir une session par son code"""
-        return self.db.query(SessionModel).filter(
-            SessionModel.code == code, 
-            SessionModel.is_active == True
-        ).first()
-    
-    def join_session(self, code: str, user_id: str) -> Optional[SessionModel]:
-        """Rejoindre une session"""
-        session = self.get_session_by_code(code)
-        if not session:
-            return None
-        
-        if user_id not in session.participants:
-            session.participants.append(user_id)
-            self.db.commit()
-            self.db.refresh(session)
-        
-        return session
-    
-    def leave_session(self, session_id: str, user_id: str) -> bool:
+        result = await self.db.execute(
+            select(SessionModel).where(
+                SessionModel.code == code,
+                SessionModel.is_active == True
+            )
+        )
+        return result.scalars().first()
+
+    async def add_participant(self, session_id: str, user_id: str) -> bool:
+        """Ajouter un participant à une session active connue (sans relire la session)
+
+        Renvoie False si la session a été fermée entre-temps.
+        """
+        result = await self.db.execute(
+            update(SessionModel)
+            .where(SessionModel.id == session_id, SessionModel.is_active == True)
+            .values(updated_at=datetime.utcnow())
+        )
+        if not result.rowcount:
+            await self.db.rollback()
+            return False
+
+        already_joined = exists().where(
+            SessionParticipant.session_id == session_id,
+            SessionParticipant.user_id == user_id
+        )
+        await self.db.execute(
+            insert(SessionParticipant).from_select(
+                ["session_id", "user_id", "joined_at"],
+                select(literal(session_id), literal(user_id), literal(datetime.utcnow())).where(~already_joined)
+            )
+        )
+        await self.db.commit()
+        return True
+
+    async def leave_session(self, session_id: str, user_id: str) -> bool:
         """Quitter une session"""
-        session = self.get_session(session_id)
+        session = await self.get_session(session_id)
         if not session:
             return False
-        
-        if user_id in session.participants:
-            session.participants.remove(user_id)
-            
-            if user_id == session.host_id:
-                session.is_active = False
-            
-            self.db.commit()
-            return True
-        
-        return False
-    
-    def close_session(self, session_id: str, user_id: str) -> bool:
+
+        result = await self.db.execute(
+            delete(SessionParticipant).where(
+                SessionParticipant.session_id == session_id,
+                SessionParticipant.user_id == user_id
+            )
+        )
+        if not result.rowcount:
+            await self.db.rollback()
+            return False
+
+        if user_id == session.host_id:
+            session.is_active = False
+        session.updated_at = datetime.utcnow()
+
+        await self.db.commit()
+        return True
+
+    async def close_session(self, session_id: str, user_id: str) -> bool:
         """Fermer une session (hôte seulement)"""
-        session = self.get_session(session_id)
+        session = await self.get_session(session_id)
         if not session or session.host_id != user_id:
             return False
-        
+
         session.is_active = False
-        self.db.commit()
-        return True
\ No newline at end of file
+        await self.db.commit()
+        return True
+
+    async def set_current_track(self, session_id: str, user_id: str, track: Optional[dict]) -> bool:
+        """Changer la track en cours (hôte seulement)"""
+        session = await self.get_session(session_id)
+        if not session or not session.is_active or session.host_id != user_id:
+            return False
+
+        session.current_track = track
+        await self.db.commit()
+        return True
+
+    async def get_idle_session_ids(self, cutoff: datetime, limit: int) -> List[str]:
+        """Sessions actives sans modification depuis cutoff (les plus anciennes d'abord)"""
+        result = await self.db.execute(
+            select(SessionModel.id)
+            .where(SessionModel.is_active == True, SessionModel.updated_at < cutoff)
+            .order_by(SessionModel.updated_at)
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+    async def expire_sessions(self, session_ids: List[str], cutoff: datetime) -> List[Tuple[str, str]]:
+        """Désactiver des sessions toujours inactives ; renvoie (id, code) des sessions désactivées"""
+        if not session_ids:
+            return []
+
+        result = await self.db.execute(
+            update(SessionModel)
+            .where(
+                SessionModel.id.in_(session_ids),
+                SessionModel.is_active == True,
+                SessionModel.updated_at < cutoff
+            )
+            .values(is_active=False, updated_at=datetime.utcnow())
+            .returning(SessionModel.id, SessionModel.code)
+        )
+        expired = [(session_id, code) for session_id, code in result]
+        await self.db.commit()
+        return expired
+
+    async def get_archivable_session_ids(self, cutoff: datetime, limit: int) -> List[str]:
+        """Sessions fermées avant cutoff dont les votes ne sont pas encore archivés"""
+        result = await self.db.execute(
+            select(SessionModel.id)
+            .where(
+                SessionModel.is_active == False,
+                SessionModel.archived_at.is_(None),
+                SessionModel.updated_at < cutoff
+            )
+            .order_by(SessionModel.updated_at)
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+    async def mark_archived(self, session_id: str):
+        """Marquer une session archivée : ses compteurs ne sont plus reconstruits depuis les votes"""
+        await self.db.execute(
+            update(SessionModel)
+            .where(SessionModel.id == session_id)
+            .values(archived_at=datetime.utcnow())
+        )
+        await self.db.commit()
@@ -0,0 +1,204 @@
+"""Sessions actives en cache mémoire, modifications écrites tout de suite en base
+
+Les lectures du chemin chaud (détails d'une session, jointure par code,
+vérification de participation avant un vote) relisaient la ligne sessions
+et désérialisaient ses colonnes JSON à chaque requête. Le store garde les
+sessions actives sous forme d'objets compacts indexés par id et par code :
+ces lectures deviennent des accès dictionnaire.
+
+La base reste la source de vérité : création, jointure, départ, fermeture et
+track en cours y sont écrits avant de répondre, puis l'entrée locale est mise
+à jour. Un autre worker garde sa copie au plus SESSION_STORE_TTL_SECONDS ;
+une participation absente de sa copie est revérifiée en base.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.services.code_allocator import code_allocator
+from app.services.queue_engine import queue_engine
+from app.models.session import Session as SessionModel
+from app.services.session_service import SessionService
+from app.utils.cache import TTLCache
+
+class ActiveSession:
+    """Session en mémoire (mêmes attributs que le modèle pour SessionResponse)"""
+
+    __slots__ = (
+        "id", "code", "host_id", "name", "playlist_ids", "current_track", "track_queue",
+        "is_active", "created_at", "updated_at", "members"
+    )
+
+    def __init__(self, session: SessionModel):
+        self.id = session.id
+        self.code = session.code
+        self.host_id = session.host_id
+        self.name = session.name
+        self.playlist_ids = list(session.playlist_ids or [])
+        self.current_track = session.current_track
+        self.track_queue = list(session.track_queue or [])
+        self.is_active = session.is_active
+        self.created_at = session.created_at
+        self.updated_at = session.updated_at
+        # user_id -> joined_at, dans l'ordre d'arrivée
+        self.members: Dict[str, datetime] = {member.user_id: member.joined_at for member in session.members}
+
+    @property
+    def participants(self) -> List[str]:
+        return list(self.members)
+
+class ActiveSessionStore:
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None):
+        ttl = settings.SESSION_STORE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        maxsize = max_entries or settings.SESSION_STORE_MAX_ENTRIES
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+        # code -> id de session
+        self._codes = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.stats = {
+            "writes": 0,
+            "deactivated": 0
+        }
+
+    # ===== Index =====
+
+    def _index(self, session: SessionModel) -> ActiveSession:
+        active = ActiveSession(session)
+        if active.is_active:
+            self._sessions.set(active.id, active)
+            self._codes.set(active.code, active.id)
+        else:
+            self._sessions.delete(active.id)
+        return active
+
+    def deactivated(self, session_id: str, code: Optional[str]):
+        """Oublier une session désactivée en base (fermeture, départ de l'hôte, expiration)"""
+        self._sessions.delete(session_id)
+        if code is not None:
+            self._codes.delete(code)
+        code_allocator.release(code)
+        queue_engine.drop(session_id)
+        self.stats["deactivated"] += 1
+
+    # ===== Lectures =====
+
+    async def get(self, db: AsyncSession, session_id: str) -> Optional[ActiveSession]:
+        """Session par id : mémoire, sinon base (les sessions inactives ne sont pas gardées)"""
+        active = self._sessions.get(session_id)
+        if active is not None:
+            return active
+
+        session = await SessionService(db).get_session_with_participants(session_id)
+        if session is None:
+            return None
+        return self._index(session)
+
+    async def get_by_code(self, db: AsyncSession, code: str) -> Optional[ActiveSession]:
+        """Session active par code de jointure"""
+        session_id = self._codes.get(code)
+        if session_id is not None:
+            active = await self.get(db, session_id)
+            if active is not None and active.is_active and active.code == code:
+                return active
+
+        session = await SessionService(db).get_session_by_code(code)
+        if session is None:
+            return None
+        return await self.get(db, session.id)
+
+    async def is_participant(self, db: AsyncSession, session_id: str, user_id: str) -> bool:
+        active = await self.get(db, session_id)
+        if active is None or not active.is_active:
+            return False
+        if user_id in active.members:
+            return True
+
+        # Absent en mémoire : jointure éventuelle par un autre worker
+        if await SessionService(db).is_participant(session_id, user_id):
+            active.members[user_id] = datetime.utcnow()
+            return True
+        return False
+
+    # ===== Modifications (écrites en base avant la mise à jour du cache) =====
+
+    async def create(self, db: AsyncSession, host_id: str, name: str, playlist_ids: List[str]) -> Optional[ActiveSession]:
+        """Créer une session (écrite tout de suite, puis servie depuis la mémoire)"""
+        if not code_allocator.loaded:
+            await code_allocator.load_from_db()
+
+        # Code libre pour ce worker ; un autre worker a pu le prendre entre-temps :
+        # le code est écarté, les codes sont rechargés et un seul nouvel essai suit
+        for attempt in range(2):
+            code = code_allocator.reserve()
+            session = await SessionService(db).create_session(host_id=host_id, code=code, name=name, playlist_ids=playlist_ids)
+            if session is not None:
+                self.stats["writes"] += 1
+                return self._index(session)
+            code_allocator.discard(code)
+            await code_allocator.load_from_db()
+        return None
+
+    async def join(self, db: AsyncSession, code: str, user_id: str) -> Optional[ActiveSession]:
+        active = await self.get_by_code(db, code)
+        if active is None or not active.is_active:
+            return None
+        if user_id in active.members:
+            return active
+
+        if not await SessionService(db).add_participant(active.id, user_id):
+            # Fermée entre-temps par un autre worker
+            self.deactivated(active.id, active.code)
+            return None
+        self.stats["writes"] += 1
+        active.members[user_id] = datetime.utcnow()
+        active.updated_at = active.members[user_id]
+        return active
+
+    async def leave(self, db: AsyncSession, session_id: str, user_id: str) -> bool:
+        active = await self.get(db, session_id)
+        if active is None:
+            return False
+        if not await SessionService(db).leave_session(session_id, user_id):
+            return False
+
+        self.stats["writes"] += 1
+        if user_id == active.host_id:
+            self.deactivated(active.id, active.code)
+        else:
+            active.members.pop(user_id, None)
+        return True
+
+    async def close(self, db: AsyncSession, session_id: str, user_id: str) -> bool:
+        active = await self.get(db, session_id)
+        if active is None or active.host_id != user_id:
+            return False
+        if not await SessionService(db).close_session(session_id, user_id):
+            return False
+
+        self.stats["writes"] += 1
+        self.deactivated(active.id, active.code)
+        return True
+
+    async def set_current_track(self, db: AsyncSession, session_id: str, user_id: str, track: Optional[dict]) -> bool:
+        active = await self.get(db, session_id)
+        if active is None or not active.is_active or active.host_id != user_id:
+            return False
+        if not await SessionService(db).set_current_track(session_id, user_id, track):
+            return False
+
+        self.stats["writes"] += 1
+        active.current_track = track
+        active.updated_at = datetime.utcnow()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            **self._sessions.stats(),
+            "codes": len(self._codes),
+            "ttl_seconds": self._sessions.ttl
+        }
+
+# Instance globale
+session_store = ActiveSessionStore()
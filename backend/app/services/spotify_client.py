@@ -0,0 +1,162 @@
+"""Client asynchrone de l'API Web Spotify
+
+Un seul httpx.AsyncClient partagé par le process : pool de connexions,
+keep-alive, timeouts configurables, et retry/backoff qui respecte
+Retry-After sur les réponses 429.
+"""
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+import asyncio
+import base64
+import random
+import re
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+
+# Identifiants Spotify (base62, 22 caractères) et noms d'utilisateur
+# remplacés dans les libellés de métriques
+_SPOTIFY_ID = re.compile(r"/(?:[A-Za-z0-9]{16,}(?=/|$)|(?<=/users/)[^/]+)")
+
+class SpotifyAPIError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Spotify API error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+class SpotifyClient:
+    def __init__(
+        self,
+        api_base_url: str = None,
+        accounts_base_url: str = None,
+        timeout: float = None,
+        max_retries: int = None
+    ):
+        self.api_base_url = (api_base_url or settings.SPOTIFY_API_BASE_URL).rstrip("/")
+        self.accounts_base_url = (accounts_base_url or settings.SPOTIFY_ACCOUNTS_BASE_URL).rstrip("/")
+        self.timeout = timeout if timeout is not None else settings.SPOTIFY_HTTP_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else settings.SPOTIFY_MAX_RETRIES
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "errors": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Client HTTP partagé, créé à la première utilisation"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=settings.SPOTIFY_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=settings.SPOTIFY_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SPOTIFY_MAX_KEEPALIVE_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Délai avant la prochaine tentative : Retry-After si fourni, sinon backoff exponentiel"""
+        if response is not None and response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get("Retry-After", "1"))
+            except ValueError:
+                retry_after = 1.0
+            return min(retry_after, settings.SPOTIFY_MAX_RETRY_AFTER_SECONDS)
+
+        backoff = settings.SPOTIFY_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+        return backoff + random.uniform(0, backoff / 2)
+
+    def _endpoint(self, url: str) -> str:
+        """Chemin d'un appel sans les identifiants (/playlists/{id}/tracks)"""
+        path = httpx.URL(url).path
+        if path.startswith("/v1/"):
+            path = path[3:]
+        return _SPOTIFY_ID.sub("/{id}", path)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Envoyer une requête avec retry sur 429, 5xx et erreurs réseau"""
+        attempt = 0
+        while True:
+            self.stats["requests"] += 1
+            response = None
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                metrics.observe_spotify(self._endpoint(url), str(response.status_code), time.perf_counter() - started)
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+                if response.status_code == 429:
+                    self.stats["rate_limited"] += 1
+            except httpx.TransportError as e:
+                metrics.observe_spotify(self._endpoint(url), "error", time.perf_counter() - started)
+                if attempt >= self.max_retries:
+                    self.stats["errors"] += 1
+                    raise SpotifyAPIError(503, str(e)) from e
+
+            if attempt >= self.max_retries:
+                self.stats["errors"] += 1
+                return response
+
+            await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+            self.stats["retries"] += 1
+
+    async def api(self, method: str, path: str, access_token: str, **kwargs) -> Any:
+        """Appeler l'API Web Spotify avec le token d'un utilisateur"""
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = await self.request(method, f"{self.api_base_url}{path}", headers=headers, **kwargs)
+
+        if response.status_code >= 400:
+            raise SpotifyAPIError(response.status_code, response.text)
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    async def get(self, path: str, access_token: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        return await self.api("GET", path, access_token, params=params)
+
+    # ===== OAuth (accounts.spotify.com) =====
+
+    def authorize_url(self, scope: str, state: Optional[str] = None) -> str:
+        params = {
+            "client_id": settings.SPOTIFY_CLIENT_ID,
+            "response_type": "code",
+            "redirect_uri": settings.SPOTIFY_REDIRECT_URI,
+            "scope": scope
+        }
+        if state:
+            params["state"] = state
+        return f"{self.accounts_base_url}/authorize?{urlencode(params)}"
+
+    async def _token_request(self, data: Dict[str, str]) -> Dict[str, Any]:
+        credentials = f"{settings.SPOTIFY_CLIENT_ID}:{settings.SPOTIFY_CLIENT_SECRET}"
+        headers = {"Authorization": "Basic " + base64.b64encode(credentials.encode()).decode()}
+
+        response = await self.request("POST", f"{self.accounts_base_url}/api/token", data=data, headers=headers)
+        if response.status_code >= 400:
+            raise SpotifyAPIError(response.status_code, response.text)
+        return response.json()
+
+    async def exchange_code(self, code: str) -> Dict[str, Any]:
+        """Échanger un code d'autorisation contre un token"""
+        return await self._token_request({
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": settings.SPOTIFY_REDIRECT_URI
+        })
+
+    async def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
+        """Rafraîchir un token d'accès"""
+        return await self._token_request({
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token
+        })
+
+# Instance globale (pool de connexions partagé)
+spotify_client = SpotifyClient()
@@ -1,52 +1,274 @@
 # app/services/spotify_service.py
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+import asyncio
 from app.core.config import settings
-import os
+from app.services.spotify_client import spotify_client
+from app.services.token_manager import token_manager
+from app.services.track_loader import track_loader
+from app.utils.cache import TTLCache
+
+# Cache partagé des métadonnées catalogue (playlists, tracks, recherches)
+metadata_cache = TTLCache(
+    maxsize=settings.SPOTIFY_CACHE_MAX_ENTRIES,
+    ttl=settings.SPOTIFY_CACHE_TTL_SECONDS
+)
+
+def format_track(track: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertir une track Spotify au format attendu par l'application"""
+    album = track.get("album") or {}
+    images = album.get("images") or []
+    artists = [artist.get("name") for artist in track.get("artists") or []]
+
+    return {
+        "id": track["id"],
+        "name": track.get("name"),
+        "artists": artists,
+        "artist_names": ", ".join(artists),
+        "album": album.get("name"),
+        "album_image_url": images[0]["url"] if images else "",
+        "duration_ms": track.get("duration_ms"),
+        "preview_url": track.get("preview_url"),
+        "uri": track.get("uri"),
+        "is_playable": track.get("is_playable", True)
+    }
+
+def format_playlist(playlist: Dict[str, Any]) -> Dict[str, Any]:
+    images = playlist.get("images") or []
+    return {
+        "id": playlist["id"],
+        "name": playlist.get("name"),
+        "image_url": images[0]["url"] if images else "",
+        "tracks_total": (playlist.get("tracks") or {}).get("total", 0),
+        "owner": (playlist.get("owner") or {}).get("display_name"),
+        "snapshot_id": playlist.get("snapshot_id")
+    }
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
 
 class SpotifyService:
-    def __init__(self):
+    def __init__(self, db: Optional[AsyncSession] = None):
+        self.db = db
         self.scope = "user-read-private user-read-email playlist-read-private user-modify-playback-state user-read-playback-state"
-    
-    def _create_oauth_manager(self):
-        """Créer le manager OAuth Spotify avec la configuration actuelle"""
-        return SpotifyOAuth(
-            client_id=settings.SPOTIFY_CLIENT_ID,
-            client_secret=settings.SPOTIFY_CLIENT_SECRET,
-            redirect_uri=settings.SPOTIFY_REDIRECT_URI,  # ← UTILISE LA CONFIG
-            scope=self.scope,
-            cache_path=None
-        )
-    
+        self.client = spotify_client
+        self.cache = metadata_cache
+        self.loader = track_loader
+
     def get_auth_url(self):
         """Générer l'URL d'authentification Spotify"""
         try:
-            sp_oauth = self._create_oauth_manager()
-            auth_url = sp_oauth.get_authorize_url()
-            return auth_url
+            return self.client.authorize_url(self.scope)
         except Exception as e:
             print(f"Error generating auth URL: {e}")
             raise
-    
-    def get_access_token(self, code):
+
+    async def get_access_token(self, code):
         """Échanger le code contre un token d'accès"""
         try:
-            sp_oauth = self._create_oauth_manager()
-            token_info = sp_oauth.get_access_token(code)
-            return token_info
+            return await self.client.exchange_code(code)
         except Exception as e:
             print(f"Error getting access token: {e}")
             return None
-    
-    def get_user_profile(self, access_token):
+
+    async def refresh_access_token(self, refresh_token):
+        """Rafraîchir le token d'accès d'un utilisateur"""
+        try:
+            return await self.client.refresh_access_token(refresh_token)
+        except Exception as e:
+            print(f"Error refreshing access token: {e}")
+            return None
+
+    async def get_user_profile(self, access_token):
         """Obtenir le profil utilisateur Spotify"""
         try:
-            sp = spotipy.Spotify(auth=access_token)
-            user_profile = sp.current_user()
-            return user_profile
+            return await self.client.get("/me", access_token)
         except Exception as e:
             print(f"Error getting user profile: {e}")
             return None
 
+    # ===== Catalogue =====
+
+    async def _get_user_token(self, user_id: str) -> Optional[str]:
+        return await token_manager.get_access_token(user_id, self.db)
+
+    async def _get_playlist_snapshot(self, user_id: str, token: str, playlist_id: str) -> str:
+        """snapshot_id courant d'une playlist (vérifié au plus toutes les SPOTIFY_SNAPSHOT_TTL_SECONDS)
+
+        Mis en cache par utilisateur : cet appel, fait avec son propre token,
+        vérifie qu'il a accès à la playlist (privée, collaborative) avant de
+        lui servir les tracks partagées sous (playlist_id, snapshot_id).
+        """
+        async def load():
+            playlist = await self.client.get(f"/playlists/{playlist_id}", token, params={"fields": "snapshot_id"})
+            return playlist["snapshot_id"]
+
+        return await self.cache.get_or_load(
+            ("snapshot", user_id, playlist_id), load, ttl=settings.SPOTIFY_SNAPSHOT_TTL_SECONDS
+        )
+
+    async def _fetch_playlist_tracks(self, token: str, playlist_id: str) -> List[Dict[str, Any]]:
+        """Toutes les tracks d'une playlist : première page, puis les suivantes en parallèle"""
+        path = f"/playlists/{playlist_id}/tracks"
+        limit = 100
+        first = await self.client.get(path, token, params={"limit": limit, "offset": 0})
+
+        pages = [first]
+        total = first.get("total") or 0
+        if first.get("next") and total > limit:
+            pages.extend(await asyncio.gather(*(
+                self.client.get(path, token, params={"limit": limit, "offset": offset})
+                for offset in range(limit, total, limit)
+            )))
+
+        tracks = []
+        for page in pages:
+            for item in page.get("items") or []:
+                track = item.get("track")
+                if track and track.get("id"):
+                    tracks.append(format_track(track))
+        return tracks
+
+    async def _get_cached_playlist_tracks(self, token: str, playlist_id: str, snapshot_id: str) -> List[Dict[str, Any]]:
+        return await self.cache.get_or_load(
+            ("playlist_tracks", playlist_id, snapshot_id),
+            lambda: self._fetch_playlist_tracks(token, playlist_id)
+        )
+
+    async def get_user_playlists(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Obtenir les playlists d'un utilisateur"""
+        token = await self._get_user_token(user_id)
+        if not token:
+            return None
+
+        async def load():
+            playlists = []
+            params = {"limit": 50, "offset": 0}
+            while True:
+                page = await self.client.get("/me/playlists", token, params=params)
+                playlists.extend(format_playlist(playlist) for playlist in page.get("items") or [])
+                if not page.get("next"):
+                    return playlists
+                params["offset"] += params["limit"]
+
+        try:
+            return await self.cache.get_or_load(
+                ("playlists", user_id), load, ttl=settings.SPOTIFY_PLAYLISTS_TTL_SECONDS
+            )
+        except Exception as e:
+            print(f"Error getting playlists: {e}")
+            return None
+
+    async def get_playlist_tracks(self, user_id: str, playlist_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Obtenir les tracks d'une playlist (mises en cache par snapshot_id)"""
+        token = await self._get_user_token(user_id)
+        if not token:
+            return None
+
+        try:
+            snapshot_id = await self._get_playlist_snapshot(user_id, token, playlist_id)
+            return await self._get_cached_playlist_tracks(token, playlist_id, snapshot_id)
+        except Exception as e:
+            print(f"Error getting playlist tracks: {e}")
+            return None
+
+    async def get_session_tracks(self, session_id: str, host_id: str, playlist_ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Tracks de toutes les playlists d'une session, dédupliquées par id
+
+        Le résultat fusionné est mémorisé tant qu'aucun snapshot_id ne change.
+        """
+        token = await self._get_user_token(host_id)
+        if not token:
+            return None
+
+        snapshots = await asyncio.gather(
+            *(self._get_playlist_snapshot(host_id, token, playlist_id) for playlist_id in playlist_ids),
+            return_exceptions=True
+        )
+        available = []
+        for playlist_id, snapshot_id in zip(playlist_ids, snapshots):
+            if isinstance(snapshot_id, Exception):
+                print(f"Error loading playlist {playlist_id}: {snapshot_id}")
+            else:
+                available.append((playlist_id, snapshot_id))
+
+        async def load():
+            playlists = await asyncio.gather(*(
+                self._get_cached_playlist_tracks(token, playlist_id, snapshot_id)
+                for playlist_id, snapshot_id in available
+            ))
+            merged = {}
+            for tracks in playlists:
+                for track in tracks:
+                    merged.setdefault(track["id"], track)
+            return list(merged.values())
+
+        try:
+            return await self.cache.get_or_load(("session_tracks", session_id, tuple(available)), load)
+        except Exception as e:
+            print(f"Error getting session tracks: {e}")
+            return None
+
+    async def _load_track(self, token: str, track_id: str) -> Optional[Dict[str, Any]]:
+        async def load():
+            track = await self.loader.load(track_id, token)
+            return format_track(track) if track else None
+
+        return await self.cache.get_or_load(("track", track_id), load)
+
+    async def get_track(self, user_id: str, track_id: str) -> Optional[Dict[str, Any]]:
+        """Obtenir les détails d'une track (requêtes regroupées par lots)"""
+        token = await self._get_user_token(user_id)
+        if not token:
+            return None
+
+        try:
+            return await self._load_track(token, track_id)
+        except Exception as e:
+            print(f"Error getting track: {e}")
+            return None
+
+    async def get_tracks(self, user_id: str, track_ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Obtenir plusieurs tracks ; les ids inconnus sont ignorés"""
+        token = await self._get_user_token(user_id)
+        if not token:
+            return None
+
+        try:
+            tracks = await asyncio.gather(*(
+                self._load_track(token, track_id) for track_id in dict.fromkeys(track_ids)
+            ))
+            return [track for track in tracks if track]
+        except Exception as e:
+            print(f"Error getting tracks: {e}")
+            return None
+
+    async def search_tracks(self, user_id: str, query: str) -> Optional[List[Dict[str, Any]]]:
+        """Rechercher des tracks"""
+        token = await self._get_user_token(user_id)
+        if not token:
+            return None
+
+        normalized = normalize_query(query)
+        if not normalized:
+            return []
+
+        async def load():
+            results = await self.client.get("/search", token, params={"q": normalized, "type": "track", "limit": 20})
+            return [format_track(track) for track in (results.get("tracks") or {}).get("items") or [] if track]
+
+        try:
+            return await self.cache.get_or_load(
+                ("search", normalized), load, ttl=settings.SPOTIFY_SEARCH_TTL_SECONDS
+            )
+        except Exception as e:
+            print(f"Error searching tracks: {e}")
+            return None
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        stats["track_loader"] = dict(self.loader.stats)
+        return stats
+
 # Instance globale
-spotify_service = SpotifyService()
\ No newline at end of file
+spotify_service = SpotifyService()
@@ -0,0 +1,182 @@
+"""Tokens Spotify des utilisateurs : cache mémoire et rafraîchissement anticipé
+
+Une tâche de fond rafraîchit les tokens des hôtes de sessions actives avant
+leur expiration. Les appels catalogue et lecture lisent le token dans le
+cache sans aller-retour, et les rafraîchissements concurrents d'un même
+utilisateur sont regroupés en un seul appel à Spotify.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.session import Session as PartySession
+from app.models.user import User
+from app.services.spotify_client import spotify_client
+from app.utils.helpers import AsyncSessionLocal, BackgroundSessionLocal
+
+class TokenManager:
+    def __init__(self, client=None):
+        self.client = client or spotify_client
+        # user_id -> (access_token, expires_at)
+        self.tokens: Dict[str, Tuple[str, Optional[datetime]]] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.running = False
+        self.latencies = deque(maxlen=256)
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "scheduled_refreshes": 0,
+            "failures": 0,
+            "last_error": None
+        }
+
+    def _is_fresh(self, expires_at: Optional[datetime]) -> bool:
+        if expires_at is None:
+            return True
+        return expires_at - datetime.utcnow() > timedelta(seconds=settings.TOKEN_EXPIRY_SKEW_SECONDS)
+
+    def store(self, user_id: str, access_token: str, expires_at: Optional[datetime]):
+        self.tokens[user_id] = (access_token, expires_at)
+
+    def forget(self, user_id: str):
+        self.tokens.pop(user_id, None)
+
+    async def get_access_token(self, user_id: str, db: Optional[AsyncSession] = None) -> Optional[str]:
+        """Token valide d'un utilisateur, rafraîchi seulement s'il est sur le point d'expirer"""
+        entry = self.tokens.get(user_id)
+        if entry and self._is_fresh(entry[1]):
+            self.stats["hits"] += 1
+            return entry[0]
+
+        self.stats["misses"] += 1
+        if entry is None:
+            if db is None:
+                async with AsyncSessionLocal() as db:
+                    user = await db.get(User, user_id)
+            else:
+                user = await db.get(User, user_id)
+
+            if not user or not user.spotify_access_token:
+                return None
+            self.store(user_id, user.spotify_access_token, user.token_expires_at)
+            entry = self.tokens[user_id]
+
+            if self._is_fresh(entry[1]):
+                return entry[0]
+
+        return await self.refresh(user_id)
+
+    async def refresh(self, user_id: str) -> Optional[str]:
+        """Rafraîchir le token d'un utilisateur (un seul appel en vol par utilisateur)"""
+        task = self._refreshing.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(user_id))
+            self._refreshing[user_id] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _refresh(self, user_id: str) -> Optional[str]:
+        started = time.perf_counter()
+        db = BackgroundSessionLocal()
+        try:
+            user = await db.get(User, user_id)
+            if not user or not user.spotify_refresh_token:
+                return None
+
+            token_info = await self.client.refresh_access_token(user.spotify_refresh_token)
+
+            user.spotify_access_token = token_info["access_token"]
+            user.token_expires_at = datetime.utcnow() + timedelta(seconds=token_info["expires_in"])
+            if token_info.get("refresh_token"):
+                user.spotify_refresh_token = token_info["refresh_token"]
+            await db.commit()
+
+            self.store(user_id, user.spotify_access_token, user.token_expires_at)
+            self.stats["refreshes"] += 1
+            return user.spotify_access_token
+        except Exception as e:
+            await db.rollback()
+            self.stats["failures"] += 1
+            self.stats["last_error"] = str(e)
+            print(f"Error refreshing token for user {user_id}: {e}")
+            return None
+        finally:
+            await db.close()
+            self.latencies.append((time.perf_counter() - started) * 1000)
+
+    # ===== Rafraîchissement anticipé =====
+
+    async def _expiring_hosts(self):
+        """Hôtes de sessions actives dont le token expire dans la marge"""
+        deadline = datetime.utcnow() + timedelta(seconds=settings.TOKEN_REFRESH_MARGIN_SECONDS)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(User.id).join(PartySession, PartySession.host_id == User.id).where(
+                    PartySession.is_active == True,
+                    User.spotify_refresh_token.isnot(None),
+                    User.token_expires_at < deadline
+                ).distinct()
+            )
+            return list(result.scalars())
+
+    async def refresh_expiring(self) -> int:
+        user_ids = await self._expiring_hosts()
+        if not user_ids:
+            return 0
+
+        tokens = await asyncio.gather(*(self.refresh(user_id) for user_id in user_ids))
+        refreshed = sum(1 for token in tokens if token)
+        self.stats["scheduled_refreshes"] += refreshed
+        return refreshed
+
+    async def _run(self):
+        while self.running:
+            try:
+                await self.refresh_expiring()
+            except Exception as e:
+                print(f"Error in token refresh scheduler: {e}")
+            await asyncio.sleep(settings.TOKEN_REFRESH_INTERVAL_SECONDS)
+
+    async def start(self):
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+        return {
+            **self.stats,
+            "cached_tokens": len(self.tokens),
+            "in_flight": len(self._refreshing),
+            "refresh_latency_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1], 2) if latencies else 0.0
+            }
+        }
+
+# Instance globale
+token_manager = TokenManager()
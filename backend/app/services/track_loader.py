@@ -0,0 +1,75 @@
+"""Résolution groupée des métadonnées de tracks
+
+Les lectures individuelles arrivant dans une courte fenêtre sont regroupées
+en appels /v1/tracks?ids= (50 ids maximum) à la manière d'un DataLoader.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+
+from app.core.config import settings
+from app.services.spotify_client import spotify_client
+
+class TrackLoader:
+    def __init__(self, client=None, max_batch_size: int = None, window_ms: float = None):
+        self.client = client or spotify_client
+        self.max_batch_size = max_batch_size or settings.SPOTIFY_TRACK_BATCH_SIZE
+        self.window = (window_ms if window_ms is not None else settings.SPOTIFY_TRACK_BATCH_WINDOW_MS) / 1000
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._token: Optional[str] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.stats = {"loads": 0, "batches": 0, "batched_ids": 0}
+
+    async def load(self, track_id: str, access_token: str) -> Optional[Dict[str, Any]]:
+        """Track brute Spotify (None si l'id est inconnu)"""
+        self.stats["loads"] += 1
+
+        future = self._pending.get(track_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[track_id] = future
+            # Les métadonnées sont publiques : le token du premier demandeur sert au lot
+            if self._token is None:
+                self._token = access_token
+
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await asyncio.shield(future)
+
+    async def load_many(self, track_ids: List[str], access_token: str) -> List[Optional[Dict[str, Any]]]:
+        return list(await asyncio.gather(*(self.load(track_id, access_token) for track_id in track_ids)))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, {}
+        token, self._token = self._token, None
+        if batch:
+            asyncio.ensure_future(self._dispatch(batch, token))
+
+    async def _dispatch(self, batch: Dict[str, asyncio.Future], token: str):
+        self.stats["batches"] += 1
+        self.stats["batched_ids"] += len(batch)
+
+        try:
+            data = await self.client.get("/tracks", token, params={"ids": ",".join(batch)})
+            tracks = {track["id"]: track for track in data.get("tracks") or [] if track}
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    # Éviter l'avertissement "exception never retrieved" si l'appelant est parti
+                    future.exception()
+            return
+
+        for track_id, future in batch.items():
+            if not future.done():
+                future.set_result(tracks.get(track_id))
+
+# Instance globale
+track_loader = TrackLoader()
@@ -0,0 +1,287 @@
+"""Tampon d'écriture des votes (write-behind, opt-in)
+
+Quand toute une salle vote dans la même seconde, chaque vote coûtait une
+transaction et un fsync. En mode tampon, un vote est acquitté dès qu'il entre
+en mémoire (le dernier vote d'un utilisateur sur une track remplace le
+précédent), puis les votes en attente sont écrits en une seule transaction
+toutes les VOTE_BUFFER_FLUSH_INTERVAL_MS ou dès VOTE_BUFFER_MAX_BATCH votes.
+
+Perte bornée en cas de crash : au plus les votes acquittés depuis le dernier
+lot, et jamais plus de VOTE_BUFFER_MAX_PENDING (au-delà, le vote attend
+l'écriture avant d'être acquitté). L'arrêt propre vide le tampon.
+
+Les compteurs lus passent à travers le tampon : chaque vote en attente
+retient le type déjà écrit en base pour la même clé, ce qui donne la
+variation à ajouter aux compteurs persistés.
+
+Les vote_update d'un vote en attente ne sont pas diffusés tout de suite :
+ils porteraient la version déjà connue des clients, qui les ignoreraient.
+Après chaque lot, les compteurs écrits sont diffusés avec leur nouvelle
+version.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.vote import Vote
+from app.utils.helpers import BackgroundSessionLocal
+
+# (session_id, user_id, track_id)
+VoteKey = Tuple[str, str, str]
+
+# publish(session_id, compteurs) : diffusion d'un vote_update après écriture
+Publish = Callable[[str, Dict[str, int]], Awaitable[Any]]
+
+class PendingVote:
+    __slots__ = ("id", "vote_type", "base_type", "created_at")
+
+    def __init__(self, vote_id: str, vote_type: str, base_type: Optional[str], created_at: datetime):
+        self.id = vote_id
+        self.vote_type = vote_type
+        # Type du vote déjà écrit en base pour cette clé (None si aucun)
+        self.base_type = base_type
+        self.created_at = created_at
+
+class VoteBuffer:
+    def __init__(self, enabled: bool = None, flush_interval_ms: float = None,
+                 max_batch: int = None, max_pending: int = None):
+        self.enabled = settings.VOTE_BUFFER_ENABLED if enabled is None else enabled
+        self.flush_interval = (flush_interval_ms if flush_interval_ms is not None else settings.VOTE_BUFFER_FLUSH_INTERVAL_MS) / 1000
+        self.max_batch = max_batch or settings.VOTE_BUFFER_MAX_BATCH
+        self.max_pending = max(max_pending or settings.VOTE_BUFFER_MAX_PENDING, self.max_batch)
+
+        self._pending: Dict[VoteKey, PendingVote] = {}
+        # (session_id, track_id) -> variation des compteurs due aux votes en attente
+        self._deltas: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.running = False
+        self.publish: Optional[Publish] = None
+
+        self.latencies = deque(maxlen=256)
+        self.stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "flushed_votes": 0,
+            "backpressure_waits": 0,
+            "failures": 0,
+            "last_error": None
+        }
+
+    # ===== Soumission =====
+
+    async def submit(self, db: AsyncSession, session_id: str, user_id: str, track_id: str, vote_type: str) -> Optional[Vote]:
+        """Acquitter un vote après son entrée dans le tampon (None si la borne de perte est atteinte)"""
+        if len(self._pending) >= self.max_pending:
+            # Borne de perte atteinte : attendre l'écriture du lot en cours
+            self.stats["backpressure_waits"] += 1
+            await self.flush()
+            if len(self._pending) >= self.max_pending:
+                return None
+
+        key = (session_id, user_id, track_id)
+        current = self._pending.get(key)
+        persisted = None
+        if current is None:
+            persisted = (await db.execute(
+                select(Vote.id, Vote.vote_type).where(
+                    Vote.session_id == session_id,
+                    Vote.user_id == user_id,
+                    Vote.track_id == track_id
+                )
+            )).first()
+            # Un vote concurrent sur la même clé a pu entrer pendant la lecture
+            current = self._pending.get(key)
+
+        if current is not None:
+            vote_id, base_type = current.id, current.base_type
+            self._account(key, current, -1)
+            self.stats["coalesced"] += 1
+        elif persisted is not None:
+            vote_id, base_type = persisted.id, persisted.vote_type
+        else:
+            vote_id, base_type = str(uuid.uuid4()), None
+
+        pending = PendingVote(vote_id, vote_type, base_type, datetime.utcnow())
+        self._pending[key] = pending
+        self._account(key, pending, 1)
+        self.stats["submitted"] += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+        return Vote(
+            id=vote_id,
+            session_id=session_id,
+            user_id=user_id,
+            track_id=track_id,
+            vote_type=vote_type,
+            created_at=pending.created_at
+        )
+
+    def _account(self, key: VoteKey, pending: PendingVote, sign: int):
+        # Import local : voting_service importe ce module
+        from app.services.voting_service import _tally_delta
+
+        session_id, _, track_id = key
+        tally_key = (session_id, track_id)
+        delta = self._deltas.setdefault(tally_key, {"likes": 0, "dislikes": 0, "total_votes": 0})
+        for name, value in _tally_delta(pending.base_type, pending.vote_type).items():
+            delta[name] += sign * value
+
+        if not any(delta.values()):
+            del self._deltas[tally_key]
+
+    # ===== Lecture à travers le tampon =====
+
+    def has_pending(self, session_id: str) -> bool:
+        return any(key[0] == session_id for key in self._deltas)
+
+    def pending_tracks(self, session_id: str):
+        return [track_id for sid, track_id in self._deltas if sid == session_id]
+
+    def overlay_track(self, session_id: str, tally: Dict[str, int]) -> Dict[str, int]:
+        """Compteurs persistés d'une track + votes en attente"""
+        delta = self._deltas.get((session_id, tally["track_id"]))
+        if delta is None:
+            return tally
+        return {**tally, **{name: tally[name] + value for name, value in delta.items()}}
+
+    def overlay_results(self, session_id: str, results: Dict[str, Dict[str, int]], only_voted: bool = False) -> Dict[str, Dict[str, int]]:
+        if not self._deltas:
+            return results
+
+        merged = dict(results)
+        for (sid, track_id), delta in self._deltas.items():
+            if sid != session_id:
+                continue
+            tally = merged.get(track_id) or {"track_id": track_id, "likes": 0, "dislikes": 0, "total_votes": 0, "version": 0}
+            merged[track_id] = {**tally, **{name: tally[name] + value for name, value in delta.items()}}
+
+        if only_voted:
+            merged = {track_id: tally for track_id, tally in merged.items() if tally["total_votes"] > 0}
+        return merged
+
+    # ===== Écriture par lots =====
+
+    async def flush(self) -> int:
+        """Écrire les votes en attente en une transaction, puis diffuser les compteurs écrits"""
+        tallies: List[Tuple[str, Dict[str, int]]] = []
+        count = await self._write(tallies)
+
+        if self.publish is not None:
+            for session_id, tally in tallies:
+                try:
+                    # Votes arrivés pendant l'écriture compris
+                    await self.publish(session_id, self.overlay_track(session_id, tally))
+                except Exception as e:
+                    print(f"Error publishing vote results for session {session_id}: {e}")
+        return count
+
+    async def _write(self, tallies: List[Tuple[str, Dict[str, int]]]) -> int:
+        """Écrire les votes en attente en une transaction (un seul lot à la fois)"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            # Import local : voting_service importe ce module
+            from app.services.voting_service import VotingService
+
+            batch = dict(self._pending)
+            started = time.perf_counter()
+            try:
+                async with BackgroundSessionLocal() as db:
+                    tallies[:] = await VotingService(db).record_votes([
+                        (pending.id, session_id, user_id, track_id, pending.vote_type, pending.created_at)
+                        for (session_id, user_id, track_id), pending in batch.items()
+                    ])
+            except Exception as e:
+                # Les votes restent dans le tampon et repartent au prochain lot
+                self.stats["failures"] += 1
+                self.stats["last_error"] = str(e)
+                print(f"Error flushing vote buffer: {e}")
+                return 0
+
+            for key, written in batch.items():
+                current = self._pending[key]
+                self._account(key, current, -1)
+                if current is written:
+                    del self._pending[key]
+                else:
+                    # Vote remplacé pendant l'écriture : sa base devient le type écrit
+                    current.base_type = written.vote_type
+                    self._account(key, current, 1)
+
+            self.stats["flushes"] += 1
+            self.stats["flushed_votes"] += len(batch)
+            self.latencies.append((time.perf_counter() - started) * 1000)
+            return len(batch)
+
+    async def _run(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error in vote buffer flusher: {e}")
+
+    async def start(self, publish: Optional[Publish] = None):
+        self.publish = publish
+        if not self.enabled:
+            return
+        # Primitives liées à la boucle du serveur
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Arrêt propre : dernier lot périodique, puis écriture de ce qui reste"""
+        self.running = False
+        if self._task is not None:
+            # Pas d'annulation : un lot interrompu laisserait sa transaction
+            # (et le verrou d'écriture SQLite) ouverte
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+        if self._pending:
+            await self.flush()
+            if self._pending:
+                print(f"⚠️ {len(self._pending)} votes could not be written on shutdown")
+
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "flush_latency_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1], 2) if latencies else 0.0
+            }
+        }
+
+# Instance globale
+vote_buffer = VoteBuffer()
@@ -1,68 +1,505 @@
-from sqlalchemy.orm import Session
-from app.models.vote import Vote
-from typing import Dict, List, Optional
-from collections import defaultdict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, update, delete, insert, func, case, literal, bindparam, exists
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models.session import Session as SessionModel
+from app.models.vote import Vote, VoteTally, VoteVersion
+from app.services.vote_buffer import vote_buffer
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import uuid
+
+# Dialectes supportant INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+_UPSERT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert
+}
+
+def _tally_delta(previous_type: Optional[str], vote_type: str) -> Dict[str, int]:
+    """Calculer la variation des compteurs pour un vote nouveau ou modifié"""
+    delta = {'likes': 0, 'dislikes': 0, 'total_votes': 0}
+
+    if previous_type is None:
+        delta['total_votes'] = 1
+    elif previous_type == vote_type:
+        return delta
+    elif previous_type in ('like', 'dislike'):
+        delta[previous_type + 's'] -= 1
+
+    if vote_type in ('like', 'dislike'):
+        delta[vote_type + 's'] += 1
+
+    return delta
+
+def _tally_to_dict(track_id: str, likes: int, dislikes: int, total_votes: int, version: int = 0) -> Dict[str, int]:
+    return {
+        'track_id': track_id,
+        'likes': likes,
+        'dislikes': dislikes,
+        'total_votes': total_votes,
+        'version': version
+    }
+
+def _first_version(session_id):
+    """Sous-requête donnant la première version d'un compteur de session créé
+    après coup (au-dessus des versions déjà écrites dans vote_tallies)"""
+    tally = aliased(VoteTally)
+    return (
+        select(func.coalesce(func.max(tally.version), 0) + 1)
+        .where(tally.session_id == session_id)
+        .scalar_subquery()
+    )
+
+# Statements d'upsert construits une fois par dialecte : les constructions
+# INSERT propres aux dialectes ne passent pas par le cache de compilation
+_UPSERT_STATEMENTS = {}
+
+def _upsert_statements(dialect_name: str):
+    """(upsert du vote, upsert des compteurs, incrément de version) pour le dialecte, None si non supporté"""
+    if dialect_name not in _UPSERT_INSERTS:
+        return None
+
+    if dialect_name not in _UPSERT_STATEMENTS:
+        dialect_insert = _UPSERT_INSERTS[dialect_name]
+
+        # Un seul statement : insertion ou mise à jour du vote existant. Les
+        # expressions SET lisent les valeurs pré-UPDATE, previous_vote_type
+        # reçoit donc l'ancien type sans relire la ligne.
+        votes, tallies = Vote.__table__, VoteTally.__table__
+        vote = dialect_insert(votes).values(
+            id=bindparam('vote_id'),
+            session_id=bindparam('vote_session_id'),
+            user_id=bindparam('vote_user_id'),
+            track_id=bindparam('vote_track_id'),
+            vote_type=bindparam('vote_vote_type'),
+            previous_vote_type=None,
+            created_at=bindparam('vote_created_at')
+        )
+        vote = vote.on_conflict_do_update(
+            index_elements=[votes.c.session_id, votes.c.user_id, votes.c.track_id],
+            set_={
+                'previous_vote_type': votes.c.vote_type,
+                'vote_type': vote.excluded.vote_type
+            }
+        ).returning(*votes.c)
+
+        tally = dialect_insert(tallies).values(
+            session_id=bindparam('tally_session_id'),
+            track_id=bindparam('tally_track_id'),
+            likes=bindparam('tally_likes'),
+            dislikes=bindparam('tally_dislikes'),
+            total_votes=bindparam('tally_total_votes'),
+            version=bindparam('tally_version'),
+            updated_at=bindparam('tally_updated_at')
+        )
+        tally = tally.on_conflict_do_update(
+            index_elements=[tallies.c.session_id, tallies.c.track_id],
+            set_={
+                'likes': tallies.c.likes + tally.excluded.likes,
+                'dislikes': tallies.c.dislikes + tally.excluded.dislikes,
+                'total_votes': tallies.c.total_votes + tally.excluded.total_votes,
+                'version': tally.excluded.version,
+                'updated_at': tally.excluded.updated_at
+            }
+        ).returning(tallies.c.track_id, tallies.c.likes, tallies.c.dislikes, tallies.c.total_votes, tallies.c.version)
+
+        # Compteur de version par session : la ligne est verrouillée par
+        # l'UPDATE, deux transactions concurrentes reçoivent deux versions
+        versions = VoteVersion.__table__
+        version = dialect_insert(versions).values(
+            session_id=bindparam('version_session_id'),
+            version=_first_version(bindparam('version_session_id'))
+        )
+        version = version.on_conflict_do_update(
+            index_elements=[versions.c.session_id],
+            set_={'version': versions.c.version + 1}
+        ).returning(versions.c.version)
+
+        _UPSERT_STATEMENTS[dialect_name] = (vote, tally, version)
+
+    return _UPSERT_STATEMENTS[dialect_name]
+
+_TALLY_COLUMNS = (VoteTally.track_id, VoteTally.likes, VoteTally.dislikes, VoteTally.total_votes, VoteTally.version)
 
 class VotingService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
-    
-    def submit_vote(self, session_id: str, user_id: str, track_id: str, vote_type: str) -> Optional[Vote]:
+
+    def _upsert_statements(self):
+        return _upsert_statements(self.db.get_bind().dialect.name)
+
+    async def submit_vote(self, session_id: str, user_id: str, track_id: str, vote_type: str) -> Optional[Vote]:
         """Soumettre un vote"""
+        if vote_buffer.enabled:
+            # Mode tampon : vote acquitté en mémoire, écrit au prochain lot
+            return await vote_buffer.submit(self.db, session_id, user_id, track_id, vote_type)
+
+        statements = self._upsert_statements()
+        if statements is None:
+            return await self._submit_vote_select_then_write(session_id, user_id, track_id, vote_type)
+
         try:
-            existing_vote = self.db.query(Vote).filter(
-                Vote.session_id == session_id,
-                Vote.user_id == user_id,
-                Vote.track_id == track_id
-            ).first()
-            
-            if existing_vote:
-                existing_vote.vote_type = vote_type
-                vote = existing_vote
-            else:
-                vote = Vote(
-                    session_id=session_id,
-                    user_id=user_id,
-                    track_id=track_id,
-                    vote_type=vote_type
-                )
-                self.db.add(vote)
-            
-            self.db.commit()
-            self.db.refresh(vote)
+            vote, previous_type = await self._upsert_vote(statements[0], session_id, user_id, track_id, vote_type)
+
+            await self._apply_tally_delta(session_id, track_id, _tally_delta(previous_type, vote_type))
+
+            await self.db.commit()
             return vote
-            
+
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             print(f"Error submitting vote: {e}")
             return None
-    
-    def get_track_results(self, session_id: str, track_id: str) -> Dict[str, int]:
+
+    async def _submit_vote_select_then_write(self, session_id: str, user_id: str, track_id: str, vote_type: str) -> Optional[Vote]:
+        """Chemin générique pour les dialectes sans upsert : SELECT puis INSERT/UPDATE"""
+        try:
+            vote, previous_type = await self._select_then_write_vote(session_id, user_id, track_id, vote_type)
+
+            # Les compteurs sont mis à jour dans la même transaction que le vote
+            await self._apply_tally_delta(session_id, track_id, _tally_delta(previous_type, vote_type))
+
+            await self.db.commit()
+            await self.db.refresh(vote)
+            return vote
+
+        except Exception as e:
+            await self.db.rollback()
+            print(f"Error submitting vote: {e}")
+            return None
+
+    async def record_votes(self, votes: List[Tuple[str, str, str, str, str, datetime]]) -> List[Tuple[str, Dict[str, int]]]:
+        """Écrire un lot de votes (id, session, user, track, type, date) en une seule transaction
+
+        Les variations de compteurs sont cumulées par track et appliquées une
+        fois par track. Renvoie (session, compteurs écrits avec leur nouvelle
+        version) pour chaque track modifiée. Lève l'exception d'origine après
+        rollback.
+        """
+        statements = self._upsert_statements()
+        deltas: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+        try:
+            for vote_id, session_id, user_id, track_id, vote_type, created_at in votes:
+                if statements is None:
+                    _, previous_type = await self._select_then_write_vote(session_id, user_id, track_id, vote_type, vote_id, created_at)
+                else:
+                    _, previous_type = await self._upsert_vote(statements[0], session_id, user_id, track_id, vote_type, vote_id, created_at)
+
+                delta = deltas.setdefault((session_id, track_id), {'likes': 0, 'dislikes': 0, 'total_votes': 0})
+                for key, value in _tally_delta(previous_type, vote_type).items():
+                    delta[key] += value
+
+            written = []
+            for (session_id, track_id), delta in deltas.items():
+                tally = await self._apply_tally_delta(session_id, track_id, delta)
+                if tally is not None:
+                    written.append((session_id, tally))
+
+            await self.db.commit()
+            return written
+
+        except Exception:
+            await self.db.rollback()
+            raise
+
+    async def _upsert_vote(self, statement, session_id: str, user_id: str, track_id: str, vote_type: str,
+                           vote_id: Optional[str] = None, created_at: Optional[datetime] = None) -> Tuple[Vote, Optional[str]]:
+        """Insérer ou mettre à jour un vote (sans commit) : (vote, type précédent)"""
+        row = (await self.db.execute(
+            statement,
+            {
+                'vote_id': vote_id or str(uuid.uuid4()),
+                'vote_session_id': session_id,
+                'vote_user_id': user_id,
+                'vote_track_id': track_id,
+                'vote_vote_type': vote_type,
+                'vote_created_at': created_at or datetime.utcnow()
+            }
+        )).one()
+
+        return Vote(**row._mapping), row.previous_vote_type
+
+    async def _select_then_write_vote(self, session_id: str, user_id: str, track_id: str, vote_type: str,
+                                      vote_id: Optional[str] = None, created_at: Optional[datetime] = None) -> Tuple[Vote, Optional[str]]:
+        """Équivalent de _upsert_vote en SELECT puis INSERT/UPDATE (sans commit)"""
+        existing_vote = (await self.db.execute(
+            select(Vote).where(
+                Vote.session_id == session_id,
+                Vote.user_id == user_id,
+                Vote.track_id == track_id
+            )
+        )).scalars().first()
+
+        if existing_vote:
+            previous_type = existing_vote.vote_type
+            existing_vote.previous_vote_type = previous_type
+            existing_vote.vote_type = vote_type
+            return existing_vote, previous_type
+
+        vote = Vote(
+            id=vote_id or str(uuid.uuid4()),
+            session_id=session_id,
+            user_id=user_id,
+            track_id=track_id,
+            vote_type=vote_type,
+            created_at=created_at or datetime.utcnow()
+        )
+        self.db.add(vote)
+        return vote, None
+
+    async def _apply_tally_delta(self, session_id: str, track_id: str, delta: Dict[str, int]) -> Optional[Dict[str, int]]:
+        """Appliquer une variation aux compteurs d'une track (sans commit) : compteurs écrits, None sans variation"""
+        if not any(delta.values()):
+            return None
+
+        now = datetime.utcnow()
+        version = await self._bump_version(session_id)
+        statements = self._upsert_statements()
+        if statements is not None:
+            row = (await self.db.execute(statements[1], {
+                'tally_session_id': session_id,
+                'tally_track_id': track_id,
+                'tally_likes': delta['likes'],
+                'tally_dislikes': delta['dislikes'],
+                'tally_total_votes': delta['total_votes'],
+                'tally_version': version,
+                'tally_updated_at': now
+            })).one()
+            return _tally_to_dict(*row)
+
+        increment = (
+            update(VoteTally)
+            .where(VoteTally.session_id == session_id, VoteTally.track_id == track_id)
+            .values(
+                likes=VoteTally.likes + delta['likes'],
+                dislikes=VoteTally.dislikes + delta['dislikes'],
+                total_votes=VoteTally.total_votes + delta['total_votes'],
+                version=version,
+                updated_at=now
+            )
+            .returning(*_TALLY_COLUMNS)
+        )
+        # RETURNING : un SELECT partirait sur le lecteur, qui ne voit pas l'écriture non commitée
+        row = (await self.db.execute(increment)).first()
+
+        if row is None:
+            try:
+                # Savepoint : seul l'INSERT est annulé si un premier vote concurrent a créé la ligne
+                async with self.db.begin_nested():
+                    row = (await self.db.execute(
+                        insert(VoteTally).values(
+                            session_id=session_id,
+                            track_id=track_id,
+                            version=version,
+                            updated_at=now,
+                            **delta
+                        ).returning(*_TALLY_COLUMNS)
+                    )).one()
+            except IntegrityError:
+                row = (await self.db.execute(increment)).one()
+
+        return _tally_to_dict(*row)
+
+    async def _bump_version(self, session_id: str) -> int:
+        """Incrémenter la version de la session (sans commit) et la renvoyer
+
+        La ligne du compteur reste verrouillée jusqu'au commit : les versions
+        d'une session sont uniques et croissantes même sur PostgreSQL.
+        """
+        statements = self._upsert_statements()
+        if statements is not None:
+            return (await self.db.execute(statements[2], {'version_session_id': session_id})).scalar_one()
+
+        increment = (
+            update(VoteVersion)
+            .where(VoteVersion.session_id == session_id)
+            .values(version=VoteVersion.version + 1)
+            .returning(VoteVersion.version)
+        )
+        version = (await self.db.execute(increment)).scalar_one_or_none()
+        if version is not None:
+            return version
+
+        try:
+            async with self.db.begin_nested():
+                return (await self.db.execute(
+                    insert(VoteVersion)
+                    .values(session_id=session_id, version=_first_version(session_id))
+                    .returning(VoteVersion.version)
+                )).scalar_one()
+        except IntegrityError:
+            return (await self.db.execute(increment)).scalar_one()
+
+    async def get_track_results(self, session_id: str, track_id: str) -> Dict[str, int]:
         """Obtenir les résultats pour une track spécifique"""
-        votes = self.db.query(Vote).filter(
-            Vote.session_id == session_id,
-            Vote.track_id == track_id
-        ).all()
-        
-        likes = sum(1 for vote in votes if vote.vote_type == 'like')
-        dislikes = sum(1 for vote in votes if vote.vote_type == 'dislike')
-        
+        row = (await self.db.execute(
+            select(*_TALLY_COLUMNS).where(
+                VoteTally.session_id == session_id,
+                VoteTally.track_id == track_id
+            )
+        )).first()
+
+        tally = _tally_to_dict(*row) if row else _tally_to_dict(track_id, 0, 0, 0)
+        return vote_buffer.overlay_track(session_id, tally)
+
+    async def get_all_results(self, session_id: str) -> Dict[str, Dict[str, int]]:
+        """Obtenir tous les résultats d'une session"""
+        rows = (await self.db.execute(
+            select(*_TALLY_COLUMNS).where(
+                VoteTally.session_id == session_id,
+                VoteTally.total_votes > 0
+            )
+        )).all()
+
+        results = {row.track_id: _tally_to_dict(*row) for row in rows}
+        # Votes encore dans le tampon : lecture à travers pour rester cohérent
+        return vote_buffer.overlay_results(session_id, results, only_voted=True)
+
+    async def get_results_since(self, session_id: str, since_version: int) -> Dict[str, object]:
+        """Obtenir les compteurs modifiés depuis une version donnée"""
+        rows = (await self.db.execute(
+            select(*_TALLY_COLUMNS).where(
+                VoteTally.session_id == session_id,
+                VoteTally.version > since_version
+            )
+        )).all()
+
+        version = max((row.version for row in rows), default=None)
+        if version is None:
+            version = await self.get_session_version(session_id)
+
+        results = {row.track_id: _tally_to_dict(*row) for row in rows}
+        if vote_buffer.has_pending(session_id):
+            # Les tracks dont des votes sont en attente d'écriture comptent comme modifiées
+            missing = [track_id for track_id in vote_buffer.pending_tracks(session_id) if track_id not in results]
+            if missing:
+                persisted = (await self.db.execute(
+                    select(*_TALLY_COLUMNS).where(
+                        VoteTally.session_id == session_id,
+                        VoteTally.track_id.in_(missing)
+                    )
+                )).all()
+                results.update({row.track_id: _tally_to_dict(*row) for row in persisted})
+                for track_id in missing:
+                    results.setdefault(track_id, _tally_to_dict(track_id, 0, 0, 0))
+            results = vote_buffer.overlay_results(session_id, results)
+
         return {
-            'track_id': track_id,
-            'likes': likes,
-            'dislikes': dislikes,
-            'total_votes': len(votes)
+            'version': version,
+            'results': results
         }
-    
-    def get_all_results(self, session_id: str) -> Dict[str, Dict[str, int]]:
-        """Obtenir tous les résultats d'une session"""
-        votes = self.db.query(Vote).filter(Vote.session_id == session_id).all()
-        
-        results = defaultdict(lambda: {'likes': 0, 'dislikes': 0, 'total_votes': 0})
-        
-        for vote in votes:
-            results[vote.track_id]['likes'] += 1 if vote.vote_type == 'like' else 0
-            results[vote.track_id]['dislikes'] += 1 if vote.vote_type == 'dislike' else 0
-            results[vote.track_id]['total_votes'] += 1
-        
-        return dict(results)
\ No newline at end of file
+
+    async def get_session_version(self, session_id: str) -> int:
+        """Obtenir la version courante des résultats d'une session"""
+        version = (await self.db.execute(
+            select(VoteVersion.version).where(VoteVersion.session_id == session_id)
+        )).scalar_one_or_none()
+        if version is not None:
+            return version
+
+        # Session sans compteur (base antérieure) : dernière version écrite
+        return (await self.db.execute(
+            select(func.coalesce(func.max(VoteTally.version), 0)).where(
+                VoteTally.session_id == session_id
+            )
+        )).scalar_one()
+
+    async def rebuild_tallies(self, session_id: Optional[str] = None) -> int:
+        """Reconstruire les compteurs à partir de la table votes (récupération)
+
+        Les sessions archivées sont ignorées : leurs votes ont été supprimés,
+        vote_tallies est leur seul résumé.
+        """
+        try:
+            if session_id is not None:
+                session_ids = [session_id]
+            else:
+                archived = select(SessionModel.id).where(SessionModel.archived_at.is_not(None))
+                session_ids = (await self.db.execute(
+                    select(Vote.session_id).where(Vote.session_id.not_in(archived))
+                    .union(select(VoteTally.session_id).where(VoteTally.session_id.not_in(archived)))
+                )).scalars().all()
+
+            rebuilt = 0
+            for rebuilt_session_id in session_ids:
+                rebuilt += await self._rebuild_session_tallies(rebuilt_session_id)
+
+            await self.db.commit()
+            return rebuilt
+
+        except Exception as e:
+            await self.db.rollback()
+            print(f"Error rebuilding vote tallies: {e}")
+            return -1
+
+    async def _rebuild_session_tallies(self, session_id: str) -> int:
+        """Reconstruire les compteurs d'une session (sans commit)"""
+        archived = exists().where(SessionModel.id == session_id, SessionModel.archived_at.is_not(None))
+        if (await self.db.execute(select(archived))).scalar():
+            return 0
+
+        # Les lignes reconstruites prennent une nouvelle version de la session
+        # pour que les clients se resynchronisent
+        version = await self._bump_version(session_id)
+
+        await self.db.execute(delete(VoteTally).where(VoteTally.session_id == session_id))
+        source = select(
+            Vote.session_id,
+            Vote.track_id,
+            func.sum(case((Vote.vote_type == 'like', 1), else_=0)),
+            func.sum(case((Vote.vote_type == 'dislike', 1), else_=0)),
+            func.count(Vote.id),
+            literal(version),
+            func.max(Vote.created_at)
+        ).where(Vote.session_id == session_id).group_by(Vote.session_id, Vote.track_id)
+
+        result = await self.db.execute(
+            insert(VoteTally).from_select(
+                ['session_id', 'track_id', 'likes', 'dislikes', 'total_votes', 'version', 'updated_at'],
+                source
+            )
+        )
+        return result.rowcount
+
+    async def get_first_vote_times(self, session_id: str) -> Dict[str, datetime]:
+        """Date du premier vote de chaque track d'une session (départage du classement)"""
+        rows = (await self.db.execute(
+            select(Vote.track_id, func.min(Vote.created_at))
+            .where(Vote.session_id == session_id)
+            .group_by(Vote.track_id)
+        )).all()
+        return {track_id: first_vote for track_id, first_vote in rows if first_vote is not None}
+
+    async def get_last_vote_times(self, session_ids: List[str]) -> Dict[str, datetime]:
+        """Date du dernier vote écrit de chaque session (compteurs mis à jour à chaque vote)"""
+        if not session_ids:
+            return {}
+
+        rows = (await self.db.execute(
+            select(VoteTally.session_id, func.max(VoteTally.updated_at))
+            .where(VoteTally.session_id.in_(session_ids))
+            .group_by(VoteTally.session_id)
+        )).all()
+        return {session_id: last_vote for session_id, last_vote in rows if last_vote is not None}
+
+    async def get_archived_sessions_with_votes(self, limit: int) -> List[str]:
+        """Sessions archivées dont les votes ne sont pas encore tous supprimés (reprise après arrêt)"""
+        result = await self.db.execute(
+            select(SessionModel.id)
+            .where(
+                SessionModel.archived_at.is_not(None),
+                exists().where(Vote.session_id == SessionModel.id)
+            )
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+    async def purge_votes(self, session_id: str, limit: int) -> int:
+        """Supprimer au plus limit votes d'une session, en une courte transaction"""
+        batch = select(Vote.id).where(Vote.session_id == session_id).limit(limit)
+        result = await self.db.execute(delete(Vote).where(Vote.id.in_(batch)))
+        await self.db.commit()
+        return result.rowcount
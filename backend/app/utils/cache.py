@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import time
+
+def _retrieve_exception(task: asyncio.Future):
+    """Éviter l'avertissement "exception never retrieved" si tous les appelants ont été annulés"""
+    if not task.cancelled():
+        task.exception()
+
+class TTLCache:
+    """Cache LRU borné avec expiration par entrée
+
+    get_or_load regroupe les chargements concurrents d'une même clé : un seul
+    appel amont, les autres appelants attendent le même résultat.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._purge_after = 0.0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+
+        if len(self._data) > self.maxsize:
+            # Cache plein : libérer d'abord les entrées expirées (au plus une
+            # passe par seconde), puis les moins récemment utilisées
+            now = time.monotonic()
+            if now >= self._purge_after:
+                self._purge_after = now + 1.0
+                self.purge_expired()
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in expired:
+            del self._data[key]
+        self.expirations += len(expired)
+        return len(expired)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Lire la clé ou la charger une seule fois ; None n'est jamais mis en cache
+
+        Le chargement tourne dans sa propre tâche : un appelant annulé
+        (client déconnecté, timeout) n'interrompt pas les autres qui attendent
+        la même clé, et le résultat est tout de même mis en cache.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        pending = self._loading.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load(key, loader, ttl))
+            pending.add_done_callback(_retrieve_exception)
+            self._loading[key] = pending
+        return await asyncio.shield(pending)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        try:
+            value = await loader()
+            if value is not None:
+                self.set(key, value, ttl)
+            return value
+        finally:
+            del self._loading[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "loading": len(self._loading)
+        }
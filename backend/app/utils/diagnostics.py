@@ -0,0 +1,410 @@
+"""Mode diagnostic : profileur par requête, requêtes SQL lentes, blocages de la boucle
+
+- Profileur à échantillonnage : activé pour une requête par l'en-tête
+  X-Profile (valeur DIAGNOSTICS_ADMIN_TOKEN) ou pour une fraction
+  PROFILER_SAMPLE_RATE du trafic. Un thread relève la pile du thread de la
+  boucle toutes les PROFILER_INTERVAL_MS ; un échantillon appartient à la
+  requête dont le middleware est dans la pile. Résultat au format
+  « collapsed stacks » (flamegraph.pl, speedscope) dans PROFILER_OUTPUT_DIR.
+  Seul le temps passé sur la boucle est échantillonné : le temps d'attente
+  (base, Spotify) apparaît dans le total de la requête, pas dans la pile.
+- Requêtes SQL lentes : au-delà de SLOW_QUERY_THRESHOLD_MS, la requête,
+  la forme de ses paramètres (types, pas les valeurs) et la fonction de
+  l'application qui l'a lancée sont affichées et gardées en mémoire.
+- Retard de la boucle : une tâche mesure le retard de ses réveils
+  (histogramme event_loop_lag_seconds) et un thread de surveillance relève
+  la pile de la boucle quand elle est bloquée plus de LOOP_LAG_WARN_MS :
+  c'est le code synchrone exécuté dans une route async.
+"""
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+import asyncio
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+PROFILE_HEADER = b"x-profile"
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_UTILS_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def _short_filename(filename: str) -> str:
+    if filename.startswith(_APP_ROOT):
+        return "app" + filename[len(_APP_ROOT):]
+    return os.path.basename(filename)
+
+def _frame_label(frame, current_line: bool = False) -> str:
+    """Fonction et fichier ; ligne de définition (regroupement des profils) ou ligne en cours"""
+    code = frame.f_code
+    line = frame.f_lineno if current_line else code.co_firstlineno
+    return f"{code.co_name} ({_short_filename(code.co_filename)}:{line})"
+
+def _loop_stack(thread_id: int) -> List[Any]:
+    """Pile du thread de la boucle, de la racine à la feuille"""
+    frame = sys._current_frames().get(thread_id)
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+# ===== Profileur =====
+
+class Profile:
+    __slots__ = ("id", "method", "path", "route", "started", "duration_ms", "samples", "stacks", "file")
+
+    def __init__(self, method: str, path: str):
+        self.id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}"
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.file: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "duration_ms": round(self.duration_ms, 2),
+            "samples": self.samples,
+            "file": self.file
+        }
+
+class SamplingProfiler:
+    def __init__(self):
+        self.sample_rate = settings.PROFILER_SAMPLE_RATE
+        self.admin_token = settings.DIAGNOSTICS_ADMIN_TOKEN
+        self.interval = settings.PROFILER_INTERVAL_MS / 1000
+        self.output_dir = settings.PROFILER_OUTPUT_DIR or os.path.join(tempfile.gettempdir(), "spotify-party-profiles")
+
+        # Frame du middleware -> profil de la requête
+        self._active: Dict[Any, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+
+        self.recent: Deque[Profile] = deque(maxlen=settings.PROFILER_MAX_FILES)
+        self.stats = {"profiled_requests": 0, "samples": 0, "sampler_runs": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.admin_token) or self.sample_rate > 0
+
+    def wants(self, headers) -> bool:
+        """Profiler cette requête ? (en-tête admin, ou tirage selon PROFILER_SAMPLE_RATE)"""
+        if self.admin_token:
+            for name, value in headers:
+                if name == PROFILE_HEADER:
+                    return secrets.compare_digest(value.decode("latin-1"), self.admin_token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self, frame, profile: Profile):
+        with self._lock:
+            self._active[frame] = profile
+            self._loop_thread_id = threading.get_ident()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._thread.start()
+                self.stats["sampler_runs"] += 1
+
+    def end(self, frame) -> Optional[Profile]:
+        with self._lock:
+            profile = self._active.pop(frame, None)
+        if profile is not None:
+            profile.duration_ms = (time.perf_counter() - profile.started) * 1000
+            self.stats["profiled_requests"] += 1
+        return profile
+
+    def _sample_loop(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = set(self._active)
+                thread_id = self._loop_thread_id
+
+            stack = _loop_stack(thread_id)
+            # La requête en cours sur la boucle est celle dont le middleware est dans la pile
+            for index, frame in enumerate(stack):
+                if frame in active:
+                    label = ";".join(_frame_label(f) for f in stack[index + 1:])
+                    with self._lock:
+                        # Requête terminée entre-temps : son profil est peut-être en cours d'écriture
+                        profile = self._active.get(frame)
+                        if profile is not None:
+                            profile.stacks[label] += 1
+                            profile.samples += 1
+                            self.stats["samples"] += 1
+                    break
+            time.sleep(self.interval)
+
+    def write(self, profile: Profile) -> str:
+        """Écrire le profil au format collapsed stacks (hors de la boucle)"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        route = (profile.route or profile.path).strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        path = os.path.join(self.output_dir, f"{profile.id}-{profile.method}-{route}.folded")
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in profile.stacks.most_common():
+                file.write(f"{stack or '[handler]'} {count}\n")
+        return path
+
+    def keep(self, profile: Profile):
+        """Garder le profil dans la liste récente ; le plus ancien fichier s'en va avec son entrée"""
+        if len(self.recent) == self.recent.maxlen and self.recent[0].file:
+            try:
+                os.remove(self.recent[0].file)
+            except OSError:
+                pass
+        self.recent.append(profile)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return next((profile for profile in self.recent if profile.id == profile_id), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "in_flight": len(self._active),
+            "kept": len(self.recent)
+        }
+
+class ProfilerMiddleware:
+    """Middleware ASGI : profile les requêtes choisies, renvoie l'id du profil (X-Profile-Id)"""
+
+    def __init__(self, app, sampler: SamplingProfiler = None):
+        self.app = app
+        self.profiler = sampler or profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.wants(scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"])
+        frame = sys._getframe()
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        self.profiler.begin(frame, profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.profiler.end(frame)
+            profile.route = getattr(scope.get("route"), "path", None)
+            try:
+                profile.file = await asyncio.to_thread(self.profiler.write, profile)
+            except OSError as e:
+                print(f"Error writing profile {profile.id}: {e}")
+            self.profiler.keep(profile)
+
+# ===== Requêtes SQL lentes =====
+
+def _type_names(values) -> str:
+    """Types des valeurs, répétitions regroupées : (str, int x 200)"""
+    groups: List[List[Any]] = []
+    for value in values:
+        name = type(value).__name__
+        if groups and groups[-1][0] == name:
+            groups[-1][1] += 1
+        else:
+            groups.append([name, 1])
+    return ", ".join(name if count == 1 else f"{name} x {count}" for name, count in groups)
+
+def parameters_shape(parameters, executemany: bool = False) -> str:
+    """Forme des paramètres d'une requête, sans leurs valeurs"""
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x {parameters_shape(rows[0])}" if rows else "[]"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return f"({_type_names(parameters)})"
+    return type(parameters).__name__
+
+def query_caller() -> Optional[str]:
+    """Fonction de l'application à l'origine de la requête en cours"""
+    # Avec un moteur async, la requête s'exécute dans une greenlet : l'appelant
+    # est dans la pile de la greenlet parente, suspendue dans greenlet_spawn
+    frame = sys._getframe(1)
+    if greenlet is not None:
+        parent = greenlet.getcurrent().parent
+        if parent is not None and parent.gr_frame is not None:
+            frame = parent.gr_frame
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_ROOT) and not filename.startswith(_UTILS_ROOT):
+            return _frame_label(frame, current_line=True)
+        frame = frame.f_back
+    return None
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = None):
+        self.threshold = (threshold_ms if threshold_ms is not None else settings.SLOW_QUERY_THRESHOLD_MS) / 1000
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=200)
+        self.stats = {"slow_queries": 0, "slowest_ms": 0.0}
+
+    def instrument(self, engine):
+        """Chronométrer les requêtes d'un moteur (sync ou async) et garder les lentes"""
+        sync_engine = getattr(engine, "sync_engine", engine)
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def start_timer(conn, cursor, statement, parameters, context, executemany):
+            context._slow_query_started = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def check_duration(conn, cursor, statement, parameters, context, executemany):
+            duration = time.perf_counter() - context._slow_query_started
+            if duration >= self.threshold:
+                self.record(statement, parameters, executemany, duration)
+
+        return engine
+
+    def record(self, statement: str, parameters, executemany: bool, duration: float):
+        duration_ms = duration * 1000
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "statement": " ".join(statement.split())[:1000],
+            "parameters": parameters_shape(parameters, executemany),
+            "caller": query_caller()
+        }
+        self.recent.append(entry)
+        self.stats["slow_queries"] += 1
+        self.stats["slowest_ms"] = max(self.stats["slowest_ms"], entry["duration_ms"])
+        print(f"⚠️ Slow query {entry['duration_ms']} ms in {entry['caller']}: {entry['statement'][:200]} {entry['parameters']}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "threshold_ms": self.threshold * 1000}
+
+# ===== Retard de la boucle =====
+
+class LoopMonitor:
+    def __init__(self, enabled: bool = None):
+        self.enabled = settings.LOOP_MONITOR_ENABLED if enabled is None else enabled
+        self.interval = settings.LOOP_MONITOR_INTERVAL_MS / 1000
+        self.warn_after = settings.LOOP_LAG_WARN_MS / 1000
+
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self.running = False
+
+        self.lag_histogram = metrics.histogram("event_loop_lag_seconds", "Delay of the event loop monitor wakeups")
+        self.lags = deque(maxlen=256)
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self.stats = {"ticks": 0, "stalls": 0, "max_lag_ms": 0.0}
+
+    async def _run(self):
+        while self.running:
+            expected = time.monotonic() + self.interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            self._heartbeat = now
+            if not self.running:
+                break
+
+            lag = max(0.0, now - expected)
+            self.lag_histogram.labels().observe(lag)
+            self.lags.append(lag * 1000)
+            self.stats["ticks"] += 1
+            self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], round(lag * 1000, 2))
+
+    def _watch(self):
+        """Thread de surveillance : pile de la boucle quand elle ne répond plus"""
+        reported = None
+        while self.running:
+            time.sleep(self.interval / 2)
+            heartbeat = self._heartbeat
+            # Retard par rapport au réveil attendu de la tâche de mesure
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.warn_after or reported == heartbeat:
+                continue
+
+            # Un seul relevé par blocage
+            reported = heartbeat
+            stack = [_frame_label(frame, current_line=True) for frame in _loop_stack(self._loop_thread_id)]
+            stall = {
+                "at": datetime.utcnow().isoformat(),
+                "blocked_ms": round(blocked * 1000, 2),
+                "stack": stack[-12:]
+            }
+            self.stalls.append(stall)
+            self.stats["stalls"] += 1
+            print(f"⚠️ Event loop blocked for {stall['blocked_ms']} ms in {stack[-1] if stack else '?'}")
+
+    async def start(self):
+        if not self.enabled:
+            return
+        # Primitives liées à la boucle du serveur
+        self._wakeup = asyncio.Event()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self.running = False
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+
+        def percentile(p: float) -> float:
+            if not lags:
+                return 0.0
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))], 2)
+
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "running": self.running,
+            "lag_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(lags[-1], 2) if lags else 0.0
+            }
+        }
+
+# Instances globales
+profiler = SamplingProfiler()
+slow_query_log = SlowQueryLog()
+loop_monitor = LoopMonitor()
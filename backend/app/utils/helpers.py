@@ -1,17 +1,154 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import List, Optional, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
 from app.core.config import settings
+from app.utils.diagnostics import slow_query_log
+from app.utils.metrics import instrument_engine
+
+def async_database_url(url: str) -> str:
+    """Choisir le driver asynchrone correspondant à DATABASE_URL (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url[len("postgres://"):]
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+# ===== Profil SQLite =====
+
+def sqlite_pragmas(read_only: bool = False) -> List[str]:
+    """PRAGMA appliqués à chaque nouvelle connexion SQLite
+
+    WAL : les lecteurs ne bloquent plus l'écrivain (et inversement), et
+    synchronous=NORMAL ne fait plus de fsync qu'aux checkpoints. Le busy
+    timeout fait patienter au lieu d'échouer sur "database is locked".
+    """
+    pragmas = [
+        f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_BYTES}",
+        # Valeur négative : taille en KiB plutôt qu'en pages
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}"
+    ]
+    if read_only:
+        # Filet de sécurité : une écriture routée vers le moteur de lecture échoue
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+def apply_pragmas(engine, pragmas: List[str]):
+    """Exécuter des PRAGMA à chaque connexion ouverte par le moteur (sync ou async)"""
+    @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+    def set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+def pool_options(pool_size: int, max_overflow: int) -> dict:
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS
+    }
+
+def create_async_engines(url: str) -> Tuple[AsyncEngine, AsyncEngine]:
+    """(moteur d'écriture, moteur de lecture), le même moteur sans séparation"""
+    if "sqlite" not in url:
+        engine = create_async_engine(url, **pool_options(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW))
+        return engine, engine
+
+    # aiosqlite n'a pas de pool par défaut (une connexion par session)
+    if not settings.DB_SPLIT_READ_WRITE:
+        engine = create_async_engine(
+            url, poolclass=AsyncAdaptedQueuePool, **pool_options(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+        )
+        return apply_pragmas(engine, sqlite_pragmas()), engine
+
+    # SQLite n'accepte qu'un écrivain : les écritures attendent leur tour dans
+    # le pool d'écriture (sans bloquer la boucle) plutôt que sur le verrou du
+    # fichier, pendant que les lectures avancent en parallèle grâce au WAL
+    write_engine = create_async_engine(
+        url, poolclass=AsyncAdaptedQueuePool, **pool_options(settings.DB_WRITE_POOL_SIZE, 0)
+    )
+    read_engine = create_async_engine(
+        url, poolclass=AsyncAdaptedQueuePool, **pool_options(settings.DB_READ_POOL_SIZE, 0)
+    )
+    return apply_pragmas(write_engine, sqlite_pragmas()), apply_pragmas(read_engine, sqlite_pragmas(read_only=True))
+
+def create_background_engine(url: str, write_engine: AsyncEngine) -> AsyncEngine:
+    """Moteur d'écriture des tâches de fond (SQLite séparé), le moteur d'écriture sinon
+
+    Le pool d'écriture garde l'ordre d'arrivée des requêtes ; une tâche de fond
+    ou un rafraîchissement de token lancé pendant qu'une requête tient la
+    connexion n'attend plus DB_POOL_TIMEOUT_SECONDS dans ce pool, seulement
+    le verrou du fichier le temps d'un commit.
+    """
+    if "sqlite" not in url or not settings.DB_SPLIT_READ_WRITE:
+        return write_engine
+
+    engine = create_async_engine(
+        url, poolclass=AsyncAdaptedQueuePool, **pool_options(settings.DB_BACKGROUND_WRITE_POOL_SIZE, 0)
+    )
+    return apply_pragmas(engine, sqlite_pragmas())
+
+def routing_sessionmaker(write_engine: AsyncEngine, read_engine: Optional[AsyncEngine] = None) -> async_sessionmaker:
+    """Sessions asynchrones qui envoient les écritures et les lectures à leur moteur"""
+    if read_engine is None or read_engine is write_engine:
+        return async_sessionmaker(write_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+    class RoutingSession(Session):
+        # Flush de l'ORM et INSERT/UPDATE/DELETE sur l'écrivain, le reste sur
+        # un lecteur. Une lecture ne voit pas les écritures non commitées de
+        # la même session : les services commitent avant de relire.
+        def get_bind(self, mapper=None, clause=None, **kwargs):
+            if self._flushing or isinstance(clause, UpdateBase):
+                return write_engine.sync_engine
+            return read_engine.sync_engine
+
+    return async_sessionmaker(
+        autoflush=False, expire_on_commit=False, class_=AsyncSession, sync_session_class=RoutingSession
+    )
 
 # Configuration de la base de données
+# Moteur synchrone : scripts (init_db) et benchmarks
 engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {})
+if "sqlite" in settings.DATABASE_URL:
+    # WAL est persistant : init_db le pose sur le fichier avant le démarrage du serveur
+    apply_pragmas(engine, sqlite_pragmas())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Moteurs asynchrones : routes, WebSocket et tâches de fond (ne bloquent pas la boucle)
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+async_engine, async_read_engine = create_async_engines(ASYNC_DATABASE_URL)
+AsyncSessionLocal = routing_sessionmaker(async_engine, async_read_engine)
+async_background_engine = create_background_engine(ASYNC_DATABASE_URL, async_engine)
+# Sessions des tâches de fond : écritures sur leur propre connexion
+BackgroundSessionLocal = routing_sessionmaker(async_background_engine, async_read_engine)
+for _engine in {async_engine, async_read_engine, async_background_engine}:
+    if settings.METRICS_ENABLED:
+        instrument_engine(_engine)
+    if settings.SLOW_QUERY_THRESHOLD_MS > 0:
+        # Requêtes lentes affichées avec la forme de leurs paramètres et leur appelant
+        slow_query_log.instrument(_engine)
+
+async def dispose_engines():
+    """Fermer les connexions des pools (arrêt du serveur, fin de script)"""
+    for _engine in {async_engine, async_read_engine, async_background_engine}:
+        await _engine.dispose()
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def generate_session_code():
     """Générer un code de session unique"""
@@ -0,0 +1,287 @@
+"""Métriques du serveur au format texte Prometheus (/api/metrics)
+
+Un middleware ASGI mesure chaque requête HTTP (durée par route, statut) et
+ouvre un contexte de requête où les hooks SQLAlchemy et le client Spotify
+ajoutent leurs appels : on voit, route par route, combien de requêtes SQL
+et de temps base de données ou Spotify une requête a coûté.
+
+Les histogrammes ont des buckets fixes, alloués une fois par série
+(méthode, route...) : une observation incrémente un compteur de liste, sans
+verrou (tout se passe sur la boucle d'événements) ni objet créé. Les
+statistiques des services (get_stats) et les sockets ouvertes sont lues au
+moment du scrape.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+import re
+import time
+
+from sqlalchemy import event
+
+NAMESPACE = "spotify_party"
+
+# Secondes : de la milliseconde (cache, SQLite) à la dizaine de secondes (Spotify)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Requêtes SQL par requête HTTP
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+_INVALID_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # Un compteur par bucket, plus +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class HistogramFamily:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = Histogram(self.buckets)
+        return child
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} histogram")
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for values, child in sorted(self.children.items()):
+            labels = _format_labels(self.labelnames, values)
+            prefix = labels[:-1] + "," if labels else "{"
+            cumulative = 0
+            for bound, count in zip(bounds, child.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+class CounterFamily:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *values: str, amount: float = 1):
+        self.values[values] = self.values.get(values, 0) + amount
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} counter")
+        for values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+
+GaugeValue = Union[float, Dict[Tuple[str, ...], float]]
+
+class GaugeFamily:
+    """Jauge lue au scrape : un nombre, ou {valeurs des labels: nombre}"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], read: Callable[[], GaugeValue]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.read = read
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} gauge")
+        value = self.read()
+        if isinstance(value, dict):
+            for values, item in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(item)}")
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _flatten(prefix: str, stats: Dict[str, Any], lines: List[str]):
+    """Valeurs numériques d'un get_stats (dictionnaires imbriqués aplatis)"""
+    for key, value in stats.items():
+        name = f"{prefix}_{_INVALID_NAME.sub('_', str(key))}"
+        if isinstance(value, dict):
+            _flatten(name, value, lines)
+        elif isinstance(value, bool):
+            lines.append(f"{name} {int(value)}")
+        elif isinstance(value, (int, float)):
+            lines.append(f"{name} {_format_value(value)}")
+
+class RequestMetrics:
+    """Appels faits pendant une requête HTTP (base de données, Spotify)"""
+    __slots__ = ("db_queries", "db_seconds", "spotify_calls", "spotify_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.spotify_calls = 0
+        self.spotify_seconds = 0.0
+
+# Contexte de la requête HTTP en cours (None hors requête : tâches de fond, WebSocket)
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = NAMESPACE):
+        self.namespace = namespace
+        self._families: List[Any] = []
+        self._stats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+        self.http_duration = self.histogram(
+            "http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+        self.http_requests = self.counter(
+            "http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+        self.http_db_queries = self.histogram(
+            "http_request_db_queries", "SQL queries per HTTP request", ("route",), COUNT_BUCKETS)
+        self.http_db_seconds = self.histogram(
+            "http_request_db_seconds", "Time spent in SQL per HTTP request", ("route",))
+        self.http_spotify_seconds = self.histogram(
+            "http_request_spotify_seconds", "Time spent calling Spotify per HTTP request", ("route",))
+        self.db_duration = self.histogram(
+            "db_query_duration_seconds", "SQL query latency by statement type", ("operation",))
+        self.db_errors = self.counter(
+            "db_query_errors_total", "Failed SQL queries by statement type", ("operation",))
+        self.spotify_duration = self.histogram(
+            "spotify_request_duration_seconds", "Spotify API call latency by endpoint and status", ("endpoint", "status"))
+
+    # ===== Déclaration =====
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}"
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Sequence[float] = DURATION_BUCKETS) -> HistogramFamily:
+        family = HistogramFamily(self._name(name), documentation, labelnames, buckets)
+        self._families.append(family)
+        return family
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> CounterFamily:
+        family = CounterFamily(self._name(name), documentation, labelnames)
+        self._families.append(family)
+        return family
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], GaugeValue],
+              labelnames: Tuple[str, ...] = ()) -> GaugeFamily:
+        family = GaugeFamily(self._name(name), documentation, labelnames, read)
+        self._families.append(family)
+        return family
+
+    def register_stats(self, component: str, get_stats: Callable[[], Dict[str, Any]]):
+        """Exposer les valeurs numériques du get_stats d'un service"""
+        self._stats[component] = get_stats
+
+    # ===== Observations =====
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, request: RequestMetrics):
+        self.http_duration.labels(method, route).observe(seconds)
+        self.http_requests.inc(method, route, str(status))
+        self.http_db_queries.labels(route).observe(request.db_queries)
+        self.http_db_seconds.labels(route).observe(request.db_seconds)
+        self.http_spotify_seconds.labels(route).observe(request.spotify_seconds)
+
+    def observe_query(self, operation: str, seconds: float):
+        self.db_duration.labels(operation).observe(seconds)
+        request = current_request.get()
+        if request is not None:
+            request.db_queries += 1
+            request.db_seconds += seconds
+
+    def observe_spotify(self, endpoint: str, status: str, seconds: float):
+        self.spotify_duration.labels(endpoint, status).observe(seconds)
+        request = current_request.get()
+        if request is not None:
+            request.spotify_calls += 1
+            request.spotify_seconds += seconds
+
+    # ===== Exposition =====
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self._families:
+            family.render(lines)
+        for component, get_stats in self._stats.items():
+            try:
+                _flatten(self._name(component), get_stats(), lines)
+            except Exception as e:
+                print(f"Error reading {component} stats: {e}")
+        lines.append("")
+        return "\n".join(lines)
+
+class MetricsMiddleware:
+    """Middleware ASGI : durée et statut de chaque requête HTTP, par modèle de route"""
+
+    def __init__(self, app, registry: "MetricsRegistry" = None):
+        self.app = app
+        self.registry = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request = RequestMetrics()
+        token = current_request.set(request)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            # Modèle de route (/api/sessions/{session_id}) posé par le routeur : cardinalité bornée
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.registry.observe_request(scope["method"], route, status_code, time.perf_counter() - started, request)
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip()[:6].upper()
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+def instrument_engine(engine, registry: "MetricsRegistry" = None):
+    """Chronométrer chaque requête SQL d'un moteur (sync ou async)"""
+    registry = registry or metrics
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        registry.observe_query(_operation(statement), time.perf_counter() - context._metrics_started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def count_error(exception_context):
+        registry.db_errors.inc(_operation(exception_context.statement or ""))
+
+    return engine
+
+# Instance globale
+metrics = MetricsRegistry()
@@ -0,0 +1,267 @@
+"""Service des fichiers statiques du build Flutter
+
+Le build est indexé une seule fois au démarrage : chaque fichier reçoit un
+ETag fort (hash du contenu) et, s'il est compressible, des variantes brotli
+(.br, si le module brotli est installé) et gzip (.gz). Les variantes
+produites par une étape de build (fichiers .br/.gz à côté de l'original,
+voir `python -m app.utils.static_files`) sont reprises telles quelles ; les
+autres sont générées au démarrage dans STATIC_CACHE_DIR.
+
+Politique de cache navigateur :
+- index.html et les fichiers d'amorçage sont toujours revalidés (304 si
+  l'ETag n'a pas changé) ;
+- un fichier demandé avec ?v=<version de son contenu> est immuable pendant
+  un an : index.html est réécrit pour référencer ses scripts et liens sous
+  cette forme, un nouveau build change donc leurs URL ;
+- les noms de fichiers empreintés (nom.<hash>.ext) sont immuables aussi ;
+- le reste est revalidé à chaque chargement (un 304 sans corps).
+"""
+from typing import Dict, Optional
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensions compressibles (texte, wasm, polices non compressées)
+COMPRESSIBLE_SUFFIXES = {
+    ".js", ".mjs", ".css", ".html", ".json", ".map", ".svg", ".txt",
+    ".wasm", ".symbols", ".otf", ".ttf", ".frag", ".bin", ""
+}
+MIN_COMPRESS_SIZE = 1024
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Toujours revalidés même avec ?v= (points d'entrée du build)
+ENTRY_POINTS = {"index.html", "flutter_service_worker.js", "flutter_bootstrap.js", "version.json"}
+
+_FINGERPRINT = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+_LOCAL_REFERENCE = re.compile(r'\b(src|href)="([^"?#:]+)"')
+
+mimetypes.add_type("application/wasm", ".wasm")
+mimetypes.add_type("application/javascript", ".mjs")
+mimetypes.add_type("font/otf", ".otf")
+
+class Variant:
+    __slots__ = ("path", "etag", "stat")
+
+    def __init__(self, path: str, etag: str):
+        self.path = path
+        self.etag = etag
+        self.stat = os.stat(path)
+
+class StaticFile:
+    __slots__ = ("name", "path", "media_type", "digest", "etag", "stat", "body", "variants")
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.digest = hashlib.sha256(_read(path)).hexdigest()
+        self.etag = f'"{self.digest[:20]}"'
+        self.stat = os.stat(path)
+        # Contenu servi depuis la mémoire (index.html réécrit)
+        self.body: Optional[bytes] = None
+        # encoding -> variante, dans l'ordre de préférence
+        self.variants: Dict[str, Variant] = {}
+
+    @property
+    def version(self) -> str:
+        return self.digest[:12]
+
+    @property
+    def compressible(self) -> bool:
+        suffix = os.path.splitext(self.name)[1].lower()
+        return suffix in COMPRESSIBLE_SUFFIXES and self.stat.st_size >= MIN_COMPRESS_SIZE
+
+    def cache_control(self, version: Optional[str]) -> str:
+        if self.name in ENTRY_POINTS:
+            return REVALIDATE
+        if version == self.version or _FINGERPRINT.search(self.name):
+            return IMMUTABLE
+        return REVALIDATE
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+def _accepted_encodings(header: str) -> set:
+    """Encodages acceptés d'un en-tête Accept-Encoding (q=0 exclus)"""
+    accepted = set()
+    for part in header.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = params.strip()
+        if quality.startswith("q=") and quality[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(coding.strip())
+    return accepted
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+class StaticBundle:
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+        self.files: Dict[str, StaticFile] = {}
+        self.stats = {"served": 0, "not_modified": 0, "compressed": 0, "generated_variants": 0}
+        self._index()
+
+    # ===== Indexation =====
+
+    def _index(self):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if name.endswith((".br", ".gz")) and os.path.exists(path[:-3]):
+                    continue
+                self.files[relative] = StaticFile(relative, path)
+
+        for entry in self.files.values():
+            self._attach_prebuilt_variants(entry)
+
+        index = self.files.get("index.html")
+        if index is not None:
+            self._version_references(index)
+
+    def _attach_prebuilt_variants(self, entry: StaticFile):
+        """Variantes .br/.gz d'une étape de build, si plus récentes que l'original"""
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            path = entry.path + suffix
+            if os.path.exists(path) and os.stat(path).st_mtime >= entry.stat.st_mtime:
+                entry.variants[encoding] = Variant(path, f'"{entry.digest[:20]}-{encoding}"')
+
+    def _version_references(self, index: StaticFile):
+        """Réécrire les src/href locaux d'index.html en ?v=<version> (cache immuable)"""
+        with open(index.path, encoding="utf-8") as file:
+            html = file.read()
+
+        def versioned(match: re.Match) -> str:
+            attribute, reference = match.groups()
+            target = self.files.get(reference.lstrip("/"))
+            if target is None or target.name in ENTRY_POINTS:
+                return match.group(0)
+            return f'{attribute}="{reference}?v={target.version}"'
+
+        body = _LOCAL_REFERENCE.sub(versioned, html).encode("utf-8")
+        index.body = body
+        index.digest = hashlib.sha256(body).hexdigest()
+        index.etag = f'"{index.digest[:20]}"'
+        # Variantes précompressées de l'index d'origine : obsolètes après réécriture
+        index.variants = {}
+
+    # ===== Compression =====
+
+    def compress(self, cache_dir: str = "", gzip_level: int = 9, brotli_quality: int = 9) -> int:
+        """Générer les variantes manquantes (au démarrage, hors boucle d'événements)"""
+        cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "spotify-party-static")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        generated = 0
+        for entry in self.files.values():
+            if not entry.compressible:
+                continue
+
+            content = None
+            for encoding in ("br", "gzip"):
+                if encoding in entry.variants or (encoding == "br" and brotli is None):
+                    continue
+
+                # Nommée par le hash du contenu : réutilisée d'un démarrage à l'autre
+                path = os.path.join(cache_dir, f"{entry.digest}.{'br' if encoding == 'br' else 'gz'}")
+                if not os.path.exists(path):
+                    if content is None:
+                        content = entry.body if entry.body is not None else _read(entry.path)
+                    if encoding == "br":
+                        compressed = brotli.compress(content, quality=brotli_quality)
+                    else:
+                        compressed = gzip.compress(content, compresslevel=gzip_level, mtime=0)
+                    # Variante inutile si elle ne gagne pas au moins 10 %
+                    if len(compressed) > len(content) * 0.9:
+                        continue
+                    with open(path + ".tmp", "wb") as file:
+                        file.write(compressed)
+                    os.replace(path + ".tmp", path)
+                    generated += 1
+
+                entry.variants[encoding] = Variant(path, f'"{entry.digest[:20]}-{encoding}"')
+
+            # Ordre de préférence : brotli puis gzip
+            entry.variants = {encoding: entry.variants[encoding] for encoding in ("br", "gzip") if encoding in entry.variants}
+
+        self.stats["generated_variants"] += generated
+        return generated
+
+    # ===== Réponses =====
+
+    def get(self, path: str) -> Optional[StaticFile]:
+        return self.files.get(path.lstrip("/"))
+
+    def response(self, entry: StaticFile, request: Request) -> Response:
+        """Réponse d'un fichier indexé : négociation de l'encodage, ETag fort, 304"""
+        headers = {"Cache-Control": entry.cache_control(request.query_params.get("v"))}
+        variant = None
+        if entry.variants:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+            variant = next((v for encoding, v in entry.variants.items() if encoding in accepted), None)
+
+        etag = variant.etag if variant is not None else entry.etag
+        headers["ETag"] = etag
+
+        if _etag_matches(request.headers.get("if-none-match", ""), etag):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        self.stats["served"] += 1
+        if variant is not None:
+            self.stats["compressed"] += 1
+            headers["Content-Encoding"] = "br" if variant.path.endswith(".br") else "gzip"
+            return FileResponse(variant.path, media_type=entry.media_type, headers=headers, stat_result=variant.stat)
+        if entry.body is not None:
+            return Response(entry.body, media_type=entry.media_type, headers=headers)
+        return FileResponse(entry.path, media_type=entry.media_type, headers=headers, stat_result=entry.stat)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "files": len(self.files),
+            "with_variants": sum(1 for entry in self.files.values() if entry.variants),
+            "brotli": brotli is not None
+        }
+
+def precompress(root: str, gzip_level: int = 9, brotli_quality: int = 11) -> int:
+    """Étape de build : écrire les variantes .br/.gz à côté des fichiers compressibles"""
+    written = 0
+    for entry in StaticBundle(root).files.values():
+        if not entry.compressible or entry.name == "index.html":
+            continue
+        content = _read(entry.path)
+        outputs = [(".gz", gzip.compress(content, compresslevel=gzip_level, mtime=0))]
+        if brotli is not None:
+            outputs.append((".br", brotli.compress(content, quality=brotli_quality)))
+        for suffix, compressed in outputs:
+            if len(compressed) <= len(content) * 0.9:
+                with open(entry.path + suffix, "wb") as file:
+                    file.write(compressed)
+                written += 1
+    return written
+
+if __name__ == "__main__":
+    # python -m app.utils.static_files ../frontend
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "..", "..", "frontend")
+    print(f"✅ {precompress(root)} precompressed files written in {root}")
@@ -0,0 +1,201 @@
+"""Diffusion des événements de session entre workers / instances
+
+Chaque worker garde ses propres sockets dans ConnectionManager. Le broker
+fait circuler les messages d'une room vers tous les workers qui ont des
+clients dans cette room.
+"""
+from typing import Callable, Dict, Optional, Set
+import asyncio
+import json
+import uuid
+
+# deliver(session_id, message, exclude_id) : livraison aux sockets locales
+Deliver = Callable[[str, dict, Optional[str]], None]
+
+class InMemoryBroker:
+    """Broker par défaut : un seul process, livraison directe"""
+
+    def __init__(self):
+        self.deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, session_id: str):
+        pass
+
+    async def unsubscribe(self, session_id: str):
+        pass
+
+    async def publish(self, session_id: str, message: dict, exclude_id: Optional[str] = None):
+        self.deliver(session_id, message, exclude_id)
+
+    async def acquire_lease(self, name: str, ttl_seconds: float) -> bool:
+        """Bail exclusif entre workers : un seul process, toujours obtenu"""
+        return True
+
+    async def release_lease(self, name: str):
+        pass
+
+class RedisBroker(InMemoryBroker):
+    """Broker Redis pub/sub : un canal par session, abonné seulement si des clients locaux y sont"""
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "spotify-party"):
+        super().__init__()
+        self.url = url
+        self.client = client
+        self.prefix = prefix
+        self.worker_id = uuid.uuid4().hex
+        # Abonnements demandés par room (un par ouverture de room locale) et canaux réellement abonnés
+        self.rooms: Dict[str, int] = {}
+        self.channels: Set[str] = set()
+        # Commandes d'abonnement sérialisées (une seule connexion pubsub)
+        self._lock = asyncio.Lock()
+        self.pubsub = None
+        self.listener: Optional[asyncio.Task] = None
+        self.running = False
+        self._subscribed = asyncio.Event()
+
+    def _channel(self, session_id: str) -> str:
+        return f"{self.prefix}:session:{session_id}"
+
+    def _lease_key(self, name: str) -> str:
+        return f"{self.prefix}:lease:{name}"
+
+    async def _lease_holder(self, key: str) -> Optional[str]:
+        holder = await self.client.get(key)
+        return holder.decode() if isinstance(holder, bytes) else holder
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+
+        if self.client is None:
+            import redis.asyncio as redis
+            self.client = redis.from_url(self.url)
+
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.running = True
+        self.listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self.listener is not None:
+            # Le timeout interne de redis-py peut absorber l'annulation : le
+            # drapeau running garantit la sortie de la boucle
+            self.running = False
+            self._subscribed.set()
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def subscribe(self, session_id: str):
+        self.rooms[session_id] = self.rooms.get(session_id, 0) + 1
+        await self._sync(session_id)
+
+    async def unsubscribe(self, session_id: str):
+        count = self.rooms.get(session_id, 0)
+        if count == 0:
+            return
+        if count == 1:
+            del self.rooms[session_id]
+        else:
+            self.rooms[session_id] = count - 1
+        await self._sync(session_id)
+
+    async def _sync(self, session_id: str):
+        """Aligner l'abonnement Redis sur le compteur de la room
+
+        Un désabonnement en retard (room refermée puis rouverte avant son
+        exécution) ne retire plus l'abonnement d'une room qui a des sockets :
+        l'état voulu est relu sous le verrou, au moment d'agir.
+        """
+        async with self._lock:
+            wanted = session_id in self.rooms
+            if wanted == (session_id in self.channels):
+                return
+            try:
+                if wanted:
+                    await self.pubsub.subscribe(self._channel(session_id))
+                    self.channels.add(session_id)
+                    self._subscribed.set()
+                else:
+                    await self.pubsub.unsubscribe(self._channel(session_id))
+                    self.channels.discard(session_id)
+                    if not self.channels and self.running:
+                        self._subscribed.clear()
+            except Exception as e:
+                print(f"Error {'subscribing to' if wanted else 'unsubscribing from'} session {session_id}: {e}")
+
+    async def publish(self, session_id: str, message: dict, exclude_id: Optional[str] = None):
+        # Les sockets locales sont servies tout de suite, sans aller-retour Redis
+        self.deliver(session_id, message, exclude_id)
+
+        envelope = json.dumps({
+            "origin": self.worker_id,
+            "session_id": session_id,
+            "exclude_id": exclude_id,
+            "message": message
+        })
+        try:
+            await self.client.publish(self._channel(session_id), envelope)
+        except Exception as e:
+            print(f"Error publishing to session {session_id}: {e}")
+
+    async def acquire_lease(self, name: str, ttl_seconds: float) -> bool:
+        """Bail exclusif entre workers (SET NX PX), prolongé par son détenteur
+
+        Le renouvellement (GET puis PEXPIRE) n'est pas atomique : au pire deux
+        workers se croient détenteurs pendant une période.
+        """
+        key = self._lease_key(name)
+        ttl_ms = int(ttl_seconds * 1000)
+        if await self.client.set(key, self.worker_id, nx=True, px=ttl_ms):
+            return True
+        if await self._lease_holder(key) == self.worker_id:
+            await self.client.pexpire(key, ttl_ms)
+            return True
+        return False
+
+    async def release_lease(self, name: str):
+        key = self._lease_key(name)
+        if await self._lease_holder(key) == self.worker_id:
+            await self.client.delete(key)
+
+    async def _listen(self):
+        while self.running:
+            await self._subscribed.wait()
+            try:
+                data = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error reading from Redis broker: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if not data or data.get("type") != "message":
+                continue
+
+            try:
+                envelope = json.loads(data["data"])
+            except ValueError:
+                continue
+
+            if envelope.get("origin") == self.worker_id:
+                continue
+
+            self.deliver(envelope["session_id"], envelope["message"], envelope.get("exclude_id"))
+
+def create_broker(url: Optional[str], prefix: str = "spotify-party") -> InMemoryBroker:
+    """Choisir le broker selon BROKER_URL (vide = un seul process)"""
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url=url, prefix=prefix)
+    return InMemoryBroker()
@@ -1,19 +1,151 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Set
+import asyncio
 import json
+import uuid
+
+from app.core.config import settings
+from app.services.playback_poller import playback_poller
+from app.services.queue_engine import queue_engine
+from app.services.session_store import session_store
+from app.services.vote_buffer import vote_buffer
+from app.services.voting_service import VotingService
+from app.utils.helpers import AsyncSessionLocal
+from app.websocket.broker import InMemoryBroker, create_broker
+
+# Compteurs d'envoi de toutes les connexions de ce worker
+delivery_stats = {
+    "dropped_messages": 0,
+    "slow_disconnects": 0,
+    "close_errors": 0
+}
+
+class WebSocketConnection:
+    """Connexion WebSocket brute : chaque message est envoyé en JSON
+
+    Les envois passent par une file bornée vidée par une tâche dédiée, pour
+    qu'un client lent ne bloque jamais la diffusion vers les autres.
+    """
+    protocol = "websocket"
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.id = uuid.uuid4().hex
+        self.session_id: Optional[str] = None
+        self.user_id: Optional[str] = None
+        self.closed = False
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.writer: Optional[asyncio.Task] = None
+        # Fermeture lancée par drop(), attendue par le point d'entrée (wait_closed)
+        self.closer: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def encode(message: dict) -> str:
+        return json.dumps(message)
+
+    def start(self):
+        """Démarrer la tâche d'écriture (après accept)"""
+        if self.writer is None:
+            self.writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, payload: str) -> bool:
+        """Mettre un message déjà encodé en file, False (compté) si la file est pleine ou fermée"""
+        if not self.closed:
+            try:
+                self.queue.put_nowait(payload)
+                return True
+            except asyncio.QueueFull:
+                pass
+        delivery_stats["dropped_messages"] += 1
+        return False
+
+    async def send_message(self, message: dict):
+        self.enqueue(self.encode(message))
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                payload = await self.queue.get()
+                if payload is None:
+                    break
+                await asyncio.wait_for(self.websocket.send_text(payload), timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Envoi en échec ou trop lent : on ferme, le client se resynchronisera
+            self.drop()
+
+    def drop(self, code: int = 1013):
+        """Fermer la connexion sans bloquer l'appelant"""
+        if self.closed:
+            return
+        self.closed = True
+        self.closer = asyncio.create_task(self._close(code))
+
+    async def _close(self, code: int):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+        except Exception as e:
+            delivery_stats["close_errors"] += 1
+            print(f"Error closing websocket {self.id}: {e!r}")
+
+    async def wait_closed(self):
+        """Attendre la fermeture lancée par drop() (fin du point d'entrée)"""
+        if self.closer is not None:
+            await self.closer
+
+    def stop(self):
+        self.closed = True
+        if self.writer is not None:
+            self.writer.cancel()
+            # wait_for peut absorber une annulation : on réveille aussi la boucle
+            try:
+                self.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-    
-    async def connect(self, websocket: WebSocket, session_id: str, user_id: str):
+    def __init__(self, broker: Optional[InMemoryBroker] = None):
+        self.active_connections: Dict[str, List[WebSocketConnection]] = {}
+        self.broker = broker or InMemoryBroker()
+        self.broker.deliver = self.deliver_local
+        queue_engine.broker = self.broker
+        # Désabonnements lancés depuis disconnect() (synchrone), attendus à l'arrêt
+        self._unsubscribes: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Démarrer le broker (appelé au démarrage de l'application)"""
+        await self.broker.start(self.deliver_local)
+
+    async def stop(self):
+        await queue_engine.stop()
+        if self._unsubscribes:
+            await asyncio.gather(*self._unsubscribes, return_exceptions=True)
+        await self.broker.stop()
+
+    async def connect(self, websocket: WebSocket, session_id: str, user_id: str) -> WebSocketConnection:
         await websocket.accept()
-        
+
+        connection = WebSocketConnection(websocket)
+        connection.start()
+        await self.join(connection, session_id, user_id)
+        return connection
+
+    async def join(self, connection: WebSocketConnection, session_id: str, user_id: str):
+        """Ajouter une connexion déjà acceptée à la room d'une session"""
+        if connection.session_id is not None:
+            await self.leave(connection)
+
+        connection.session_id = session_id
+        connection.user_id = user_id
+
         if session_id not in self.active_connections:
             self.active_connections[session_id] = []
-        
-        self.active_connections[session_id].append(websocket)
-        
+            await self.broker.subscribe(session_id)
+            playback_poller.watch(session_id)
+
+        self.active_connections[session_id].append(connection)
+
         await self.broadcast_to_session(
             session_id,
             {
@@ -21,57 +153,159 @@ class ConnectionManager:
                 "user_id": user_id,
                 "message": f"User {user_id} joined the session"
             },
-            exclude_websocket=websocket
+            exclude_websocket=connection
+        )
+
+    async def leave(self, connection: WebSocketConnection):
+        """Retirer une connexion de sa room et prévenir les autres participants"""
+        session_id, user_id = connection.session_id, connection.user_id
+        if session_id is None:
+            return
+
+        self.disconnect(connection, session_id, user_id)
+
+        await self.broadcast_to_session(
+            session_id,
+            {
+                "type": "user_left",
+                "user_id": user_id,
+                "message": f"User {user_id} left the session"
+            }
         )
-    
-    def disconnect(self, websocket: WebSocket, session_id: str, user_id: str):
+
+    def disconnect(self, websocket: WebSocketConnection, session_id: str, user_id: str):
+        websocket.session_id = None
+
         if session_id in self.active_connections:
-            self.active_connections[session_id].remove(websocket)
-            
+            if websocket in self.active_connections[session_id]:
+                self.active_connections[session_id].remove(websocket)
+
             if not self.active_connections[session_id]:
                 del self.active_connections[session_id]
-    
-    async def broadcast_to_session(self, session_id: str, message: dict, exclude_websocket: WebSocket = None):
-        """Diffuser un message à tous les clients d'une session"""
+                task = asyncio.ensure_future(self.broker.unsubscribe(session_id))
+                self._unsubscribes.add(task)
+                task.add_done_callback(self._unsubscribes.discard)
+                playback_poller.unwatch(session_id)
+
+    async def is_participant(self, session_id: str, user_id: str) -> bool:
+        """Vérifier qu'un utilisateur fait partie d'une session active"""
+        async with AsyncSessionLocal() as db:
+            return await session_store.is_participant(db, session_id, user_id)
+
+    async def broadcast_to_session(self, session_id: str, message: dict, exclude_websocket: WebSocketConnection = None):
+        """Diffuser un message à tous les clients d'une session, sur tous les workers"""
+        exclude_id = exclude_websocket.id if exclude_websocket is not None else None
+        await self.broker.publish(session_id, message, exclude_id)
+
+    def deliver_local(self, session_id: str, message: dict, exclude_id: Optional[str] = None):
+        """Livrer un message aux sockets de ce worker"""
+        # Files de votes de ce worker tenues à jour, qu'il ait des sockets dans la room ou non
+        queue_engine.observe(session_id, message)
+
         if session_id not in self.active_connections:
             return
-        
-        disconnected_connections = []
-        
+
+        # Un seul encodage par protocole, quel que soit le nombre de clients
+        encoded: Dict[type, str] = {}
+        overflowed_connections = []
+
         for connection in self.active_connections[session_id]:
-            if connection != exclude_websocket:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except Exception:
-                    disconnected_connections.append(connection)
-        
-        for connection in disconnected_connections:
-            self.active_connections[session_id].remove(connection)
-    
-    async def handle_websocket_message(self, websocket: WebSocket, session_id: str, user_id: str, data: dict):
+            if connection.id == exclude_id:
+                continue
+
+            encoder = type(connection)
+            if encoder not in encoded:
+                encoded[encoder] = connection.encode(message)
+
+            if not connection.enqueue(encoded[encoder]):
+                overflowed_connections.append(connection)
+
+        for connection in overflowed_connections:
+            delivery_stats["slow_disconnects"] += 1
+            self.disconnect(connection, session_id, connection.user_id)
+            connection.drop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Rooms et sockets ouvertes sur ce worker, messages en attente d'envoi"""
+        connections: Dict[str, int] = {}
+        queued = 0
+        for room in self.active_connections.values():
+            for connection in room:
+                connections[connection.protocol] = connections.get(connection.protocol, 0) + 1
+                queued += connection.queue.qsize()
+        return {
+            "rooms": len(self.active_connections),
+            "connections": connections,
+            "queued_messages": queued,
+            **delivery_stats
+        }
+
+    async def broadcast_vote_results(self, session_id: str, results: dict, user_id: str = None, vote_type: str = None):
+        """Diffuser le nouveau compteur d'une track après un vote"""
+        await self.broadcast_to_session(
+            session_id,
+            {
+                "type": "vote_update",
+                "user_id": user_id,
+                "vote_type": vote_type,
+                **results
+            }
+        )
+
+    async def handle_websocket_message(self, websocket: WebSocketConnection, session_id: str, user_id: str, data: dict) -> Optional[dict]:
         """Traiter les messages WebSocket entrants"""
         message_type = data.get("type")
-        
+
         if message_type == "vote":
+            track_id = data.get("track_id")
+            vote_type = data.get("vote_type")
+            if not track_id or vote_type not in ("like", "dislike"):
+                return {"error": "Invalid vote"}
+
+            if not await self.is_participant(session_id, user_id):
+                return {"error": "User not in session"}
+
+            async with AsyncSessionLocal() as db:
+                voting_service = VotingService(db)
+                if not await voting_service.submit_vote(session_id, user_id, track_id, vote_type):
+                    return {"error": "Failed to submit vote"}
+
+                results = await voting_service.get_track_results(session_id, track_id)
+
+            # Mode tampon : diffusé après l'écriture du lot, avec sa nouvelle version
+            if not vote_buffer.enabled:
+                await self.broadcast_vote_results(session_id, results, user_id=user_id, vote_type=vote_type)
+            return results
+
+        elif message_type == "track_change":
+            track = data.get("track")
+
+            async with AsyncSessionLocal() as db:
+                if not await session_store.set_current_track(db, session_id, user_id, track):
+                    return {"error": "Only host can change track"}
+            # Position réelle relue tout de suite chez Spotify
+            playback_poller.poke(session_id)
+
             await self.broadcast_to_session(
                 session_id,
                 {
-                    "type": "vote_update",
-                    "user_id": user_id,
-                    "track_id": data.get("track_id"),
-                    "vote_type": data.get("vote_type")
-                },
-                exclude_websocket=websocket
+                    "type": "track_change",
+                    "track": track,
+                    "changed_by": user_id
+                }
             )
-        
-        elif message_type == "track_change":
+
+        elif message_type == "chat_message":
             await self.broadcast_to_session(
                 session_id,
                 {
-                    "type": "track_change",
-                    "track": data.get("track"),
-                    "changed_by": user_id
+                    "type": "chat_message",
+                    "user_id": user_id,
+                    "message": data.get("message"),
+                    "timestamp": data.get("timestamp")
                 }
             )
 
-websocket_manager = ConnectionManager()
\ No newline at end of file
+        return None
+
+websocket_manager = ConnectionManager(create_broker(settings.BROKER_URL, settings.BROKER_CHANNEL_PREFIX))
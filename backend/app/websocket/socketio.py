@@ -0,0 +1,215 @@
+"""Transport compatible Socket.IO (Engine.IO v4, transport websocket uniquement)
+
+Le client Flutter (socket_io_client) se connecte avec transports=['websocket'] :
+le long-polling n'est donc pas implémenté.
+
+Le token JWT arrive dans le payload d'auth du paquet CONNECT ({"token": ...}),
+à défaut dans ?token= ou l'en-tête Authorization. L'utilisateur est celui du
+token : un user_id envoyé par le client est ignoré.
+"""
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+from typing import Any, Optional, Tuple
+import asyncio
+import json
+import time
+
+from app.core.config import settings
+from app.core.security import authenticate_token, socket_token
+from app.websocket.manager import WebSocketConnection, websocket_manager
+
+# Paquets Engine.IO
+EIO_OPEN = "0"
+EIO_CLOSE = "1"
+EIO_PING = "2"
+EIO_PONG = "3"
+EIO_MESSAGE = "4"
+
+# Paquets Socket.IO (encapsulés dans un paquet Engine.IO "message")
+SIO_CONNECT = "0"
+SIO_DISCONNECT = "1"
+SIO_EVENT = "2"
+SIO_ACK = "3"
+SIO_CONNECT_ERROR = "4"
+
+DEFAULT_NAMESPACE = "/"
+
+def encode_packet(packet_type: str, data: Any = None, namespace: str = DEFAULT_NAMESPACE, ack_id: Optional[int] = None) -> str:
+    """Encoder un paquet Socket.IO prêt à être envoyé sur le websocket"""
+    packet = EIO_MESSAGE + packet_type
+    if namespace != DEFAULT_NAMESPACE:
+        packet += namespace + ","
+    if ack_id is not None:
+        packet += str(ack_id)
+    if data is not None:
+        packet += json.dumps(data, separators=(",", ":"))
+    return packet
+
+def decode_packet(payload: str) -> Tuple[str, str, Optional[int], Any]:
+    """Décoder un paquet Socket.IO : (type, namespace, ack_id, data)"""
+    packet_type, rest = payload[0], payload[1:]
+
+    namespace = DEFAULT_NAMESPACE
+    if rest.startswith("/"):
+        separator = rest.find(",")
+        if separator == -1:
+            namespace, rest = rest, ""
+        else:
+            namespace, rest = rest[:separator], rest[separator + 1:]
+
+    digits = 0
+    while digits < len(rest) and rest[digits].isdigit():
+        digits += 1
+    ack_id = int(rest[:digits]) if digits else None
+
+    data = json.loads(rest[digits:]) if rest[digits:] else None
+    return packet_type, namespace, ack_id, data
+
+class SocketIOConnection(WebSocketConnection):
+    """Connexion Socket.IO : chaque message est émis comme l'événement message["type"]"""
+    protocol = "socketio"
+
+    def __init__(self, websocket: WebSocket):
+        super().__init__(websocket)
+        self.sid = self.id
+        self.last_pong = time.monotonic()
+        # Utilisateur authentifié au CONNECT
+        self.authenticated_id: Optional[str] = None
+
+    @staticmethod
+    def encode(message: dict) -> str:
+        return encode_packet(SIO_EVENT, [message["type"], message])
+
+    async def send_packet(self, packet: str):
+        if self.writer is None:
+            await self.websocket.send_text(packet)
+        elif not self.enqueue(packet):
+            self.drop()
+
+async def _heartbeat(connection: SocketIOConnection):
+    """Envoyer les pings Engine.IO et fermer les connexions muettes"""
+    interval = settings.SOCKETIO_PING_INTERVAL_MS / 1000
+    timeout = settings.SOCKETIO_PING_TIMEOUT_MS / 1000
+
+    while True:
+        await asyncio.sleep(interval)
+        if time.monotonic() - connection.last_pong > interval + timeout:
+            connection.drop(code=1000)
+            return
+        await connection.send_packet(EIO_PING)
+
+async def _handle_event(connection: SocketIOConnection, event: str, payload: dict) -> Optional[dict]:
+    """Router un événement Socket.IO vers le ConnectionManager"""
+    user_id = connection.authenticated_id
+    if user_id is None:
+        return {"error": "Not authenticated"}
+
+    if event == "join_session":
+        session_id = payload.get("session_id")
+        if not session_id or not await websocket_manager.is_participant(session_id, user_id):
+            return {"error": "User not in session"}
+
+        await websocket_manager.join(connection, session_id, user_id)
+        return {"session_id": session_id}
+
+    if event == "leave_session":
+        await websocket_manager.leave(connection)
+        return None
+
+    if connection.session_id is None:
+        return {"error": "Not in a session"}
+
+    return await websocket_manager.handle_websocket_message(
+        connection,
+        connection.session_id,
+        connection.user_id,
+        {**payload, "type": event}
+    )
+
+async def socketio_endpoint(websocket: WebSocket):
+    """Point d'entrée /socket.io/ (EIO=4, transport=websocket)"""
+    if websocket.query_params.get("EIO") != "4" or websocket.query_params.get("transport") != "websocket":
+        await websocket.close(code=1003)
+        return
+
+    await websocket.accept()
+    connection = SocketIOConnection(websocket)
+
+    await connection.send_packet(EIO_OPEN + json.dumps({
+        "sid": connection.sid,
+        "upgrades": [],
+        "pingInterval": settings.SOCKETIO_PING_INTERVAL_MS,
+        "pingTimeout": settings.SOCKETIO_PING_TIMEOUT_MS,
+        "maxPayload": settings.SOCKETIO_MAX_PAYLOAD
+    }))
+
+    connection.start()
+    heartbeat = asyncio.create_task(_heartbeat(connection))
+
+    try:
+        while True:
+            message = await websocket.receive_text()
+            if len(message) > settings.SOCKETIO_MAX_PAYLOAD:
+                break
+
+            if message == EIO_PONG:
+                connection.last_pong = time.monotonic()
+                continue
+            if message == EIO_PING:
+                await connection.send_packet(EIO_PONG)
+                continue
+            if message == EIO_CLOSE:
+                break
+            if not message.startswith(EIO_MESSAGE) or len(message) < 2:
+                continue
+
+            try:
+                packet_type, namespace, ack_id, data = decode_packet(message[1:])
+            except ValueError:
+                continue
+
+            if namespace != DEFAULT_NAMESPACE:
+                await connection.send_packet(
+                    encode_packet(SIO_CONNECT_ERROR, {"message": "Invalid namespace"}, namespace=namespace)
+                )
+                continue
+
+            if packet_type == SIO_CONNECT:
+                token = data.get("token") if isinstance(data, dict) else None
+                user = await authenticate_token(token or socket_token(websocket))
+                if user is None:
+                    await connection.send_packet(encode_packet(SIO_CONNECT_ERROR, {"message": "Not authenticated"}))
+                    continue
+
+                connection.authenticated_id = user.id
+                await connection.send_packet(encode_packet(SIO_CONNECT, {"sid": connection.sid}))
+
+                # Le client peut fournir la session directement dans le payload d'auth
+                if isinstance(data, dict) and data.get("session_id"):
+                    await _handle_event(connection, "join_session", data)
+
+            elif packet_type == SIO_DISCONNECT:
+                break
+
+            elif packet_type == SIO_EVENT and isinstance(data, list) and data:
+                payload = data[1] if len(data) > 1 and isinstance(data[1], dict) else {}
+                result = await _handle_event(connection, str(data[0]), payload)
+
+                if ack_id is not None:
+                    await connection.send_packet(
+                        encode_packet(SIO_ACK, [result] if result is not None else [], ack_id=ack_id)
+                    )
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        heartbeat.cancel()
+        connection.stop()
+        await websocket_manager.leave(connection)
+        await connection.wait_closed()
+
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except Exception:
+                pass
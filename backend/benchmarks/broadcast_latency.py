@@ -0,0 +1,106 @@
+"""Latence de diffusion de ConnectionManager.broadcast_to_session
+
+Sockets simulées en mémoire (latence d'envoi réglable, un client lent par room)
+pour 10/100/1000 connexions par room. La boucle séquentielle d'origine
+(json.dumps + await send_text par connexion) sert de référence.
+
+    cd backend
+    python -m benchmarks.broadcast_latency --rounds 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.websocket.manager import ConnectionManager, WebSocketConnection
+
+class FakeWebSocket:
+    def __init__(self, delay: float, arrivals: list):
+        self.delay = delay
+        self.arrivals = arrivals
+
+    async def send_text(self, payload: str):
+        await asyncio.sleep(self.delay)
+        self.arrivals.append(time.perf_counter())
+
+    async def close(self, code: int = 1000):
+        pass
+
+async def legacy_broadcast(sockets, message: dict):
+    """Boucle d'origine : encodage et envoi séquentiels"""
+    for websocket in sockets:
+        await websocket.send_text(json.dumps(message))
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def measure(size: int, rounds: int, delay: float, slow_delay: float, legacy: bool) -> dict:
+    manager = ConnectionManager()
+    arrivals = []
+    # Le client lent est en tête de room : pire cas pour la boucle séquentielle
+    sockets = [FakeWebSocket(slow_delay, [])]
+    sockets.extend(FakeWebSocket(delay, arrivals) for _ in range(size - 1))
+
+    if not legacy:
+        for websocket in sockets:
+            connection = WebSocketConnection(websocket)
+            connection.session_id = "bench"
+            connection.start()
+            manager.active_connections.setdefault("bench", []).append(connection)
+
+    message = {"type": "vote_update", "track_id": "t" * 22, "likes": 12, "dislikes": 3, "total_votes": 15, "version": 42}
+    latencies = []
+    call_times = []
+
+    for _ in range(rounds):
+        arrivals.clear()
+        started = time.perf_counter()
+        if legacy:
+            await legacy_broadcast(sockets, message)
+        else:
+            await manager.broadcast_to_session("bench", message)
+        call_times.append(time.perf_counter() - started)
+
+        # Attendre que tous les clients rapides aient reçu le message
+        while len(arrivals) < size - 1:
+            await asyncio.sleep(0)
+        latencies.append(max(arrivals) - started)
+
+    writers = []
+    for connections in manager.active_connections.values():
+        for connection in connections:
+            connection.stop()
+            writers.append(connection.writer)
+    await asyncio.gather(*writers, return_exceptions=True)
+
+    return {
+        "sockets": size,
+        "mode": "legacy" if legacy else "queued",
+        "broadcast_call_ms_p50": round(statistics.median(call_times) * 1000, 3),
+        "fast_clients_delivered_ms_p50": round(statistics.median(latencies) * 1000, 3),
+        "fast_clients_delivered_ms_p99": round(_percentile(latencies, 0.99) * 1000, 3)
+    }
+
+async def run(args) -> list:
+    results = []
+    for size in args.sizes:
+        results.append(await measure(size, args.rounds, args.delay, args.slow_delay, legacy=False))
+        if not args.skip_legacy:
+            results.append(await measure(size, min(args.rounds, 3), args.delay, args.slow_delay, legacy=True))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.0005, help="latence d'envoi d'un client normal (s)")
+    parser.add_argument("--slow-delay", type=float, default=0.2, help="latence d'envoi du client lent (s)")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
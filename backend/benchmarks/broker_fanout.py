@@ -0,0 +1,109 @@
+"""Latence ajoutée par le broker Redis entre deux workers
+
+Deux ConnectionManager (deux "workers") partagent un serveur Redis : les
+sockets sont sur le worker B, les messages sont publiés par le worker A.
+Sans --redis-url, un serveur fakeredis en mémoire sert de stand-in.
+
+    cd backend
+    python -m benchmarks.broker_fanout --messages 500
+    python -m benchmarks.broker_fanout --redis-url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.websocket.broker import InMemoryBroker, RedisBroker
+from app.websocket.manager import ConnectionManager, WebSocketConnection
+
+class FakeWebSocket:
+    def __init__(self, arrivals: asyncio.Queue):
+        self.arrivals = arrivals
+
+    async def send_text(self, payload: str):
+        self.arrivals.put_nowait(time.perf_counter())
+
+    async def close(self, code: int = 1000):
+        pass
+
+def _redis_client(url: str, server):
+    if url:
+        import redis.asyncio as redis
+        return redis.from_url(url)
+
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(server=server)
+
+async def measure(publisher: ConnectionManager, receiver: ConnectionManager, messages: int, sockets: int) -> list:
+    arrivals: asyncio.Queue = asyncio.Queue()
+    connections = []
+    for _ in range(sockets):
+        connection = WebSocketConnection(FakeWebSocket(arrivals))
+        connection.start()
+        await receiver.join(connection, "bench", "bench-user")
+        connections.append(connection)
+
+    # Laisser l'abonnement s'établir et vider les user_joined
+    await asyncio.sleep(0.2)
+    while not arrivals.empty():
+        arrivals.get_nowait()
+
+    latencies = []
+    for index in range(messages):
+        sent_at = time.perf_counter()
+        await publisher.broadcast_to_session("bench", {"type": "vote_update", "track_id": "t", "version": index})
+        last = None
+        for _ in range(sockets):
+            last = await asyncio.wait_for(arrivals.get(), timeout=5)
+        latencies.append(last - sent_at)
+
+    for connection in connections:
+        connection.stop()
+        receiver.disconnect(connection, "bench", "bench-user")
+    return latencies
+
+def _summary(name: str, latencies: list) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "broker": name,
+        "messages": len(ordered),
+        "latency_ms_p50": round(statistics.median(ordered) * 1000, 3),
+        "latency_ms_p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 3),
+        "latency_ms_max": round(ordered[-1] * 1000, 3)
+    }
+
+async def run(args) -> list:
+    local = ConnectionManager(InMemoryBroker())
+    await local.start()
+    results = [_summary("in-memory (same worker)", await measure(local, local, args.messages, args.sockets))]
+
+    server = None
+    if not args.redis_url:
+        import fakeredis
+        server = fakeredis.FakeServer()
+
+    worker_a = ConnectionManager(RedisBroker(client=_redis_client(args.redis_url, server), prefix="bench"))
+    worker_b = ConnectionManager(RedisBroker(client=_redis_client(args.redis_url, server), prefix="bench"))
+    await worker_a.start()
+    await worker_b.start()
+    try:
+        name = "redis" if args.redis_url else "fakeredis"
+        results.append(_summary(f"{name} (cross-worker)", await measure(worker_a, worker_b, args.messages, args.sockets)))
+    finally:
+        await worker_a.stop()
+        await worker_b.stop()
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--sockets", type=int, default=50, help="sockets dans la room sur le worker B")
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
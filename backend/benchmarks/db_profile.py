@@ -0,0 +1,148 @@
+"""Débit lecture/écriture mixte selon le profil du moteur SQLite
+
+Chaque profil part d'une base SQLite temporaire neuve. Des workers
+concurrents enchaînent pendant une durée fixe des lectures (participation +
+résultats de la session, comme l'écran de vote) et des votes, chacun dans sa
+propre session comme une requête HTTP.
+
+Profils :
+  legacy  journal par défaut (DELETE), synchronous=FULL, pool unique de 5
+  pragmas profil SQLite (WAL, synchronous=NORMAL, mmap, cache), pool unique
+  split   profil SQLite + pool d'écriture et pool de lecture séparés
+
+    cd backend
+    python -m benchmarks.db_profile --workers 32 --seconds 5 --write-ratio 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.models.session import Base as SessionBase, Session as PartySession, SessionParticipant
+from app.models.user import Base as UserBase
+from app.models.vote import Base as VoteBase
+from app.services.session_service import SessionService
+from app.services.vote_buffer import vote_buffer
+from app.services.voting_service import VotingService
+from app.utils.helpers import apply_pragmas, create_async_engines, pool_options, routing_sessionmaker, sqlite_pragmas
+
+PROFILES = ("legacy", "pragmas", "split")
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def _create_schema(path: str, participants: int) -> str:
+    engine = create_engine(f"sqlite:///{path}")
+    for base in (UserBase, SessionBase, VoteBase):
+        base.metadata.create_all(bind=engine)
+
+    with engine.begin() as connection:
+        session_id = "bench-session"
+        connection.execute(PartySession.__table__.insert().values(
+            id=session_id, code="BENCH1", host_id="user0", name="bench", playlist_ids=[], is_active=True
+        ))
+        connection.execute(SessionParticipant.__table__.insert(), [
+            {"session_id": session_id, "user_id": f"user{index}"} for index in range(participants)
+        ])
+    engine.dispose()
+    return session_id
+
+def _make_engines(profile: str, url: str):
+    if profile == "legacy":
+        # Configuration précédente : pas de PRAGMA, un pool de 5 connexions
+        engine = create_async_engine(
+            url, poolclass=AsyncAdaptedQueuePool, pool_size=5, max_overflow=0, connect_args={"timeout": 30}
+        )
+        return engine, engine
+    if profile == "pragmas":
+        engine = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, **pool_options(5, 0))
+        return apply_pragmas(engine, sqlite_pragmas()), engine
+    return create_async_engines(url)
+
+async def measure(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        session_id = _create_schema(path, args.participants)
+        write_engine, read_engine = _make_engines(profile, f"sqlite+aiosqlite:///{path}")
+        SessionLocal = routing_sessionmaker(write_engine, read_engine)
+
+        latencies = {"read": [], "write": []}
+        errors = {"read": 0, "write": 0}
+        deadline = time.perf_counter() + args.seconds
+
+        async def worker(seed: int):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                kind = "write" if rng.random() < args.write_ratio else "read"
+                user_id = f"user{rng.randrange(args.participants)}"
+                started = time.perf_counter()
+                try:
+                    async with SessionLocal() as db:
+                        if kind == "write":
+                            vote = await VotingService(db).submit_vote(
+                                session_id, user_id, f"track{rng.randrange(args.tracks)}", rng.choice(("like", "dislike"))
+                            )
+                            if vote is None:
+                                errors[kind] += 1
+                                continue
+                        else:
+                            await SessionService(db).is_participant(session_id, user_id)
+                            await VotingService(db).get_all_results(session_id)
+                except Exception:
+                    errors[kind] += 1
+                    continue
+                latencies[kind].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(seed) for seed in range(args.workers)))
+        elapsed = time.perf_counter() - started
+
+        await write_engine.dispose()
+        if read_engine is not write_engine:
+            await read_engine.dispose()
+
+    result = {"profile": profile, "seconds": round(elapsed, 2)}
+    for kind, values in latencies.items():
+        result[kind] = {
+            "ops": len(values),
+            "ops_per_second": round(len(values) / elapsed, 1),
+            "errors": errors[kind],
+            "p50_ms": round(statistics.median(values) * 1000, 2) if values else None,
+            "p99_ms": round(_percentile(values, 0.99) * 1000, 2) if values else None
+        }
+    return result
+
+async def run(args) -> dict:
+    # Votes écrits directement : c'est le moteur qui est mesuré, pas le tampon
+    vote_buffer.enabled = False
+    return {
+        "workers": args.workers,
+        "write_ratio": args.write_ratio,
+        "split_pools": {"write": settings.DB_WRITE_POOL_SIZE, "read": settings.DB_READ_POOL_SIZE},
+        "profiles": [await measure(profile, args) for profile in args.profiles]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--participants", type=int, default=200)
+    parser.add_argument("--tracks", type=int, default=100)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
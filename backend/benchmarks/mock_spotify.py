@@ -0,0 +1,238 @@
+"""Serveur Spotify simulé (API Web + accounts) pour les tests et benchmarks locaux
+
+Données déterministes, latence réglable et injection de 429 avec Retry-After.
+Pointer l'application dessus avec :
+
+    SPOTIFY_API_BASE_URL=http://127.0.0.1:<port>/v1
+    SPOTIFY_ACCOUNTS_BASE_URL=http://127.0.0.1:<port>
+
+    cd backend
+    python -m benchmarks.mock_spotify --port 9000
+"""
+from collections import Counter
+from typing import Optional
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import JSONResponse
+import httpx
+import uvicorn
+
+class MockState:
+    def __init__(self, playlists: int = 5, tracks_per_playlist: int = 400, latency_ms: float = 0.0):
+        self.playlists = playlists
+        self.tracks_per_playlist = tracks_per_playlist
+        self.latency_ms = latency_ms
+        # Une requête sur N reçoit un 429 (0 = jamais)
+        self.rate_limit_every = 0
+        self.retry_after = 1
+        self.snapshot_generation = 0
+        self.requests = Counter()
+        self.started_at = time.monotonic()
+
+    def track(self, index: int) -> dict:
+        track_id = f"tr{index:06d}"
+        return {
+            "id": track_id,
+            "name": f"Track {index}",
+            "uri": f"spotify:track:{track_id}",
+            "duration_ms": 150000 + (index % 120) * 1000,
+            "preview_url": None,
+            "is_playable": True,
+            "artists": [{"id": f"ar{index % 50}", "name": f"Artist {index % 50}"}],
+            "album": {
+                "id": f"al{index % 200}",
+                "name": f"Album {index % 200}",
+                "images": [{"url": f"https://i.scdn.co/image/al{index % 200}", "width": 640, "height": 640}]
+            }
+        }
+
+    def playlist_track_index(self, playlist: int, position: int) -> int:
+        # Les playlists se chevauchent d'un quart pour exercer la déduplication
+        return playlist * (self.tracks_per_playlist * 3 // 4) + position
+
+    def playlist(self, index: int) -> dict:
+        return {
+            "id": f"pl{index}",
+            "name": f"Playlist {index}",
+            "snapshot_id": f"snap-{index}-{self.snapshot_generation}",
+            "images": [],
+            "owner": {"id": "mock-user", "display_name": "Mock User"},
+            "tracks": {"total": self.tracks_per_playlist}
+        }
+
+def create_app(state: MockState) -> FastAPI:
+    app = FastAPI(title="Mock Spotify")
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        if request.url.path.startswith("/mock/"):
+            return await call_next(request)
+
+        state.requests[request.url.path] += 1
+        total = sum(state.requests.values())
+        if state.latency_ms:
+            await asyncio.sleep(state.latency_ms / 1000)
+        if state.rate_limit_every and total % state.rate_limit_every == 0:
+            return JSONResponse(
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                status_code=429,
+                headers={"Retry-After": str(state.retry_after)}
+            )
+        return await call_next(request)
+
+    @app.post("/api/token")
+    async def token(grant_type: str = Form(...), code: Optional[str] = Form(None), refresh_token: Optional[str] = Form(None)):
+        suffix = code or refresh_token or "anonymous"
+        payload = {
+            "access_token": f"mock-access-{suffix}-{time.monotonic_ns()}",
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "scope": "user-read-private user-read-playback-state"
+        }
+        if grant_type == "authorization_code":
+            payload["refresh_token"] = f"mock-refresh-{suffix}"
+        return payload
+
+    @app.get("/v1/me")
+    async def me(request: Request):
+        token = request.headers.get("Authorization", "").split(" ")[-1]
+        user_id = token.split("-")[2] if token.startswith("mock-access-") else "mock-user"
+        return {"id": f"spotify-{user_id}", "display_name": f"Mock {user_id}", "email": f"{user_id}@example.com"}
+
+    @app.get("/v1/me/playlists")
+    async def my_playlists(limit: int = 50, offset: int = 0):
+        items = [state.playlist(index) for index in range(state.playlists)][offset:offset + limit]
+        return {"items": items, "total": state.playlists, "limit": limit, "offset": offset, "next": None}
+
+    @app.get("/v1/playlists/{playlist_id}")
+    async def playlist(playlist_id: str):
+        return state.playlist(int(playlist_id[2:]))
+
+    @app.get("/v1/playlists/{playlist_id}/tracks")
+    async def playlist_tracks(playlist_id: str, limit: int = 100, offset: int = 0):
+        index = int(playlist_id[2:])
+        limit = min(limit, 100)
+        end = min(offset + limit, state.tracks_per_playlist)
+        items = [{"track": state.track(state.playlist_track_index(index, position))} for position in range(offset, end)]
+        next_url = None
+        if end < state.tracks_per_playlist:
+            next_url = f"/v1/playlists/{playlist_id}/tracks?offset={end}&limit={limit}"
+        return {"items": items, "total": state.tracks_per_playlist, "limit": limit, "offset": offset, "next": next_url}
+
+    @app.get("/v1/tracks/{track_id}")
+    async def track(track_id: str):
+        return state.track(int(track_id[2:]))
+
+    @app.get("/v1/tracks")
+    async def tracks(ids: str):
+        requested = ids.split(",")
+        if len(requested) > 50:
+            return JSONResponse({"error": {"status": 400, "message": "Too many ids requested"}}, status_code=400)
+        return {"tracks": [state.track(int(track_id[2:])) for track_id in requested]}
+
+    @app.get("/v1/search")
+    async def search(q: str, type: str = "track", limit: int = 20):
+        base = sum(ord(char) for char in q.lower()) % 1000
+        items = [state.track(base + index) for index in range(min(limit, 50))]
+        return {"tracks": {"items": items, "total": len(items)}}
+
+    @app.get("/v1/me/player")
+    async def player():
+        # Une track de 3 minutes en boucle depuis le démarrage du serveur
+        elapsed_ms = int((time.monotonic() - state.started_at) * 1000)
+        duration = 180000
+        current = state.track(elapsed_ms // duration)
+        current["duration_ms"] = duration
+        return {
+            "is_playing": True,
+            "progress_ms": elapsed_ms % duration,
+            "timestamp": int(time.time() * 1000),
+            "item": current
+        }
+
+    @app.get("/mock/stats")
+    async def stats():
+        return {"requests": dict(state.requests), "total": sum(state.requests.values())}
+
+    @app.post("/mock/config")
+    async def configure(request: Request):
+        config = await request.json()
+        for key in ("rate_limit_every", "retry_after", "latency_ms", "snapshot_generation"):
+            if key in config:
+                setattr(state, key, config[key])
+        if config.get("reset_stats"):
+            state.requests.clear()
+        return {"ok": True}
+
+    return app
+
+class MockSpotifyServer:
+    """Serveur simulé lancé dans un process séparé (pour ne pas partager le GIL)"""
+
+    def __init__(self, playlists: int = 5, tracks_per_playlist: int = 400, latency_ms: float = 0.0, port: int = 0):
+        if not port:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+        self.port = port
+        self.args = [
+            "--port", str(port),
+            "--playlists", str(playlists),
+            "--tracks-per-playlist", str(tracks_per_playlist),
+            "--latency-ms", str(latency_ms)
+        ]
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def accounts_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def api_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def configure(self, **config) -> None:
+        httpx.post(f"{self.accounts_url}/mock/config", json=config).raise_for_status()
+
+    def stats(self) -> dict:
+        return httpx.get(f"{self.accounts_url}/mock/stats").json()
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.mock_spotify", *self.args],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            try:
+                self.stats()
+                return self
+            except httpx.HTTPError:
+                time.sleep(0.05)
+        self.process.terminate()
+        raise RuntimeError("mock Spotify server did not start")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--playlists", type=int, default=5)
+    parser.add_argument("--tracks-per-playlist", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    state = MockState(args.playlists, args.tracks_per_playlist, args.latency_ms)
+    uvicorn.run(create_app(state), port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Allocation des codes de session jusqu'à 90 % de l'espace de codes
+
+Espace réduit (longueur --length, 31^3 = 29 791 codes par défaut) pour
+pouvoir le remplir. Base SQLite temporaire : chaque session est créée par
+une seule insertion avec un code de l'allocateur, jusqu'à --fill de
+l'espace. Une partie des sessions est ensuite fermée et leurs codes
+recyclés. Compte les échecs d'insertion (contrainte d'unicité) et les
+codes en double, et mesure reserve() par tranche de remplissage.
+
+Code de sortie 1 si une collision est observée.
+
+    cd backend
+    python -m benchmarks.session_codes --length 3 --fill 0.9
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models.session import Base as SessionBase, Session as PartySession
+from app.services.code_allocator import CodeAllocator
+from app.services.session_service import SessionService
+
+def _create_schema(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    SessionBase.metadata.create_all(bind=engine)
+    engine.dispose()
+
+async def run(args) -> dict:
+    allocator = CodeAllocator(length=args.length, pool_size=args.pool_size, recycle_after_seconds=0)
+    allocator.load([])
+    target = int(allocator.capacity * args.fill)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "codes.db")
+        _create_schema(path)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_synchronous(connection, _):
+            # Durabilité hors sujet ici : seules les collisions sont comptées
+            cursor = connection.cursor()
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.close()
+        SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+        failed_inserts = 0
+        reserve_us = {}
+        sessions = []
+        started = time.perf_counter()
+        async with SessionLocal() as db:
+            service = SessionService(db)
+            for index in range(target):
+                reserve_started = time.perf_counter()
+                code = allocator.reserve()
+                decile = int(index / allocator.capacity * 10) * 10
+                reserve_us.setdefault(decile, []).append((time.perf_counter() - reserve_started) * 1e6)
+
+                session = await service.create_session(host_id=f"host{index}", code=code, name="bench", playlist_ids=[])
+                if session is None:
+                    failed_inserts += 1
+                    allocator.discard(code)
+                else:
+                    sessions.append(session)
+        fill_seconds = time.perf_counter() - started
+
+        # Fermer une session sur quatre, puis en recréer autant avec les codes libérés
+        closed = sessions[::4]
+        async with SessionLocal() as db:
+            service = SessionService(db)
+            for session in closed:
+                await service.close_session(session.id, session.host_id)
+                allocator.release(session.code)
+
+            for index in range(len(closed)):
+                code = allocator.reserve()
+                if await service.create_session(host_id=f"again{index}", code=code, name="bench", playlist_ids=[]) is None:
+                    failed_inserts += 1
+                    allocator.discard(code)
+
+            active = PartySession.is_active == True
+            active_rows = await db.scalar(select(func.count()).select_from(PartySession).where(active))
+            distinct_codes = await db.scalar(select(func.count(func.distinct(PartySession.code))).where(active))
+
+        await engine.dispose()
+
+    return {
+        "capacity": allocator.capacity,
+        "filled": target,
+        "fill_ratio": round(target / allocator.capacity, 3),
+        "failed_inserts": failed_inserts,
+        "duplicate_active_codes": active_rows - distinct_codes,
+        "closed_and_recreated": len(closed),
+        "fill_seconds": round(fill_seconds, 2),
+        "reserve_us_by_fill_percent": {
+            decile: {"p50": round(statistics.median(values), 2), "max": round(max(values), 2)}
+            for decile, values in sorted(reserve_us.items())
+        },
+        "allocator": allocator.get_stats()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--length", type=int, default=3)
+    parser.add_argument("--fill", type=float, default=0.9)
+    parser.add_argument("--pool-size", type=int, default=256)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if result["failed_inserts"] or result["duplicate_active_codes"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
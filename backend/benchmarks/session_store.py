@@ -0,0 +1,90 @@
+"""Lectures du chemin chaud : store en mémoire vs requêtes SQL
+
+Base SQLite temporaire, une session active avec N participants. Mesure la
+latence moyenne de get_session (détails + participants), de la résolution
+d'un code de jointure et de la vérification de participation, d'abord via
+SessionService (une requête par lecture), puis via ActiveSessionStore.
+
+    cd backend
+    python -m benchmarks.session_store --participants 200 --lookups 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models.session import Base as SessionBase, Session as PartySession, SessionParticipant
+from app.services.session_service import SessionService
+from app.services.session_store import ActiveSessionStore
+
+def _create_schema(path: str, participants: int):
+    engine = create_engine(f"sqlite:///{path}")
+    SessionBase.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(PartySession.__table__.insert().values(
+            id="bench-session", code="BENCH1", host_id="user0", name="bench",
+            playlist_ids=[f"playlist{index}" for index in range(10)], track_queue=[], is_active=True
+        ))
+        connection.execute(SessionParticipant.__table__.insert(), [
+            {"session_id": "bench-session", "user_id": f"user{index}"} for index in range(participants)
+        ])
+    engine.dispose()
+
+async def _time(lookups: int, call) -> float:
+    started = time.perf_counter()
+    for index in range(lookups):
+        await call(index)
+    return round((time.perf_counter() - started) / lookups * 1e6, 2)
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        _create_schema(path, args.participants)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        store = ActiveSessionStore()
+
+        async with SessionLocal() as db:
+            service = SessionService(db)
+            database = {
+                "get_session_us": await _time(args.lookups, lambda _: service.get_session_with_participants("bench-session")),
+                "get_by_code_us": await _time(args.lookups, lambda _: service.get_session_by_code("BENCH1")),
+                "is_participant_us": await _time(
+                    args.lookups, lambda index: service.is_participant("bench-session", f"user{index % args.participants}")
+                )
+            }
+
+            # Premier accès : chargement depuis la base, ensuite tout est en mémoire
+            await store.get(db, "bench-session")
+            memory = {
+                "get_session_us": await _time(args.lookups, lambda _: store.get(db, "bench-session")),
+                "get_by_code_us": await _time(args.lookups, lambda _: store.get_by_code(db, "BENCH1")),
+                "is_participant_us": await _time(
+                    args.lookups, lambda index: store.is_participant(db, "bench-session", f"user{index % args.participants}")
+                )
+            }
+
+        await engine.dispose()
+
+    return {
+        "participants": args.participants,
+        "lookups": args.lookups,
+        "session_service": database,
+        "active_session_store": memory
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
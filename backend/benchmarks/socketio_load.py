@@ -0,0 +1,213 @@
+"""Test de charge : nombre de sockets Socket.IO tenues par un seul worker uvicorn
+
+    cd backend
+    python -m benchmarks.socketio_load --sockets 2000 --room-size 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+import websockets
+from sqlalchemy import create_engine, select
+
+from app.core.security import create_access_token
+from app.models.user import User
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = min(hard, max(soft, needed))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def start_server(database_url: str, port: int) -> subprocess.Popen:
+    """Lancer app.main:app sur un seul worker uvicorn avec une base temporaire"""
+    env = {**os.environ, "DATABASE_URL": database_url}
+    subprocess.run([sys.executable, "init_db.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+    server = subprocess.Popen(
+        # Keep-alive long : les connexions du client restent valides entre deux vagues
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", "1", "--log-level", "warning",
+         "--timeout-keep-alive", "120"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+def create_users(database_url: str, user_ids: List[str]) -> Dict[str, str]:
+    """Créer les utilisateurs de test et leur JWT (les routes exigent un token Bearer)"""
+    engine = create_engine(database_url)
+    table = User.__table__
+    with engine.begin() as connection:
+        existing = set(connection.execute(select(table.c.id).where(table.c.id.in_(user_ids))).scalars())
+        rows = [
+            {"id": user_id, "spotify_id": f"bench-{user_id}", "display_name": user_id}
+            for user_id in user_ids if user_id not in existing
+        ]
+        if rows:
+            connection.execute(table.insert(), rows)
+    engine.dispose()
+    return {user_id: create_access_token(data={"sub": user_id}) for user_id in user_ids}
+
+def bearer(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+class Client:
+    """Client Socket.IO minimal : handshake, join_session et réponse aux pings"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.ws = None
+        self.received = asyncio.Queue()
+        self.reader = None
+
+    async def connect(self, session_id: str, token: str):
+        self.ws = await websockets.connect(self.url, max_queue=None, ping_interval=None)
+        await self.ws.recv()
+        await self.ws.send("40" + json.dumps({"token": token}))
+        await self.ws.recv()
+        await self.ws.send("421" + json.dumps(["join_session", {"session_id": session_id}]))
+        while not (await self.ws.recv()).startswith("431"):
+            pass
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                if message == "2":
+                    await self.ws.send("3")
+                elif message.startswith("42"):
+                    self.received.put_nowait((time.perf_counter(), message))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def wait_for(self, marker: str) -> float:
+        while True:
+            received_at, message = await self.received.get()
+            if marker in message:
+                return received_at
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        await self.ws.close()
+
+async def run(args) -> dict:
+    port = _free_port()
+    tmp = tempfile.mkdtemp()
+    database_url = f"sqlite:///{tmp}/load.db"
+    server = start_server(database_url, port)
+
+    try:
+        http = httpx.Client(base_url=f"http://127.0.0.1:{port}")
+        room_count = (args.sockets + args.room_size - 1) // args.room_size
+        tokens = create_users(database_url, [f"load-host-{index}" for index in range(room_count)])
+        rooms = []
+        for index in range(room_count):
+            host_id = f"load-host-{index}"
+            session = http.post("/api/sessions/create", headers=bearer(tokens[host_id]), json={"playlist_ids": []}).json()
+            rooms.append((session["id"], host_id))
+
+        url = f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket"
+        clients = []
+        semaphore = asyncio.Semaphore(args.concurrency)
+        rss_before = _rss_mb(server.pid)
+
+        async def open_client(index: int):
+            session_id, host_id = rooms[index // args.room_size]
+            client = Client(url)
+            async with semaphore:
+                await client.connect(session_id, tokens[host_id])
+            clients.append((session_id, client))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(open_client(index) for index in range(args.sockets)))
+        connect_seconds = time.perf_counter() - started
+
+        # Vider les notifications user_joined accumulées pendant la montée en charge
+        await asyncio.sleep(1)
+        for _, client in clients:
+            while not client.received.empty():
+                client.received.get_nowait()
+
+        await asyncio.sleep(args.hold)
+        alive = sum(1 for _, client in clients if client.ws.state == websockets.State.OPEN)
+
+        # Un message par room, mesuré jusqu'à réception par tous les membres
+        by_room = {}
+        for session_id, client in clients:
+            by_room.setdefault(session_id, []).append(client)
+
+        latencies = []
+        for session_id, members in by_room.items():
+            marker = f"load-{session_id}"
+            sent_at = time.perf_counter()
+            await members[0].ws.send("42" + json.dumps(["chat_message", {"message": marker}]))
+            received = await asyncio.wait_for(
+                asyncio.gather(*(member.wait_for(marker) for member in members)),
+                timeout=30
+            )
+            latencies.append(max(received) - sent_at)
+
+        rss_after = _rss_mb(server.pid)
+        await asyncio.gather(*(client.close() for _, client in clients))
+
+        latencies.sort()
+        return {
+            "sockets": args.sockets,
+            "room_size": args.room_size,
+            "rooms": len(rooms),
+            "alive_after_hold": alive,
+            "connect_seconds": round(connect_seconds, 3),
+            "server_rss_mb_before": round(rss_before, 1),
+            "server_rss_mb_after": round(rss_after, 1),
+            "room_fanout_ms_p50": round(latencies[len(latencies) // 2] * 1000, 2),
+            "room_fanout_ms_max": round(latencies[-1] * 1000, 2)
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=2000)
+    parser.add_argument("--room-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=200, help="handshakes simultanés")
+    parser.add_argument("--hold", type=float, default=5.0, help="secondes de maintien avant mesure")
+    args = parser.parse_args()
+
+    _raise_fd_limit(args.sockets * 2 + 256)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
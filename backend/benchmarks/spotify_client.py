@@ -0,0 +1,83 @@
+"""SpotifyClient contre le serveur Spotify simulé
+
+Mesure le débit du pool partagé, le retard de la boucle d'événements pendant
+les appels, et le comportement retry/Retry-After sous 429 injectés.
+
+    cd backend
+    python -m benchmarks.spotify_client --requests 500 --latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.spotify_client import SpotifyClient
+from benchmarks.mock_spotify import MockSpotifyServer
+
+async def _loop_lag(stop: asyncio.Event, samples: list):
+    """Retard maximal de la boucle d'événements (sync bloquant = gros retard)"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        samples.append(time.perf_counter() - started - 0.005)
+
+async def scenario(client: SpotifyClient, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def call(index: int):
+        nonlocal failures
+        async with semaphore:
+            try:
+                await client.get(f"/tracks/tr{index:06d}", "mock-access-bench")
+            except Exception:
+                failures += 1
+
+    stop = asyncio.Event()
+    lag = []
+    monitor = asyncio.create_task(_loop_lag(stop, lag))
+    started = time.perf_counter()
+    await asyncio.gather(*(call(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    return {
+        "requests": requests,
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "event_loop_lag_ms_max": round(max(lag, default=0) * 1000, 3)
+    }
+
+async def run(args) -> dict:
+    with MockSpotifyServer(latency_ms=args.latency_ms) as mock:
+        client = SpotifyClient(api_base_url=mock.api_url, accounts_base_url=mock.accounts_url)
+        try:
+            # Création du pool (contexte SSL) hors mesure
+            await client.get("/me", "mock-access-bench")
+            results = {"pooled": await scenario(client, args.requests, args.concurrency)}
+
+            mock.configure(rate_limit_every=5, retry_after=0)
+            client.stats.update(requests=0, retries=0, rate_limited=0, errors=0)
+            results["rate_limited"] = await scenario(client, args.requests, args.concurrency)
+            results["rate_limited"]["client_stats"] = dict(client.stats)
+
+            token = await client.refresh_access_token("bench-refresh")
+            results["token_refresh_ok"] = "access_token" in token
+        finally:
+            await client.aclose()
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Suite de benchmarks reproductible des parcours d'une soirée
+
+app.main:app tourne dans le process (lifespan compris) sur une base SQLite
+temporaire, avec le serveur Spotify simulé (benchmarks.mock_spotify) dans
+un process à part. Scénarios, dans l'ordre :
+
+- create_join : H hôtes créent leur session en même temps, puis G invités
+  rejoignent par code ;
+- vote_storm : N utilisateurs votent chacun pour M tracks ;
+- results_polling : P clients relisent les résultats R fois ;
+- ws_fanout : S sockets en mémoire dans la room, V votes diffusés, mesurés
+  jusqu'à réception par la dernière socket ;
+- playlist_aggregation : tracks fusionnées des playlists de la session, à
+  froid (cache vidé) puis à chaud.
+
+Chaque mesure donne le débit et p50/p95/p99 en JSON. --compare relit un
+résultat précédent (autre commit) et sort en erreur si un p95 ou un débit
+régresse de plus de --tolerance.
+
+    cd backend
+    python -m benchmarks.suite --out bench.json
+    python -m benchmarks.suite --scenarios vote_storm,ws_fanout --compare bench.json
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.mock_spotify import MockSpotifyServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["create_join", "vote_storm", "results_polling", "ws_fanout", "playlist_aggregation"]
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict[str, Any]:
+    """Débit et percentiles d'une mesure (latences en secondes)"""
+    if not latencies:
+        return {"requests": 0, "errors": errors, "seconds": round(seconds, 3)}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 1) if seconds > 0 else None,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2)
+    }
+
+async def storm(calls: List[Callable[[], Any]], concurrency: int) -> Dict[str, Any]:
+    """Lancer des requêtes avec au plus `concurrency` en vol ; erreur = statut HTTP >= 400"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def run(call):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await call()
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(call) for call in calls))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+class Party:
+    """Utilisateurs et sessions créés pendant la suite"""
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self.tokens: Dict[str, str] = {}
+        self.session: Optional[dict] = None
+
+    async def users(self, user_ids: List[str]) -> List[str]:
+        from benchmarks.socketio_load import create_users
+        # Hors de la boucle : une écriture synchrone bloquerait le flush en cours de l'application
+        self.tokens.update(await asyncio.to_thread(create_users, self.database_url, user_ids))
+        return user_ids
+
+    def auth(self, user_id: str) -> Dict[str, str]:
+        from benchmarks.socketio_load import bearer
+        return bearer(self.tokens[user_id])
+
+# ===== Scénarios =====
+
+async def create_join(client: httpx.AsyncClient, party: Party, args) -> Dict[str, Any]:
+    hosts = await party.users([f"host{index}" for index in range(args.hosts)])
+    guests = await party.users([f"guest{index}" for index in range(args.guests)])
+    sessions = {}
+
+    async def create(host_id: str):
+        response = await client.post("/api/sessions/create", headers=party.auth(host_id), json={"name": "bench", "playlist_ids": []})
+        if response.status_code == 200:
+            sessions[host_id] = response.json()
+        return response
+
+    created = await storm([lambda host_id=host_id: create(host_id) for host_id in hosts], args.concurrency)
+    codes = [session["code"] for session in sessions.values()]
+    joined = await storm([
+        lambda guest_id=guest_id, index=index: client.post(
+            "/api/sessions/join", headers=party.auth(guest_id), json={"code": codes[index % len(codes)]})
+        for index, guest_id in enumerate(guests)
+    ], args.concurrency)
+    return {"create": created, "join": joined}
+
+async def vote_storm(client: httpx.AsyncClient, party: Party, args) -> Dict[str, Any]:
+    host_id = (await party.users(["party-host"]))[0]
+    response = await client.post("/api/sessions/create", headers=party.auth(host_id), json={
+        "name": "bench", "playlist_ids": [f"pl{index}" for index in range(args.playlists)]
+    })
+    party.session = response.json()
+    session_id, code = party.session["id"], party.session["code"]
+
+    voters = await party.users([f"voter{index}" for index in range(args.voters)])
+    await storm([
+        lambda user_id=user_id: client.post("/api/sessions/join", headers=party.auth(user_id), json={"code": code})
+        for user_id in voters
+    ], args.concurrency)
+
+    calls = [
+        lambda user_id=user_id, track=track: client.post(
+            f"/api/votes/{session_id}/vote", headers=party.auth(user_id), json={
+                "session_id": session_id,
+                "track_id": f"tr{track:06d}",
+                "vote_type": "like" if (track + index) % 3 else "dislike"
+            })
+        for index, user_id in enumerate(voters)
+        for track in range(args.tracks)
+    ]
+    return await storm(calls, args.concurrency)
+
+async def results_polling(client: httpx.AsyncClient, party: Party, args) -> Dict[str, Any]:
+    session_id = party.session["id"]
+    headers = party.auth("party-host")
+    results = await storm([
+        lambda: client.get(f"/api/votes/{session_id}/results", headers=headers)
+        for _ in range(args.pollers * args.polls)
+    ], args.pollers)
+    queue = await storm([
+        lambda: client.get(f"/api/sessions/{session_id}/queue", headers=headers, params={"top": 10})
+        for _ in range(args.pollers * args.polls)
+    ], args.pollers)
+    return {"results": results, "queue_top10": queue}
+
+class BenchSocket:
+    """Socket en mémoire : note l'arrivée des messages qui portent un marqueur"""
+
+    def __init__(self, arrivals: Dict[str, List[float]]):
+        self.arrivals = arrivals
+
+    async def send_text(self, payload: str):
+        received_at = time.perf_counter()
+        for marker, times in self.arrivals.items():
+            if marker in payload:
+                times.append(received_at)
+
+    async def close(self, code: int = 1000):
+        pass
+
+async def ws_fanout(client: httpx.AsyncClient, party: Party, args) -> Dict[str, Any]:
+    from app.websocket.manager import WebSocketConnection, websocket_manager
+
+    session_id = party.session["id"]
+    arrivals: Dict[str, List[float]] = {}
+    connections = []
+    for index in range(args.sockets):
+        connection = WebSocketConnection(BenchSocket(arrivals))
+        connection.start()
+        await websocket_manager.join(connection, session_id, f"voter{index % max(1, args.voters)}")
+        connections.append(connection)
+        # Comme de vrais clients qui arrivent les uns après les autres : les
+        # user_joined sont envoyés avant la connexion suivante
+        while any(other.queue.qsize() for other in connections):
+            await asyncio.sleep(0)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    try:
+        for index in range(args.fanout_votes):
+            marker = f"fanout{index:05d}"
+            arrivals[marker] = []
+            sent_at = time.perf_counter()
+            response = await client.post(f"/api/votes/{session_id}/vote", headers=party.auth("party-host"), json={
+                "session_id": session_id, "track_id": marker, "vote_type": "like"
+            })
+            if response.status_code != 200:
+                errors += 1
+                continue
+
+            # Sockets encore ouvertes (une file pleine ferme la socket)
+            expected = sum(1 for connection in connections if not connection.closed)
+            deadline = time.monotonic() + 10
+            while len(arrivals[marker]) < expected and time.monotonic() < deadline:
+                await asyncio.sleep(0)
+            if len(arrivals[marker]) < expected:
+                errors += 1
+            else:
+                latencies.append(max(arrivals[marker]) - sent_at)
+            del arrivals[marker]
+        dropped = sum(1 for connection in connections if connection.closed)
+    finally:
+        for connection in connections:
+            websocket_manager.disconnect(connection, session_id, connection.user_id)
+            connection.stop()
+
+    result = summarize(latencies, errors, time.perf_counter() - started)
+    result["sockets"] = args.sockets
+    result["dropped_sockets"] = dropped
+    return result
+
+async def playlist_aggregation(client: httpx.AsyncClient, party: Party, args, mock: MockSpotifyServer) -> Dict[str, Any]:
+    from app.services.spotify_service import metadata_cache
+    from app.services.token_manager import token_manager
+
+    session_id = party.session["id"]
+    # Token de l'hôte pour le serveur simulé (sans expiration)
+    token_manager.store("party-host", "mock-access-party-host", None)
+    mock.configure(reset_stats=True)
+
+    cold_latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(args.cold_rounds):
+        metadata_cache.clear()
+        call_started = time.perf_counter()
+        response = await client.get(f"/api/sessions/{session_id}/tracks", headers=party.auth("party-host"))
+        cold_latencies.append(time.perf_counter() - call_started)
+        if response.status_code != 200:
+            errors += 1
+    cold = summarize(cold_latencies, errors, time.perf_counter() - started)
+    cold["upstream_requests"] = mock.stats()["total"]
+    cold["tracks"] = len(response.json().get("tracks", [])) if response.status_code == 200 else 0
+
+    mock.configure(reset_stats=True)
+    warm = await storm([
+        lambda index=index: client.get(
+            f"/api/sessions/{session_id}/tracks", headers=party.auth(f"voter{index % max(1, args.voters)}"))
+        for index in range(args.pollers * args.polls)
+    ], args.pollers)
+    warm["upstream_requests"] = mock.stats()["total"]
+    return {"cold": cold, "warm": warm}
+
+SCENARIO_FUNCTIONS = {
+    "create_join": lambda client, party, args, mock: create_join(client, party, args),
+    "vote_storm": lambda client, party, args, mock: vote_storm(client, party, args),
+    "results_polling": lambda client, party, args, mock: results_polling(client, party, args),
+    "ws_fanout": lambda client, party, args, mock: ws_fanout(client, party, args),
+    "playlist_aggregation": playlist_aggregation
+}
+
+# ===== Exécution =====
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args, mock: MockSpotifyServer, database_url: str) -> Dict[str, Any]:
+    # Import après la configuration de l'environnement : settings est lu à l'import
+    from app.main import app
+
+    party = Party(database_url)
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            for name in SCENARIOS:
+                # vote_storm crée la session des scénarios suivants
+                needed = name in args.scenarios or (name == "vote_storm" and party.session is None and any(
+                    other in args.scenarios for other in ("results_polling", "ws_fanout", "playlist_aggregation")))
+                if not needed:
+                    continue
+                result = await SCENARIO_FUNCTIONS[name](client, party, args, mock)
+                if name in args.scenarios:
+                    results[name] = result
+
+            admin = {"X-Diagnostics-Token": os.environ["DIAGNOSTICS_ADMIN_TOKEN"]}
+            results["server_stats"] = {
+                "session_store": (await client.get("/api/sessions/store/stats", headers=admin)).json(),
+                "vote_buffer": (await client.get("/api/votes/buffer/stats", headers=admin)).json(),
+                "spotify_cache": (await client.get("/api/spotify/cache/stats", headers=admin)).json()
+            }
+    return results
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> Dict[str, Any]:
+    """p95 et débit comparés à un résultat précédent, mesure par mesure"""
+    report, regressions = {}, []
+
+    def walk(path: str, now: Any, before: Any):
+        if not isinstance(now, dict) or not isinstance(before, dict):
+            return
+        if "p95_ms" in now and "p95_ms" in before:
+            entry = {"p95_ratio": round(now["p95_ms"] / before["p95_ms"], 3) if before["p95_ms"] else None}
+            if now.get("throughput_rps") and before.get("throughput_rps"):
+                entry["throughput_ratio"] = round(now["throughput_rps"] / before["throughput_rps"], 3)
+            report[path] = entry
+            if (entry["p95_ratio"] or 0) > 1 + tolerance or entry.get("throughput_ratio", 1) < 1 / (1 + tolerance):
+                regressions.append(path)
+            return
+        for key, value in now.items():
+            walk(f"{path}.{key}" if path else key, value, before.get(key))
+
+    walk("", current["scenarios"], baseline.get("scenarios", {}))
+    return {"baseline_commit": baseline.get("commit"), "tolerance": tolerance, "measures": report, "regressions": regressions}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="liste séparée par des virgules")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--guests", type=int, default=200)
+    parser.add_argument("--voters", type=int, default=50)
+    parser.add_argument("--tracks", type=int, default=20)
+    parser.add_argument("--pollers", type=int, default=20)
+    parser.add_argument("--polls", type=int, default=10)
+    parser.add_argument("--sockets", type=int, default=200)
+    parser.add_argument("--fanout-votes", type=int, default=50)
+    parser.add_argument("--playlists", type=int, default=5)
+    parser.add_argument("--tracks-per-playlist", type=int, default=400)
+    parser.add_argument("--cold-rounds", type=int, default=5)
+    parser.add_argument("--spotify-latency-ms", type=float, default=20.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--buffered", action="store_true", help="tampon d'écriture des votes (VOTE_BUFFER_ENABLED)")
+    parser.add_argument("--out", help="fichier JSON du résultat (sinon sortie standard)")
+    parser.add_argument("--compare", help="résultat précédent à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as directory, MockSpotifyServer(
+        playlists=args.playlists, tracks_per_playlist=args.tracks_per_playlist, latency_ms=args.spotify_latency_ms
+    ) as mock:
+        database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        os.environ.update({
+            "DATABASE_URL": database_url,
+            "SPOTIFY_API_BASE_URL": mock.api_url,
+            "SPOTIFY_ACCOUNTS_BASE_URL": mock.accounts_url,
+            "VOTE_BUFFER_ENABLED": "true" if args.buffered else "false",
+            "REAPER_ENABLED": "false",
+            "STATIC_COMPRESS_ON_STARTUP": "false",
+            "PROFILER_SAMPLE_RATE": "0",
+            # Statistiques des services lues en fin de suite
+            "DIAGNOSTICS_ADMIN_TOKEN": os.environ.get("DIAGNOSTICS_ADMIN_TOKEN") or secrets.token_hex(16)
+        })
+        subprocess.run([sys.executable, "init_db.py"], cwd=BACKEND_DIR, env=os.environ, check=True, capture_output=True)
+
+        started_at = datetime.utcnow().isoformat()
+        scenarios = asyncio.run(run(args, mock, database_url))
+
+    output = {
+        "commit": _commit(),
+        "started_at": started_at,
+        "python": platform.python_version(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "server_stats": scenarios.pop("server_stats"),
+        "scenarios": scenarios
+    }
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as file:
+            output["comparison"] = compare(output, json.load(file), args.tolerance)
+        exit_code = 1 if output["comparison"]["regressions"] else 0
+
+    text = json.dumps(output, indent=2)
+    if args.out:
+        with open(args.out, "w") as file:
+            file.write(text + "\n")
+    print(text)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Latence des votes HTTP sous forte concurrence (un seul worker uvicorn)
+
+Une session avec N participants ; chacun envoie son vote en même temps sur
+POST /api/votes/{session_id}/vote. Mesure p50/p95/p99 et le nombre d'erreurs
+par vague.
+
+    cd backend
+    python -m benchmarks.vote_concurrency --concurrency 500 --waves 3
+    python -m benchmarks.vote_concurrency --concurrency 500 --waves 3 --buffered
+
+Pour comparer deux commits, lancer le même script dans les deux arbres avec
+--out : le fichier ne contient que le JSON (la sortie standard mêle les
+messages du serveur).
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.socketio_load import _free_port, bearer, create_users, start_server
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def setup_session(client: httpx.AsyncClient, database_url: str, participants: int):
+    users = [f"user{index}" for index in range(participants)]
+    tokens = create_users(database_url, ["host"] + users)
+
+    response = await client.post("/api/sessions/create", headers=bearer(tokens["host"]), json={"name": "bench", "playlist_ids": []})
+    session = response.json()
+    semaphore = asyncio.Semaphore(20)
+
+    async def join(user_id: str):
+        async with semaphore:
+            await client.post("/api/sessions/join", headers=bearer(tokens[user_id]), json={"code": session["code"]})
+
+    await asyncio.gather(*(join(user_id) for user_id in users))
+    return session["id"], users, tokens
+
+async def wave(client: httpx.AsyncClient, session_id: str, users, tokens, tracks: int, wave_index: int) -> dict:
+    latencies = []
+    errors = 0
+
+    async def vote(index: int, user_id: str):
+        nonlocal errors
+        payload = {
+            "session_id": session_id,
+            "track_id": f"track{(index + wave_index) % tracks}",
+            "vote_type": "like" if (index + wave_index) % 3 else "dislike"
+        }
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"/api/votes/{session_id}/vote", headers=bearer(tokens[user_id]), json=payload)
+            if response.status_code != 200:
+                errors += 1
+        except httpx.HTTPError:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(vote(index, user_id) for index, user_id in enumerate(users)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(users),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1)
+    }
+
+async def run(args) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        session_id, users, tokens = await setup_session(client, args.database_url, args.concurrency)
+        waves = [await wave(client, session_id, users, tokens, args.tracks, index) for index in range(args.waves)]
+        result = {"concurrency": args.concurrency, "buffered": args.buffered, "waves": waves}
+        if args.buffered:
+            admin = {"X-Diagnostics-Token": os.environ["DIAGNOSTICS_ADMIN_TOKEN"]}
+            result["buffer"] = (await client.get("/api/votes/buffer/stats", headers=admin)).json()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--waves", type=int, default=3)
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--database-url", help="base existante (défaut : SQLite temporaire)")
+    parser.add_argument("--buffered", action="store_true", help="tampon d'écriture des votes (VOTE_BUFFER_ENABLED)")
+    parser.add_argument("--out", help="fichier JSON du résultat (en plus de la sortie standard)")
+    args = parser.parse_args()
+
+    # Le serveur hérite de l'environnement
+    os.environ["VOTE_BUFFER_ENABLED"] = "true" if args.buffered else "false"
+    # Jeton admin pour lire les statistiques du tampon
+    os.environ.setdefault("DIAGNOSTICS_ADMIN_TOKEN", secrets.token_hex(16))
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.database_url = args.database_url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        args.port = _free_port()
+        server = start_server(args.database_url, args.port)
+        try:
+            text = json.dumps(asyncio.run(run(args)), indent=2)
+            if args.out:
+                with open(args.out, "w") as file:
+                    file.write(text + "\n")
+            print(text)
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Débit d'enregistrement des votes : upsert en un statement vs SELECT puis écriture
+
+Base SQLite temporaire. Le chemin d'origine (SELECT, INSERT/UPDATE, commit,
+refresh, sans index unique) sert de référence. Un second scénario lance des
+votes simultanés du même utilisateur sur la même track et compte les lignes
+obtenues.
+
+    cd backend
+    python -m benchmarks.vote_upsert --votes 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models.vote import Base, Vote
+from app.services.voting_service import VotingService
+
+async def _make_database(path: str, legacy: bool, synchronous: str = "FULL"):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 30})
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_synchronous(connection, _):
+        cursor = connection.cursor()
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+
+    def create_schema(connection):
+        Base.metadata.create_all(bind=connection)
+        if legacy:
+            # Schéma d'origine : pas d'index composite unique
+            for index in Vote.__table__.indexes:
+                if index.unique:
+                    index.drop(bind=connection)
+
+    async with engine.begin() as connection:
+        await connection.run_sync(create_schema)
+    return engine, async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+async def _submit(service: VotingService, legacy: bool, *args):
+    if legacy:
+        return await service._submit_vote_select_then_write(*args)
+    return await service.submit_vote(*args)
+
+async def measure_throughput(votes: int, users: int, tracks: int, legacy: bool, synchronous: str) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        engine, SessionLocal = await _make_database(os.path.join(directory, "votes.db"), legacy, synchronous)
+        rng = random.Random(42)
+        plan = [
+            (f"user{rng.randrange(users)}", f"track{rng.randrange(tracks)}", rng.choice(("like", "dislike")))
+            for _ in range(votes)
+        ]
+
+        failures = 0
+        async with SessionLocal() as db:
+            service = VotingService(db)
+            started = time.perf_counter()
+            for user_id, track_id, vote_type in plan:
+                if await _submit(service, legacy, "session", user_id, track_id, vote_type) is None:
+                    failures += 1
+            elapsed = time.perf_counter() - started
+        await engine.dispose()
+
+    return {
+        "mode": "select_then_write" if legacy else "upsert",
+        "synchronous": synchronous,
+        "votes": votes,
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "votes_per_second": round(votes / elapsed, 1)
+    }
+
+async def measure_race(concurrency: int, rounds: int, legacy: bool) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        engine, SessionLocal = await _make_database(os.path.join(directory, "votes.db"), legacy)
+        failures = 0
+
+        async def worker(round_index: int):
+            nonlocal failures
+            async with SessionLocal() as db:
+                if await _submit(VotingService(db), legacy, "session", "user", f"track{round_index}", "like") is None:
+                    failures += 1
+
+        for round_index in range(rounds):
+            await asyncio.gather(*(worker(round_index) for _ in range(concurrency)))
+
+        async with engine.connect() as connection:
+            rows = (await connection.execute(select(func.count()).select_from(Vote))).scalar_one()
+        await engine.dispose()
+
+    return {
+        "mode": "select_then_write" if legacy else "upsert",
+        "concurrent_votes_per_round": concurrency,
+        "rounds": rounds,
+        "vote_rows": rows,
+        "expected_rows": rounds,
+        "failures": failures
+    }
+
+async def run(args) -> dict:
+    throughput = []
+    for synchronous in args.synchronous:
+        for legacy in (True, False):
+            throughput.append(await measure_throughput(args.votes, args.users, args.tracks, legacy, synchronous))
+
+    return {
+        "throughput": throughput,
+        "same_vote_race": [
+            await measure_race(args.concurrency, args.rounds, legacy=True),
+            await measure_race(args.concurrency, args.rounds, legacy=False)
+        ]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--votes", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tracks", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument(
+        "--synchronous", nargs="+", default=["FULL", "OFF"],
+        help="modes PRAGMA synchronous testés (OFF isole le coût des statements de celui du fsync)"
+    )
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
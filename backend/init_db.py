@@ -4,10 +4,92 @@ import os
 # Ajouter le chemin de l'application
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.utils.helpers import engine
+from sqlalchemy import inspect, text
+from app.utils.helpers import engine, dispose_engines, AsyncSessionLocal
 from app.models.user import Base
-from app.models.session import Base as SessionBase
-from app.models.vote import Base as VoteBase
+from app.models.session import Base as SessionBase, Session
+from app.models.vote import Base as VoteBase, Vote
+from app.services.voting_service import VotingService
+import asyncio
+import json
+
+def migrate_participants():
+    """Recopier l'ancienne colonne JSON sessions.participants dans session_participants
+
+    La colonne est supprimée dans la même transaction : init_db.py tourne à
+    chaque build, la copie ne doit pas ramener les participants partis depuis.
+    """
+    columns = [column["name"] for column in inspect(engine).get_columns("sessions")]
+    if "participants" not in columns:
+        return 0
+    
+    copied = 0
+    with engine.begin() as connection:
+        rows = connection.execute(text("SELECT id, participants, created_at FROM sessions")).fetchall()
+        for session_id, participants, created_at in rows:
+            if isinstance(participants, str):
+                participants = json.loads(participants or "[]")
+            for user_id in participants or []:
+                exists = connection.execute(
+                    text("SELECT 1 FROM session_participants WHERE session_id = :session_id AND user_id = :user_id"),
+                    {"session_id": session_id, "user_id": user_id}
+                ).first()
+                if not exists:
+                    connection.execute(
+                        text("INSERT INTO session_participants (session_id, user_id, joined_at) VALUES (:session_id, :user_id, :joined_at)"),
+                        {"session_id": session_id, "user_id": user_id, "joined_at": created_at}
+                    )
+                    copied += 1
+        connection.execute(text("ALTER TABLE sessions DROP COLUMN participants"))
+    return copied
+
+def migrate_sessions():
+    """Ajouter la colonne archived_at aux anciennes bases"""
+    columns = [column["name"] for column in inspect(engine).get_columns("sessions")]
+    with engine.begin() as connection:
+        if "version" in columns:
+            # Colonne de l'ancien store à écriture différée, plus utilisée
+            connection.execute(text("ALTER TABLE sessions DROP COLUMN version"))
+        if "archived_at" not in columns:
+            connection.execute(text("ALTER TABLE sessions ADD COLUMN archived_at DATETIME"))
+    
+    # Ancien index unique sur tous les codes : remplacé par l'unicité des codes actifs
+    for index in inspect(engine).get_indexes("sessions"):
+        if index["name"] == "ix_sessions_code" and index["unique"]:
+            with engine.begin() as connection:
+                connection.execute(text("DROP INDEX ix_sessions_code"))
+    
+    for index in Session.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+def migrate_votes():
+    """Ajouter previous_vote_type et l'index unique (session_id, user_id, track_id) aux anciennes bases"""
+    columns = [column["name"] for column in inspect(engine).get_columns("votes")]
+    
+    with engine.begin() as connection:
+        if "previous_vote_type" not in columns:
+            connection.execute(text("ALTER TABLE votes ADD COLUMN previous_vote_type VARCHAR(10)"))
+        
+        # Garder le vote le plus récent de chaque doublon avant de créer l'index unique
+        connection.execute(text("""
+            DELETE FROM votes WHERE EXISTS (
+                SELECT 1 FROM votes AS newer
+                WHERE newer.session_id = votes.session_id
+                  AND newer.user_id = votes.user_id
+                  AND newer.track_id = votes.track_id
+                  AND (newer.created_at > votes.created_at
+                       OR (newer.created_at = votes.created_at AND newer.id > votes.id))
+            )
+        """))
+    
+    for index in Vote.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+async def rebuild_tallies():
+    async with AsyncSessionLocal() as db:
+        await VotingService(db).rebuild_tallies()
+    # Les connexions du pool sont liées à la boucle de asyncio.run
+    await dispose_engines()
 
 def init_db():
     print("Création des tables de la base de données...")
@@ -17,8 +99,16 @@ def init_db():
     SessionBase.metadata.create_all(bind=engine) 
     VoteBase.metadata.create_all(bind=engine)
     
+    # Migrer les participants stockés en JSON (anciennes bases)
+    migrate_participants()
+    migrate_sessions()
+    migrate_votes()
+    
+    # Recalculer les compteurs de votes à partir des votes existants
+    asyncio.run(rebuild_tallies())
+    
     print("✅ Base de données initialisée avec succès !")
-    print("📊 Tables créées : users, sessions, votes")
+    print("📊 Tables créées : users, sessions, session_participants, votes, vote_tallies, vote_versions")
 
 if __name__ == "__main__":
     init_db()
\ No newline at end of file
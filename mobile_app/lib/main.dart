@@ -61,7 +61,7 @@ class _MyAppState extends State<MyApp> {
       // Si on a un token dans l'URL, on sauvegarde et on redirige vers home
       if (accessToken != null && accessToken.isNotEmpty && userId != null && userId.isNotEmpty) {
         print('✅ Token détecté dans URL, sauvegarde...');
-        await _apiService.saveToken(accessToken);
+        await _apiService.saveToken(accessToken, refreshToken: uri.queryParameters['refresh_token']);
         
         final prefs = await SharedPreferences.getInstance();
         await prefs.setString(AppConstants.keyUserId, userId);
@@ -151,6 +151,7 @@ class _MyAppState extends State<MyApp> {
         ),
         useMaterial3: true,
       ),
+      navigatorKey: appNavigatorKey,
       initialRoute: _initialRoute,
       routes: {
         '/': (context) => const LoginScreen(),
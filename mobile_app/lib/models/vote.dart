@@ -45,12 +45,14 @@ class VoteResults {
   final int likes;
   final int dislikes;
   final int totalVotes;
+  final int version;
 
   VoteResults({
     required this.trackId,
     required this.likes,
     required this.dislikes,
     required this.totalVotes,
+    this.version = 0,
   });
 
   factory VoteResults.fromJson(Map<String, dynamic> json) {
@@ -59,6 +61,7 @@ class VoteResults {
       likes: json['likes'] ?? 0,
       dislikes: json['dislikes'] ?? 0,
       totalVotes: json['total_votes'] ?? 0,
+      version: json['version'] ?? 0,
     );
   }
 
@@ -45,7 +45,7 @@ class _AuthCallbackScreenState extends State<AuthCallbackScreen> {
       if (accessToken != null && userId != null) {
         setState(() => _status = 'Sauvegarde des informations...');
         
-        await _apiService.saveToken(accessToken);
+        await _apiService.saveToken(accessToken, refreshToken: uri.queryParameters['refresh_token']);
         
         final prefs = await SharedPreferences.getInstance();
         await prefs.setString(AppConstants.keyUserId, userId);
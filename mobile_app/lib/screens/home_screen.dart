@@ -41,6 +41,7 @@ class _HomeScreenState extends State<HomeScreen> {
   Future<void> _logout() async {
     final prefs = await SharedPreferences.getInstance();
     await prefs.remove(AppConstants.keyAccessToken);
+    await prefs.remove(AppConstants.keyRefreshToken);
     await prefs.remove(AppConstants.keyUserId);
     await prefs.remove(AppConstants.keyUserData);
     
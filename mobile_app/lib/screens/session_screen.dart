@@ -28,6 +28,7 @@ class _SessionScreenState extends State<SessionScreen> {
   List<Track> _tracks = [];
   Track? _currentTrack;
   Map<String, VoteResults> _voteResults = {};
+  int _resultsVersion = 0;
   bool _isLoading = true;
   bool _isHost = false;
 
@@ -50,11 +51,12 @@ class _SessionScreenState extends State<SessionScreen> {
       _isHost = session.hostId == userId;
     });
 
-    await _socketService.connect(session.id, userId!);
-    _socketService.messages.listen(_handleWebSocketMessage);
-
+    // Requête HTTP d'abord : un token expiré est renouvelé avant la connexion socket
     await _loadTracks();
 
+    await _socketService.connect(session.id, _apiService.accessToken!);
+    _socketService.messages.listen(_handleWebSocketMessage);
+
     if (_isHost) {
       await _spotifyService.connectToSpotify();
     }
@@ -65,21 +67,15 @@ class _SessionScreenState extends State<SessionScreen> {
   Future<void> _loadTracks() async {
     if (_session == null) return;
 
-    List<Track> allTracks = [];
-    
-    for (String playlistId in _session!.playlistIds) {
-      try {
-        final tracks = await _apiService.getPlaylistTracks(playlistId);
-        allTracks.addAll(tracks);
-      } catch (e) {
-        print('Error loading playlist $playlistId: $e');
-      }
+    try {
+      final tracks = await _apiService.getSessionTracks(_session!.id);
+      setState(() {
+        _tracks = tracks;
+      });
+    } catch (e) {
+      print('Error loading session tracks: $e');
     }
 
-    setState(() {
-      _tracks = allTracks;
-    });
-
     await _loadVoteResults();
   }
 
@@ -90,18 +86,59 @@ class _SessionScreenState extends State<SessionScreen> {
       final results = await _apiService.getAllResults(_session!.id);
       setState(() {
         _voteResults = results;
+        _resultsVersion = results.values.fold(
+          0,
+          (version, result) => version > result.version ? version : result.version,
+        );
       });
     } catch (e) {
       print('Error loading vote results: $e');
     }
   }
 
+  Future<void> _resyncVoteResults() async {
+    if (_session == null) return;
+
+    try {
+      final changes = await _apiService.getResultsChanges(_session!.id, _resultsVersion);
+      final Map<String, VoteResults> results = changes['results'];
+      setState(() {
+        _voteResults.addAll(results);
+        _resultsVersion = changes['version'];
+      });
+    } catch (e) {
+      print('Error resyncing vote results: $e');
+    }
+  }
+
+  void _applyVoteUpdate(Map<String, dynamic> message) {
+    // Ancien format sans compteurs : recharger tous les résultats
+    if (message['likes'] == null || message['version'] == null) {
+      _loadVoteResults();
+      return;
+    }
+
+    final int version = message['version'];
+    if (version <= _resultsVersion) return;
+
+    // Une version manquée : récupérer uniquement ce qui a changé
+    if (version > _resultsVersion + 1) {
+      _resyncVoteResults();
+      return;
+    }
+
+    setState(() {
+      _voteResults[message['track_id']] = VoteResults.fromJson(message);
+      _resultsVersion = version;
+    });
+  }
+
   void _handleWebSocketMessage(Map<String, dynamic> message) {
     final type = message['type'];
 
     switch (type) {
       case 'vote_update':
-        _loadVoteResults();
+        _applyVoteUpdate(message);
         break;
       
       case 'track_change':
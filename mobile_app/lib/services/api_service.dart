@@ -1,4 +1,5 @@
 import 'dart:convert';
+import 'package:flutter/widgets.dart';
 import 'package:http/http.dart' as http;
 import 'package:shared_preferences/shared_preferences.dart';
 import '../models/user.dart';
@@ -7,9 +8,14 @@ import '../models/track.dart';
 import '../models/vote.dart';
 import '../utils/constants.dart';
 
+// Navigation hors d'un widget (retour à la connexion quand la session expire)
+final GlobalKey<NavigatorState> appNavigatorKey = GlobalKey<NavigatorState>();
+
 class ApiService {
   final String baseUrl = AppConstants.apiUrl;
   String? _accessToken;
+  String? _refreshToken;
+  Future<bool>? _renewing;
 
   // Singleton pattern
   static final ApiService _instance = ApiService._internal();
@@ -19,14 +25,69 @@ class ApiService {
   Future<void> loadToken() async {
     final prefs = await SharedPreferences.getInstance();
     _accessToken = prefs.getString(AppConstants.keyAccessToken);
+    _refreshToken = prefs.getString(AppConstants.keyRefreshToken);
   }
 
-  Future<void> saveToken(String token) async {
+  Future<void> saveToken(String token, {String? refreshToken}) async {
     final prefs = await SharedPreferences.getInstance();
     await prefs.setString(AppConstants.keyAccessToken, token);
     _accessToken = token;
+    if (refreshToken != null) {
+      await prefs.setString(AppConstants.keyRefreshToken, refreshToken);
+      _refreshToken = refreshToken;
+    }
+  }
+
+  Future<void> clearSession() async {
+    final prefs = await SharedPreferences.getInstance();
+    await prefs.remove(AppConstants.keyAccessToken);
+    await prefs.remove(AppConstants.keyRefreshToken);
+    await prefs.remove(AppConstants.keyUserId);
+    await prefs.remove(AppConstants.keyUserData);
+    _accessToken = null;
+    _refreshToken = null;
+  }
+
+  // Nouveau token d'accès à partir du token de renouvellement (un seul appel à la fois)
+  Future<bool> _renewToken() {
+    return _renewing ??= _doRenewToken().whenComplete(() => _renewing = null);
   }
 
+  Future<bool> _doRenewToken() async {
+    if (_refreshToken == null) return false;
+    try {
+      final response = await http.post(
+        Uri.parse('$baseUrl${ApiEndpoints.tokenRefresh}'),
+        headers: {'Content-Type': 'application/json'},
+        body: json.encode({'refresh_token': _refreshToken}),
+      );
+      if (response.statusCode != 200) return false;
+      final data = json.decode(response.body);
+      await saveToken(data['access_token'], refreshToken: data['refresh_token']);
+      return true;
+    } catch (e) {
+      return false;
+    }
+  }
+
+  // Requête authentifiée : sur 401, un renouvellement puis un nouvel essai ;
+  // sinon retour à l'écran de connexion
+  Future<http.Response> _authorized(Future<http.Response> Function() send) async {
+    var response = await send();
+    if (response.statusCode != 401) return response;
+
+    if (await _renewToken()) {
+      response = await send();
+      if (response.statusCode != 401) return response;
+    }
+
+    await clearSession();
+    appNavigatorKey.currentState?.pushNamedAndRemoveUntil('/', (route) => false);
+    return response;
+  }
+
+  String? get accessToken => _accessToken;
+
   Map<String, String> get _headers => {
         'Content-Type': 'application/json',
         if (_accessToken != null) 'Authorization': 'Bearer $_accessToken',
@@ -60,11 +121,11 @@ class ApiService {
     }
   }
 
-  Future<User> getCurrentUser(String userId) async {
-    final response = await http.get(
-      Uri.parse('$baseUrl${ApiEndpoints.me}?user_id=$userId'),
-      headers: _headers,
-    );
+  Future<User> getCurrentUser() async {
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.me}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode == 200) {
       return User.fromJson(json.decode(response.body));
@@ -76,11 +137,11 @@ class ApiService {
   // SESSION ENDPOINTS
 
   Future<Session> createSession(List<String> playlistIds) async {
-    final response = await http.post(
-      Uri.parse('$baseUrl${ApiEndpoints.createSession}'),
-      headers: _headers,
-      body: json.encode({'playlist_ids': playlistIds}),
-    );
+    final response = await _authorized(() => http.post(
+        Uri.parse('$baseUrl${ApiEndpoints.createSession}'),
+        headers: _headers,
+        body: json.encode({'playlist_ids': playlistIds}),
+      ));
 
     if (response.statusCode == 200) {
       return Session.fromJson(json.decode(response.body));
@@ -90,11 +151,11 @@ class ApiService {
   }
 
   Future<Session> joinSession(String code) async {
-    final response = await http.post(
-      Uri.parse('$baseUrl${ApiEndpoints.joinSession}'),
-      headers: _headers,
-      body: json.encode({'code': code}),
-    );
+    final response = await _authorized(() => http.post(
+        Uri.parse('$baseUrl${ApiEndpoints.joinSession}'),
+        headers: _headers,
+        body: json.encode({'code': code}),
+      ));
 
     if (response.statusCode == 200) {
       return Session.fromJson(json.decode(response.body));
@@ -104,10 +165,10 @@ class ApiService {
   }
 
   Future<Session> getSession(String sessionId) async {
-    final response = await http.get(
-      Uri.parse('$baseUrl${ApiEndpoints.getSession(sessionId)}'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.getSession(sessionId)}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode == 200) {
       return Session.fromJson(json.decode(response.body));
@@ -117,10 +178,10 @@ class ApiService {
   }
 
   Future<void> leaveSession(String sessionId) async {
-    final response = await http.post(
-      Uri.parse('$baseUrl${ApiEndpoints.leaveSession(sessionId)}'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.post(
+        Uri.parse('$baseUrl${ApiEndpoints.leaveSession(sessionId)}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode != 200) {
       throw Exception('Failed to leave session: ${response.statusCode}');
@@ -128,10 +189,10 @@ class ApiService {
   }
 
   Future<void> closeSession(String sessionId) async {
-    final response = await http.post(
-      Uri.parse('$baseUrl${ApiEndpoints.closeSession(sessionId)}'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.post(
+        Uri.parse('$baseUrl${ApiEndpoints.closeSession(sessionId)}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode != 200) {
       throw Exception('Failed to close session: ${response.statusCode}');
@@ -141,14 +202,14 @@ class ApiService {
   // VOTE ENDPOINTS
 
   Future<Vote> submitVote(String sessionId, String trackId, VoteType voteType) async {
-    final response = await http.post(
-      Uri.parse('$baseUrl${ApiEndpoints.vote(sessionId)}'),
-      headers: _headers,
-      body: json.encode({
-        'track_id': trackId,
-        'vote_type': voteType == VoteType.like ? 'like' : 'dislike',
-      }),
-    );
+    final response = await _authorized(() => http.post(
+        Uri.parse('$baseUrl${ApiEndpoints.vote(sessionId)}'),
+        headers: _headers,
+        body: json.encode({
+          'track_id': trackId,
+          'vote_type': voteType == VoteType.like ? 'like' : 'dislike',
+        }),
+      ));
 
     if (response.statusCode == 200) {
       return Vote.fromJson(json.decode(response.body));
@@ -158,10 +219,10 @@ class ApiService {
   }
 
   Future<VoteResults> getTrackResults(String sessionId, String trackId) async {
-    final response = await http.get(
-      Uri.parse('$baseUrl${ApiEndpoints.trackResults(sessionId, trackId)}'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.trackResults(sessionId, trackId)}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode == 200) {
       return VoteResults.fromJson(json.decode(response.body));
@@ -171,10 +232,10 @@ class ApiService {
   }
 
   Future<Map<String, VoteResults>> getAllResults(String sessionId) async {
-    final response = await http.get(
-      Uri.parse('$baseUrl${ApiEndpoints.allResults(sessionId)}'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.allResults(sessionId)}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode == 200) {
       final Map<String, dynamic> data = json.decode(response.body);
@@ -186,13 +247,33 @@ class ApiService {
     }
   }
 
+  Future<Map<String, dynamic>> getResultsChanges(String sessionId, int sinceVersion) async {
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.resultsChanges(sessionId)}?since_version=$sinceVersion'),
+        headers: _headers,
+      ));
+
+    if (response.statusCode == 200) {
+      final Map<String, dynamic> data = json.decode(response.body);
+      final Map<String, dynamic> results = data['results'];
+      return {
+        'version': data['version'] as int,
+        'results': results.map(
+          (key, value) => MapEntry(key, VoteResults.fromJson(value)),
+        ),
+      };
+    } else {
+      throw Exception('Failed to get results: ${response.statusCode}');
+    }
+  }
+
   // SPOTIFY ENDPOINTS
 
   Future<List<dynamic>> getUserPlaylists() async {
-    final response = await http.get(
-      Uri.parse('$baseUrl${ApiEndpoints.playlists}'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.playlists}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode == 200) {
       final data = json.decode(response.body);
@@ -203,10 +284,10 @@ class ApiService {
   }
 
   Future<List<Track>> getPlaylistTracks(String playlistId) async {
-    final response = await http.get(
-      Uri.parse('$baseUrl${ApiEndpoints.playlistTracks(playlistId)}'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.playlistTracks(playlistId)}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode == 200) {
       final data = json.decode(response.body);
@@ -218,11 +299,27 @@ class ApiService {
     }
   }
 
+  Future<List<Track>> getSessionTracks(String sessionId) async {
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.sessionTracks(sessionId)}'),
+        headers: _headers,
+      ));
+
+    if (response.statusCode == 200) {
+      final data = json.decode(response.body);
+      return (data['tracks'] as List)
+          .map((track) => Track.fromJson(track))
+          .toList();
+    } else {
+      throw Exception('Failed to get session tracks: ${response.statusCode}');
+    }
+  }
+
   Future<Track> getTrack(String trackId) async {
-    final response = await http.get(
-      Uri.parse('$baseUrl${ApiEndpoints.track(trackId)}'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.track(trackId)}'),
+        headers: _headers,
+      ));
 
     if (response.statusCode == 200) {
       return Track.fromJson(json.decode(response.body));
@@ -232,10 +329,10 @@ class ApiService {
   }
 
   Future<List<Track>> searchTracks(String query) async {
-    final response = await http.get(
-      Uri.parse('$baseUrl${ApiEndpoints.search}?query=$query'),
-      headers: _headers,
-    );
+    final response = await _authorized(() => http.get(
+        Uri.parse('$baseUrl${ApiEndpoints.search}?query=$query'),
+        headers: _headers,
+      ));
 
     if (response.statusCode == 200) {
       final data = json.decode(response.body);
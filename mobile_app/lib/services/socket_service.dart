@@ -1,6 +1,7 @@
 import 'dart:async';
 import 'dart:convert'; // AJOUTÉ ICI
 import 'package:socket_io_client/socket_io_client.dart' as io;
+import '../utils/constants.dart';
 
 class SocketService {
   late io.Socket _socket;
@@ -9,12 +10,14 @@ class SocketService {
   final StreamController<Map<String, dynamic>> _messageController = 
       StreamController<Map<String, dynamic>>.broadcast();
 
-  Future<void> connect(String sessionId, String userId) async {
+  Future<void> connect(String sessionId, String accessToken) async {
     try {
       _socket = io.io(
-        'http://192.168.1.38:8000',
+        AppConstants.apiUrl,
         io.OptionBuilder()
           .setTransports(['websocket'])
+          // Le serveur identifie l'utilisateur par son token JWT
+          .setAuth({'token': accessToken})
           .enableAutoConnect()
           .build(),
       );
@@ -31,7 +34,6 @@ class SocketService {
 
         _socket.emit('join_session', {
           'session_id': sessionId,
-          'user_id': userId,
         });
       });
 
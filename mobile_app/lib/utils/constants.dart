@@ -3,6 +3,7 @@ class AppConstants {
   static const String apiUrl = 'https://spotify-party.onrender.com';
   
   static const String keyAccessToken = 'access_token';
+  static const String keyRefreshToken = 'refresh_token';
   static const String keyUserId = 'user_id';
   static const String keyUserData = 'user_data';
 }
@@ -11,6 +12,7 @@ class ApiEndpoints {
   static const String login = '/api/auth/login';
   static const String callback = '/api/auth/callback';
   static const String refresh = '/api/auth/refresh';
+  static const String tokenRefresh = '/api/auth/token/refresh';
   static const String me = '/api/auth/me';
   
   static const String createSession = '/api/sessions/create';
@@ -18,10 +20,12 @@ class ApiEndpoints {
   static String getSession(String sessionId) => '/api/sessions/$sessionId';
   static String leaveSession(String sessionId) => '/api/sessions/$sessionId/leave';
   static String closeSession(String sessionId) => '/api/sessions/$sessionId/close';
+  static String sessionTracks(String sessionId) => '/api/sessions/$sessionId/tracks';
   
   static String vote(String sessionId) => '/api/votes/$sessionId/vote';
   static String trackResults(String sessionId, String trackId) => '/api/votes/$sessionId/track/$trackId/results';
   static String allResults(String sessionId) => '/api/votes/$sessionId/results';
+  static String resultsChanges(String sessionId) => '/api/votes/$sessionId/results/changes';
   
   static const String playlists = '/api/spotify/playlists';
   static String playlistTracks(String playlistId) => '/api/spotify/playlists/$playlistId/tracks';